@@ -0,0 +1,78 @@
+import time
+import numpy as np
+import pandas as pd
+from analises import categorias_aging, ordem_aging
+from indice_datas import SerieAcumulada, dias_e_valores, dia_numero, menor_dia, maior_dia
+
+# Aging em datas de referência arbitrárias.
+#
+# Cada faixa de aging em uma data de referência é um intervalo de dias de entrada
+# (por exemplo, "31-60 dias" em r corresponde a entradas entre r-60 e r-31). Sobre as somas
+# acumuladas do índice de datas, a matriz inteira (datas de referência x faixas) sai de uma
+# única busca binária vetorizada, sem percorrer as linhas novamente para cada data.
+# Sem a data de saída das contas, o estoque em uma data passada é o das contas do arquivo
+# que já tinham entrado naquela data.
+
+meses_historico_padrao = 24
+
+# Limites de idade (em dias) de cada faixa; a última faixa não tem limite superior
+idade_minima = np.array([c[0] for c in categorias_aging], dtype=np.int64)
+idade_maxima = np.array([c[1] if np.isfinite(c[1]) else -1 for c in categorias_aging], dtype=np.int64)
+
+# Fins de mês até a data de referência (inclusive), terminando na própria data quando
+# ela não for fim de mês
+def datas_fim_de_mes(data_referencia, meses=meses_historico_padrao):
+    data_referencia = pd.Timestamp(data_referencia).normalize()
+    datas = pd.date_range(end=data_referencia, periods=meses, freq="ME")
+    if not data_referencia.is_month_end:
+        datas = datas[1:].append(pd.DatetimeIndex([data_referencia]))
+    return datas
+
+# Séries acumuladas de um recorte qualquer (por exemplo, com filtro de médico ou status)
+def series_do_recorte(df):
+    dias, valores, _ = dias_e_valores(df)
+    return [SerieAcumulada(dias, valores)]
+
+class MotorAging:
+    # Responde a matriz de aging para um conjunto de séries acumuladas (o índice do arquivo
+    # recortado por convênio, ou as séries de um recorte filtrado) e guarda os históricos
+    # de fim de mês já calculados
+
+    def __init__(self, series, data_inicio=None, data_fim=None):
+        self.series = series
+        self.inicio = dia_numero(data_inicio) if data_inicio is not None else menor_dia
+        self.fim = dia_numero(data_fim) if data_fim is not None else maior_dia
+        self.historicos = {}
+        self.tempos = {}
+
+    # Quantidade e valor por data de referência (linhas) e faixa de aging (colunas)
+    def matriz(self, datas_referencia):
+        datas_referencia = pd.DatetimeIndex(datas_referencia).normalize()
+        referencia = datas_referencia.to_numpy().astype("datetime64[D]").astype(np.int64)[:, None]
+
+        # Intervalos de dias de entrada de cada faixa, cortados pelo filtro de data
+        inicio = np.where(idade_maxima < 0, menor_dia, referencia - idade_maxima)
+        fim = referencia - idade_minima
+        inicio = np.maximum(inicio, self.inicio)
+        fim = np.minimum(fim, self.fim)
+
+        quantidade = np.zeros(fim.shape, dtype=np.int64)
+        valor = np.zeros(fim.shape)
+        for serie in self.series:
+            c, v, _ = serie.somar(inicio, fim)
+            quantidade += c
+            valor += v
+
+        return (
+            pd.DataFrame(quantidade, index=datas_referencia.rename("Data referência"), columns=ordem_aging),
+            pd.DataFrame(valor, index=datas_referencia.rename("Data referência"), columns=ordem_aging),
+        )
+
+    # Histórico de fim de mês até a data de referência, calculado uma vez por recorte
+    def historico_mensal(self, data_referencia, meses=meses_historico_padrao):
+        chave = (pd.Timestamp(data_referencia).normalize(), meses)
+        if chave not in self.historicos:
+            inicio = time.perf_counter()
+            self.historicos[chave] = self.matriz(datas_fim_de_mes(*chave))
+            self.tempos[chave] = time.perf_counter() - inicio
+        return self.historicos[chave]
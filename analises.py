@@ -0,0 +1,423 @@
+import pandas as pd
+import numpy as np
+from io import BytesIO
+from outliers import limite_escore
+from qualidade import (
+    marcar_alertas_leitura, coluna_alertas, coluna_alta, coluna_sem_alta, nao_convertidos, contar_alertas,
+    contas_com_alerta, descrever_alertas
+)
+
+# Colunas esperadas na planilha de contas pendentes
+colunas_necessarias = [
+    "Status", "Tipo atendimento", "Conta", "Atendimento", "Status atendimento",
+    "Convênio", "Categoria", "Valor conta", "Etapa anterior",
+    "Último Setor destino", "Setor atendimento", "Estabelecimento",
+    "Data entrada", "Médico executor"
+]
+
+# Coluna com a aba de onde veio cada conta, quando a planilha é lida com várias abas
+coluna_origem = "Aba origem"
+
+# Categorias de aging (limite inferior, limite superior, rótulo)
+categorias_aging = [
+    (0, 30, "0-30 dias"),
+    (31, 60, "31-60 dias"),
+    (61, 90, "61-90 dias"),
+    (91, 180, "91-180 dias"),
+    (181, 365, "181-365 dias"),
+    (366, float('inf'), "+365 dias")
+]
+ordem_aging = [c[2] for c in categorias_aging]
+
+# Texto em arrays do Arrow, que o Streamlit serializa sem converter objeto a objeto: o dtype
+# "str" do pandas 3 (no pandas 2, astype(str) daria object; o equivalente é pyarrow_numpy)
+tipo_texto = "str" if int(pd.__version__.split(".")[0]) >= 3 else "string[pyarrow_numpy]"
+
+# Fatia as linhas com "Data entrada" no intervalo. Quando o DataFrame veio de preparar_dados
+# (ordenado por data, NaT ao final) a fatia sai por busca binária, sem varrer a coluna.
+def fatiar_por_data(df, inicio=None, fim=None, fechado_inicio=True, fechado_fim=True):
+    datas = df["Data entrada"]
+
+    if df.attrs.get("ordenado_por_data"):
+        valores = datas.to_numpy()
+        lo, hi = 0, len(df)
+        if inicio is not None:
+            lo = np.searchsorted(valores, pd.Timestamp(inicio).to_datetime64(), side="left" if fechado_inicio else "right")
+        if fim is not None:
+            hi = np.searchsorted(valores, pd.Timestamp(fim).to_datetime64(), side="right" if fechado_fim else "left")
+        else:
+            # Exclui as datas inválidas (NaT), que ficam ao final
+            hi = np.searchsorted(valores, np.datetime64("NaT"), side="left")
+        return df.iloc[lo:max(lo, hi)]
+
+    mask = datas.notna()
+    if inicio is not None:
+        mask &= (datas >= pd.Timestamp(inicio)) if fechado_inicio else (datas > pd.Timestamp(inicio))
+    if fim is not None:
+        mask &= (datas <= pd.Timestamp(fim)) if fechado_fim else (datas < pd.Timestamp(fim))
+    return df[mask]
+
+# Função para formatar valores em reais (sem usar locale)
+def formatar_moeda(valor):
+    if pd.isna(valor):
+        return "R$ 0,00"
+    return f'R$ {valor:,.2f}'.replace(',', 'v').replace('.', ',').replace('v', '.')
+
+# Contas com mais de 90 dias na data de referência (hoje, por padrão): as que entraram antes
+# dela menos 90 dias, uma fatia pela busca binária na coluna ordenada
+def contas_antigas(df, data_referencia=None):
+    hoje = pd.Timestamp(data_referencia).normalize() if data_referencia is not None else pd.Timestamp.today().normalize()
+    return fatiar_por_data(df, fim=hoje - pd.Timedelta(days=90), fechado_fim=False)
+
+# Contas de um alerta da aba de insights: as antigas na data de referência, as demais pelo
+# byte de alertas
+def contas_criticas(df, nome, data_referencia=None):
+    if nome == "antigas":
+        return contas_antigas(df, data_referencia)
+    return contas_com_alerta(df, nome)
+
+# Função para gerar insights iniciais (as contagens vêm dos alertas gravados na importação)
+def gerar_insights(df, projecao=None, data_referencia=None):
+    contagem = contar_alertas(df)
+    mediana = df.attrs.get("mediana_valor", np.nan)
+
+    resumo_convenio = df.groupby("Convênio")["Valor conta"].agg(
+        Quantidade="count",
+        Valor_Total="sum"
+    ).sort_values(by="Valor_Total", ascending=False)
+
+    contas_90_dias = contas_antigas(df, data_referencia)
+
+    contas_antiga_status = contas_90_dias.groupby("Último Setor destino").size().sort_values(ascending=False).reset_index()
+    gargalo = contas_antiga_status.iloc[0]["Último Setor destino"] if not contas_antiga_status.empty else "Nenhum"
+
+    # Projeção de recebíveis
+    valor_total = df["Valor conta"].sum()
+    projecao_30d = fatiar_por_data(df, inicio=pd.Timestamp.today() - pd.Timedelta(days=30), fechado_inicio=False)["Valor conta"].sum()
+    tendencia = (projecao_30d / df["Valor conta"].sum()) * 100 if valor_total > 0 else 0
+    linha_tendencia = f"A tendência de novos valores nos últimos 30 dias representa {tendencia:.1f}% do valor total em aberto, o que indica {' aceleração' if tendencia > 33 else ' normalidade' if tendencia > 20 else ' desaceleração'} no ciclo de faturamento."
+
+    # Com o modelo de previsão ajustado, a tendência passa a comparar a projeção do
+    # próximo mês com o último mês fechado
+    if projecao is not None and projecao["valor_ultimo_mes"] > 0:
+        variacao = (projecao["valor"] / projecao["valor_ultimo_mes"] - 1) * 100
+        linha_tendencia = f"A projeção de novos valores para {projecao['mes']} é de R$ {projecao['valor']:,.2f}, {abs(variacao):.1f}% {'acima' if variacao >= 0 else 'abaixo'} do último mês fechado ({projecao['ultimo_mes']}), o que indica {' aceleração' if variacao > 10 else ' normalidade' if variacao > -10 else ' desaceleração'} no ciclo de faturamento."
+
+    return f"""
+    **Principais insights iniciais:**
+    - {contagem["zeradas"]} contas estão com valor zerado, o que pode indicar falha de fechamento, isenção contratual ou erro de sistema.
+    - {contagem["sem_alta"]} contas estão associadas a pacientes sem alta, o que pode impactar o ciclo de faturamento e deve ser monitorado.
+    - Cerca de {contagem["abaixo_mediana"] / len(df) * 100 if len(df) else 0:.0f}% das contas possuem valor abaixo de R$ {mediana:,.2f} (mediana do arquivo), sugerindo foco em resolução de volume com baixo impacto financeiro.
+    - {contagem["outliers"]} contas estão muito acima do valor típico do seu convênio e tipo de atendimento (escore robusto acima de {str(limite_escore).replace('.', ',')}), recomendando revisão prioritária e validação de glosas ou auditoria específica.
+    - Os convênios {', '.join(resumo_convenio.head(2).index)} concentram {resumo_convenio.head(2)["Valor_Total"].sum() / resumo_convenio["Valor_Total"].sum() * 100:.0f}% do valor total em aberto e devem ser tratados com régua especial de cobrança.
+    - Identificamos {contas_90_dias.shape[0]} contas com mais de 90 dias desde a entrada, com maior concentração no setor "{gargalo}", indicando possível gargalo de processo.
+    - {linha_tendencia}
+    """ + (f"""- {contagem["valor_invalido"]} contas têm valor preenchido na planilha que não pôde ser lido e ficou vazio; confira a origem dos dados.
+    """ if contagem["valor_invalido"] else "")
+
+# Idade e faixa de aging de cada conta na data de referência (hoje, por padrão).
+# Contas que entraram depois da data de referência ficam sem faixa.
+def calcular_aging(df, data_referencia=None):
+    hoje = pd.Timestamp(data_referencia).normalize() if data_referencia is not None else pd.Timestamp.today().normalize()
+    df["Dias Pendentes"] = (hoje - df["Data entrada"].dt.normalize()).dt.days
+
+    # Criar coluna de categoria de aging
+    df["Categoria Aging"] = pd.cut(
+        df["Dias Pendentes"],
+        bins=[c[0]-1 for c in categorias_aging] + [float('inf')],
+        labels=ordem_aging,
+        right=True
+    )
+
+    return df
+
+# Faixa de aging de cada conta na data de referência, sem alterar df (a coluna "Categoria
+# Aging" de preparar_dados vale para o dia da importação)
+def faixas_aging(df, data_referencia=None):
+    return calcular_aging(df[["Data entrada"]].copy(), data_referencia)["Categoria Aging"]
+
+# KPIs na data de referência (hoje, por padrão). Com uma data de referência, só entram as
+# contas que já tinham entrado até ela.
+def calcular_kpis(df, data_referencia=None):
+    if data_referencia is not None:
+        # Até o fim do dia de referência (entradas com hora no próprio dia contam, como no índice)
+        df = fatiar_por_data(df, fim=pd.Timestamp(data_referencia).normalize() + pd.Timedelta(days=1), fechado_fim=False)
+
+    # KPIs básicos
+    total_contas = df.shape[0]
+    valor_total = df["Valor conta"].sum()
+    ticket_medio = valor_total / total_contas if total_contas > 0 else 0
+
+    # KPIs avançados (dias pendentes calculados uma única vez, sem cópia do DataFrame)
+    hoje = pd.Timestamp(data_referencia).normalize() if data_referencia is not None else pd.Timestamp.today().normalize()
+    dias = (hoje - df["Data entrada"].dt.normalize()).dt.days.to_numpy(dtype=float, na_value=np.nan)
+    valores = df["Valor conta"].to_numpy(dtype=float, na_value=np.nan)
+
+    # Idade média das contas (em dias)
+    idade_media = np.nanmean(dias) if np.isfinite(dias).any() else np.nan
+
+    ate_30 = dias <= 30
+    ate_60 = (dias > 30) & (dias <= 60)
+    ate_90 = (dias > 60) & (dias <= 90)
+    mais_90 = dias > 90
+
+    # Contas por idade
+    contas_30d = int(ate_30.sum())
+    contas_60d = int(ate_60.sum())
+    contas_90d = int(ate_90.sum())
+    contas_mais_90d = int(mais_90.sum())
+
+    # Percentual de contas acima de 90 dias
+    perc_acima_90d = (contas_mais_90d / total_contas) * 100 if total_contas > 0 else 0
+
+    # Valor por idade
+    valor_30d = np.nansum(valores[ate_30])
+    valor_60d = np.nansum(valores[ate_60])
+    valor_90d = np.nansum(valores[ate_90])
+    valor_mais_90d = np.nansum(valores[mais_90])
+
+    # Valor em risco (contas acima de 90 dias)
+    valor_em_risco = valor_mais_90d
+    perc_valor_em_risco = (valor_em_risco / valor_total) * 100 if valor_total > 0 else 0
+
+    return {
+        "total_contas": total_contas,
+        "valor_total": valor_total,
+        "ticket_medio": ticket_medio,
+        "idade_media": idade_media,
+        "contas_30d": contas_30d,
+        "contas_60d": contas_60d,
+        "contas_90d": contas_90d,
+        "contas_mais_90d": contas_mais_90d,
+        "perc_acima_90d": perc_acima_90d,
+        "valor_30d": valor_30d,
+        "valor_60d": valor_60d,
+        "valor_90d": valor_90d,
+        "valor_mais_90d": valor_mais_90d,
+        "valor_em_risco": valor_em_risco,
+        "perc_valor_em_risco": perc_valor_em_risco
+    }
+
+# Seleciona as colunas esperadas, converte tipos e adiciona colunas derivadas (formato_data:
+# formato das datas em texto, quando conhecido; sem ele o pandas infere, com o mês primeiro)
+def preparar_dados(df, formato_data=None):
+    colunas_disponiveis = [col for col in colunas_necessarias if col in df.columns]
+    colunas_faltantes = sorted(set(colunas_necessarias) - set(colunas_disponiveis))
+    if coluna_origem in df.columns:
+        colunas_disponiveis.append(coluna_origem)
+
+    # A coluna de alta não está entre as esperadas: é lida do arquivo bruto, antes da seleção.
+    # Planilhas lidas por aba (ingestao.ler_aba) já trazem a máscara, vazia nas abas sem a coluna.
+    if coluna_sem_alta in df.columns:
+        sem_alta = df[coluna_sem_alta].eq(True).to_numpy()
+    else:
+        alta = coluna_alta(df.columns)
+        sem_alta = df[alta].isna().to_numpy() if alta is not None else None
+
+    # Alertas da leitura que as linhas já trazem (snapshots do histórico)
+    # (um "Alertas" em texto, de uma planilha exportada pelo app, não conta)
+    anteriores = None
+    if coluna_alertas in df.columns and pd.api.types.is_integer_dtype(df[coluna_alertas]):
+        anteriores = df[coluna_alertas].to_numpy(dtype=np.uint8)
+
+    df = df[colunas_disponiveis].copy()
+
+    # Converter e limpar dados (guardando o que a conversão deixou vazio)
+    valores_originais, datas_originais = df["Valor conta"], df["Data entrada"]
+    df["Valor conta"] = pd.to_numeric(df["Valor conta"], errors="coerce")
+    df["Data entrada"] = pd.to_datetime(df["Data entrada"], errors="coerce", format=formato_data)
+
+    # Adicionar colunas úteis
+    df["AnoMes"] = df["Data entrada"].dt.to_period("M").astype(str)
+    df = calcular_aging(df)
+
+    # Alertas que só o arquivo bruto mostra (os dos valores vêm de validar_contas, depois da
+    # remoção de duplicatas)
+    df = marcar_alertas_leitura(
+        df, sem_alta=sem_alta,
+        valor_invalido=nao_convertidos(valores_originais, df["Valor conta"]),
+        data_invalida=nao_convertidos(datas_originais, df["Data entrada"]), anteriores=anteriores
+    )
+
+    # Colunas só de texto lidas como object passam para o Arrow (colunas mistas ficam como estão)
+    colunas_texto = [
+        col for col in df.columns
+        if pd.api.types.is_object_dtype(df[col]) and pd.api.types.infer_dtype(df[col], skipna=True) == "string"
+    ]
+    df[colunas_texto] = df[colunas_texto].astype(tipo_texto)
+
+    # Ordenar por data de entrada (datas inválidas ao final) para permitir fatias por busca binária
+    df = df.sort_values("Data entrada", kind="stable", na_position="last", ignore_index=True)
+    df.attrs["ordenado_por_data"] = True
+
+    return df, colunas_faltantes
+
+# Lê a primeira aba da planilha enviada e prepara os dados para análise
+def carregar_planilha(arquivo):
+    xls = pd.ExcelFile(arquivo)
+    primeira_aba = xls.sheet_names[0]
+    df = pd.read_excel(xls, sheet_name=primeira_aba)
+    return preparar_dados(df)
+
+# Filtros da barra lateral. O intervalo de datas é fatiado por busca binária; as demais
+# seleções recebem None quando "Selecionar todos" está marcado (basta descartar vazios).
+def aplicar_filtros(df, data_inicio, data_fim, convenios, medicos, status, setores):
+    df = fatiar_por_data(df, inicio=data_inicio, fim=pd.Timestamp(data_fim) + pd.Timedelta(days=1), fechado_fim=False)
+
+    mask = np.ones(len(df), dtype=bool)
+    for coluna, selecionados in [
+        ("Convênio", convenios),
+        ("Médico executor", medicos),
+        ("Status", status),
+        ("Último Setor destino", setores),
+    ]:
+        if selecionados is None:
+            mask &= df[coluna].notna().to_numpy()
+        else:
+            mask &= df[coluna].isin(selecionados).to_numpy()
+
+    return df if mask.all() else df[mask]
+
+# Contagem das contas que merecem atenção (aba de insights); as listas saem de
+# contas_criticas só quando são baixadas
+def separar_contas_criticas(df, data_referencia=None):
+    return {
+        "limite_escore": limite_escore,
+        "mediana": df.attrs.get("mediana_valor", np.nan),
+        "contagens": dict(contar_alertas(df), antigas=len(contas_antigas(df, data_referencia))),
+    }
+
+# Resumo financeiro agrupado por uma coluna, com proporção do total
+def resumir_por(df, coluna, completo=False):
+    agregacoes = dict(Quantidade="count", Total="sum", Média="mean")
+    if completo:
+        agregacoes.update(Mediana="median", Mínimo="min", Máximo="max")
+
+    resumo = df.groupby(coluna)["Valor conta"].agg(**agregacoes).sort_values(by="Total", ascending=False)
+
+    # Adicionar proporção do total
+    if resumo["Total"].sum() > 0:
+        resumo["% do Total"] = (resumo["Total"] / resumo["Total"].sum()) * 100
+    else:
+        resumo["% do Total"] = 0
+
+    return resumo
+
+def calcular_resumo_convenio(df):
+    return resumir_por(df, "Convênio", completo=True)
+
+def calcular_resumo_setor(df):
+    return resumir_por(df, "Último Setor destino")
+
+def calcular_resumo_medico(df):
+    return resumir_por(df, "Médico executor")
+
+# Valor por faixa de aging (na data de referência) para os principais convênios
+def calcular_aging_convenio(df, resumo_convenio, top=5, data_referencia=None):
+    top_convenios = resumo_convenio.head(top).index.tolist()
+    df_top = df[df["Convênio"].isin(top_convenios)]
+    return df_top.groupby(["Convênio", faixas_aging(df_top, data_referencia)], observed=False)["Valor conta"].sum().reset_index()
+
+def calcular_dias_pendentes(df):
+    return (pd.Timestamp.today().normalize() - df["Data entrada"].dt.normalize()).dt.days
+
+def calcular_tempo_medio_setor(df):
+    df_tempo = df.copy()
+    df_tempo["Dias Pendentes"] = calcular_dias_pendentes(df_tempo)
+    return df_tempo.groupby("Último Setor destino")["Dias Pendentes"].mean().sort_values(ascending=False)
+
+# Ligações Status -> Convênio para o diagrama Sankey
+def calcular_fluxo_sankey(df):
+    origem = df["Status"].fillna("Desconhecido")
+    destino = df["Convênio"].fillna("Desconhecido")
+    labels = list(pd.unique(pd.Series(origem.tolist() + destino.tolist())))
+    label_index = {k: v for v, k in enumerate(labels)}
+
+    sankey_df = df.groupby([origem.name, destino.name]).size().reset_index(name="valor")
+    return {
+        "labels": labels,
+        "source": sankey_df[origem.name].map(label_index),
+        "target": sankey_df[destino.name].map(label_index),
+        "value": sankey_df["valor"],
+    }
+
+# Valor total dos principais médicos por convênio (mapa de calor)
+def calcular_medico_convenio(df, resumo_medico, top=5):
+    top_medicos = resumo_medico.head(top).index.tolist()
+    df_med_conv = df[df["Médico executor"].isin(top_medicos)]
+    med_conv = df_med_conv.groupby(["Médico executor", "Convênio"])["Valor conta"].sum().reset_index()
+    return med_conv.pivot(index="Médico executor", columns="Convênio", values="Valor conta").fillna(0)
+
+# Setores com contas pendentes há mais de 90 dias
+def calcular_gargalos(df):
+    df_eficiencia = df.copy()
+    df_eficiencia["Dias Pendentes"] = calcular_dias_pendentes(df_eficiencia)
+    antigas = df_eficiencia[df_eficiencia["Dias Pendentes"] > 90]
+
+    gargalos = antigas.groupby("Último Setor destino").agg(
+        Quantidade=("Conta", "count"),
+        Valor_Total=("Valor conta", "sum"),
+        Tempo_Medio=("Dias Pendentes", "mean")
+    ).sort_values(by="Quantidade", ascending=False).reset_index()
+
+    if not gargalos.empty:
+        gargalos["% do Total de Contas"] = (gargalos["Quantidade"] / antigas.shape[0]) * 100
+        gargalos["Percentual Acumulado"] = gargalos["Quantidade"].cumsum() / gargalos["Quantidade"].sum() * 100
+
+    return gargalos
+
+def calcular_aging_resumo(df, data_referencia=None):
+    return df.groupby(faixas_aging(df, data_referencia), observed=False).agg(
+        Quantidade=("Conta", "count"),
+        Valor_Total=("Valor conta", "sum")
+    ).reset_index()
+
+# Função para gerar Excel para download
+def gerar_excel_bytes(df, nome_aba):
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        descrever_alertas(df).to_excel(writer, index=False, sheet_name=nome_aba)
+    return buffer
+
+# Relatório completo com resumos, contas críticas (pelos alertas e, as de mais de 90 dias, na
+# data de referência) e dados filtrados; as datas inválidas saem de df_completo (o arquivo
+# inteiro), quando informado
+def gerar_relatorio_excel(df, kpis, resumo_convenio, resumo_etapa, resumo_medico, df_completo=None, data_referencia=None):
+    buffer = BytesIO()
+
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        # Resumo geral
+        pd.DataFrame([kpis]).to_excel(writer, sheet_name="Resumo Geral", index=False)
+
+        # Análise por convênio
+        resumo_convenio.reset_index().to_excel(writer, sheet_name="Análise por Convênio", index=False)
+
+        # Análise por setor
+        resumo_etapa.reset_index().to_excel(writer, sheet_name="Análise por Setor", index=False)
+
+        # Análise por médico
+        resumo_medico.reset_index().to_excel(writer, sheet_name="Análise por Médico", index=False)
+
+        # Contas com problemas
+        for nome, aba in [
+            ("zeradas", "Contas Zeradas"),
+            ("outliers", "Contas Outliers"),
+            ("antigas", "Contas >90 dias"),
+            ("valor_invalido", "Valores Inválidos"),
+        ]:
+            contas = contas_criticas(df, nome, data_referencia)
+            if not contas.empty:
+                descrever_alertas(contas).to_excel(writer, sheet_name=aba, index=False)
+
+        # Contas sem data ficam fora de qualquer recorte por data: saem do arquivo inteiro
+        datas_invalidas = contas_com_alerta(df if df_completo is None else df_completo, "data_invalida")
+        if not datas_invalidas.empty:
+            descrever_alertas(datas_invalidas).to_excel(writer, sheet_name="Datas Inválidas", index=False)
+
+        # Análise de aging
+        calcular_aging_resumo(df, data_referencia).to_excel(writer, sheet_name="Aging", index=False)
+
+        # Dados filtrados
+        descrever_alertas(df).to_excel(writer, sheet_name="Dados Completos", index=False)
+
+    return buffer
@@ -0,0 +1,322 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+from analises import (
+    calcular_kpis, aplicar_filtros, calcular_resumo_convenio, calcular_gargalos
+)
+from indice_datas import IndiceDatas
+from aging import MotorAging, series_do_recorte
+from ingestao import carregar_arquivo
+from deduplicacao import regras_deduplicacao, regra_padrao, deduplicar
+from qualidade import validar_contas
+from exportacao import formatos_exportacao, exportar
+
+# API HTTP/JSON local com os mesmos números do dashboard, para o portal de BI e outras
+# ferramentas internas.
+#
+# Os arquivos são carregados uma vez na subida do servidor (um "snapshot" por arquivo) e as
+# consultas são respondidas a partir deles, com os mesmos atalhos do app (índice de datas
+# para recortes de data/convênio). As respostas ficam em um cache LRU por consulta
+# canônica, e o ThreadingHTTPServer atende uma thread por requisição.
+#
+# Uso:
+#   python api.py contas.xlsx                        # http://127.0.0.1:8765
+#   python api.py jan.xlsx fev.xlsx --porta 9000     # vários snapshots (?snapshot=jan)
+#
+# Rotas (todas GET, filtros opcionais como na barra lateral):
+#   /saude                                   snapshots carregados e estatísticas do cache
+#   /kpis?data_inicio=2025-01-01&convenio=SUS&convenio=UNIMED&data_referencia=2025-06-30
+#   /resumo_convenio?setor=Faturamento
+#   /aging?data_referencia=2025-05-31&data_referencia=2025-06-30
+#   /gargalos?status=Pendente
+#   /exportar?formato=parquet&convenio=SUS   contas do recorte (csv ou parquet), em blocos
+#
+# Parâmetros de filtro: data_inicio, data_fim, convenio, medico, status, setor (os quatro
+# últimos podem se repetir) e snapshot.
+
+porta_padrao = 8765
+tamanho_cache_padrao = 512
+
+filtros_lista = {
+    "convenio": "convenios",
+    "medico": "medicos",
+    "status": "status",
+    "setor": "setores",
+}
+
+class ErroConsulta(ValueError):
+    pass
+
+def ler_data(texto):
+    try:
+        return pd.Timestamp(texto).normalize()
+    except ValueError:
+        raise ErroConsulta(f"Data inválida: {texto}")
+
+def carregar_snapshot(caminho, regra_duplicatas=regra_padrao):
+    caminho = Path(caminho)
+    df = carregar_arquivo(caminho)
+    if regra_duplicatas is not None:
+        df, relatorio = deduplicar(df, regra_duplicatas)
+        print(f"{caminho.stem}: {relatorio['linhas_removidas']} linhas repetidas removidas em {relatorio['segundos']:.2f} s", file=sys.stderr)
+    return validar_contas(df)
+
+class Snapshot:
+
+    def __init__(self, nome, df):
+        self.nome = nome
+        self.df = df
+        self.indice = IndiceDatas(df)
+        self.data_min = df["Data entrada"].min()
+        self.data_max = df["Data entrada"].max()
+
+    # Argumentos de aplicar_filtros a partir dos parâmetros da consulta
+    def filtros(self, parametros):
+        data_inicio = ler_data(parametros["data_inicio"][0]) if "data_inicio" in parametros else self.data_min
+        data_fim = ler_data(parametros["data_fim"][0]) if "data_fim" in parametros else self.data_max
+
+        filtros = {"data_inicio": data_inicio, "data_fim": data_fim}
+        for parametro, argumento in filtros_lista.items():
+            filtros[argumento] = parametros.get(parametro)
+        return filtros
+
+    def recortar(self, filtros):
+        return aplicar_filtros(self.df, **filtros)
+
+    def kpis(self, parametros):
+        filtros = self.filtros(parametros)
+        referencia = ler_data(parametros["data_referencia"][0]) if "data_referencia" in parametros else None
+        if filtros["medicos"] is None and filtros["status"] is None and filtros["setores"] is None:
+            return self.indice.kpis(filtros["data_inicio"], filtros["data_fim"], filtros["convenios"], hoje=referencia)
+        return calcular_kpis(self.recortar(filtros), referencia)
+
+    def resumo_convenio(self, parametros):
+        return calcular_resumo_convenio(self.recortar(self.filtros(parametros))).reset_index()
+
+    def aging(self, parametros):
+        filtros = self.filtros(parametros)
+        if filtros["medicos"] is None and filtros["status"] is None and filtros["setores"] is None:
+            motor = MotorAging(self.indice.series(filtros["convenios"]), filtros["data_inicio"], filtros["data_fim"])
+        else:
+            motor = MotorAging(series_do_recorte(self.recortar(filtros)))
+
+        # Datas repetidas ou em outra ordem dão a mesma resposta (como na chave do cache)
+        datas = sorted({ler_data(d) for d in parametros.get("data_referencia", ["today"])})
+        quantidade, valor = motor.matriz(datas)
+        return [
+            {"data_referencia": data, "faixas": [
+                {"Categoria Aging": faixa, "Quantidade": quantidade.loc[data, faixa], "Valor_Total": valor.loc[data, faixa]}
+                for faixa in quantidade.columns
+            ]}
+            for data in quantidade.index
+        ]
+
+    def gargalos(self, parametros):
+        return calcular_gargalos(self.recortar(self.filtros(parametros)))
+
+rotas = {
+    "/kpis": Snapshot.kpis,
+    "/resumo_convenio": Snapshot.resumo_convenio,
+    "/aging": Snapshot.aging,
+    "/gargalos": Snapshot.gargalos,
+}
+
+# Converte resultados (dicts, DataFrames, tipos NumPy/pandas) em tipos aceitos pelo json;
+# NaN vira null
+def para_json(valor):
+    if isinstance(valor, pd.DataFrame):
+        return [para_json(linha) for linha in valor.to_dict(orient="records")]
+    if isinstance(valor, dict):
+        return {str(chave): para_json(v) for chave, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [para_json(v) for v in valor]
+    if isinstance(valor, (pd.Timestamp, pd.Period)):
+        return str(valor.date()) if isinstance(valor, pd.Timestamp) else str(valor)
+    if isinstance(valor, np.integer):
+        return int(valor)
+    if isinstance(valor, (float, np.floating)):
+        return float(valor) if np.isfinite(valor) else None
+    return valor
+
+class CacheRespostas:
+    # LRU de respostas já serializadas, por consulta canônica
+
+    def __init__(self, tamanho=tamanho_cache_padrao):
+        self.tamanho = tamanho
+        self.respostas = OrderedDict()
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave):
+        with self.lock:
+            corpo = self.respostas.get(chave)
+            if corpo is None:
+                self.faltas += 1
+                return None
+            self.respostas.move_to_end(chave)
+            self.acertos += 1
+            return corpo
+
+    def guardar(self, chave, corpo):
+        with self.lock:
+            self.respostas[chave] = corpo
+            self.respostas.move_to_end(chave)
+            while len(self.respostas) > self.tamanho:
+                self.respostas.popitem(last=False)
+
+    def estatisticas(self):
+        with self.lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "entradas": len(self.respostas),
+                "tamanho_maximo": self.tamanho,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": self.acertos / consultas if consultas else None,
+            }
+
+# Mesma consulta com parâmetros em outra ordem (ou valores repetidos) cai na mesma chave
+def chave_consulta(rota, parametros):
+    return rota + json.dumps(sorted((nome, sorted(set(valores))) for nome, valores in parametros.items()), ensure_ascii=False)
+
+class ManipuladorApi(BaseHTTPRequestHandler):
+    server_version = "DataCopilotAPI/1.0"
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        url = urlsplit(self.path)
+        parametros = parse_qs(url.query)
+        servidor = self.server
+
+        if url.path == "/saude":
+            corpo = {
+                "snapshots": {nome: len(s.df) for nome, s in servidor.snapshots.items()},
+                "padrao": servidor.snapshot_padrao,
+                "cache": servidor.cache.estatisticas(),
+            }
+            return self.responder(200, json.dumps(corpo, ensure_ascii=False).encode("utf-8"), "-", inicio)
+
+        if url.path not in rotas and url.path != "/exportar":
+            return self.responder_erro(404, f"Rota desconhecida: {url.path}", inicio)
+
+        nome_snapshot = parametros.pop("snapshot", [servidor.snapshot_padrao])[0]
+        if nome_snapshot not in servidor.snapshots:
+            return self.responder_erro(404, f"Snapshot desconhecido: {nome_snapshot}", inicio)
+
+        if url.path == "/exportar":
+            return self.exportar(servidor.snapshots[nome_snapshot], parametros, inicio)
+
+        # Sem data de referência, /kpis, /aging e /gargalos valem para hoje: a data resolvida entra
+        # na chave, para a resposta de ontem não ser servida depois da meia-noite
+        chave = f"{nome_snapshot}:{pd.Timestamp.today().date()}:" + chave_consulta(url.path, parametros)
+        corpo = servidor.cache.obter(chave)
+        if corpo is not None:
+            return self.responder(200, corpo, "HIT", inicio)
+
+        try:
+            resultado = rotas[url.path](servidor.snapshots[nome_snapshot], parametros)
+            corpo = json.dumps(para_json(resultado), ensure_ascii=False).encode("utf-8")
+        except ErroConsulta as e:
+            return self.responder_erro(400, str(e), inicio)
+        except Exception as e:
+            return self.responder_falha(e, inicio)
+
+        servidor.cache.guardar(chave, corpo)
+        self.responder(200, corpo, "MISS", inicio)
+
+    # Contas do recorte escritas em blocos direto no socket, sem passar pelo cache. A resposta
+    # vai sem Content-Length e termina com o fechamento da conexão (HTTP/1.0), então a memória
+    # usada é a de um bloco, qualquer que seja o tamanho do recorte.
+    def exportar(self, snapshot, parametros, inicio):
+        formato = parametros.pop("formato", ["csv"])[0]
+        if formato not in formatos_exportacao:
+            return self.responder_erro(400, f"Formato desconhecido: {formato}", inicio)
+        try:
+            recorte = snapshot.recortar(snapshot.filtros(parametros))
+        except ErroConsulta as e:
+            return self.responder_erro(400, str(e), inicio)
+        except Exception as e:
+            return self.responder_falha(e, inicio)
+
+        self.send_response(200)
+        self.send_header("Content-Type", formatos_exportacao[formato][1])
+        self.send_header("Content-Disposition", f'attachment; filename="contas_filtradas.{formato}"')
+        self.send_header("X-Linhas", str(len(recorte)))
+        self.end_headers()
+        exportar(recorte, formato, self.wfile)
+
+    def responder(self, codigo, corpo, situacao_cache, inicio):
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.send_header("X-Cache", situacao_cache)
+        self.send_header("Server-Timing", f"app;dur={(time.perf_counter() - inicio) * 1000:.2f}")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def responder_erro(self, codigo, mensagem, inicio):
+        self.responder(codigo, json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8"), "-", inicio)
+
+    # Erro inesperado na consulta: 500 em JSON para o cliente e o traceback no log do servidor
+    def responder_falha(self, erro, inicio):
+        traceback.print_exc(file=sys.stderr)
+        self.responder_erro(500, f"Erro interno: {type(erro).__name__}: {erro}", inicio)
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+class ServidorApi(ThreadingHTTPServer):
+    daemon_threads = True
+    # A fila padrão (5 conexões) descarta conexões sob concorrência e o cliente só
+    # reenvia o SYN depois de 1 s, o que aparecia direto no p99
+    request_queue_size = 128
+
+def criar_servidor(snapshots, host="127.0.0.1", porta=porta_padrao, tamanho_cache=tamanho_cache_padrao, silencioso=False):
+    servidor = ServidorApi((host, porta), ManipuladorApi)
+    servidor.snapshots = snapshots
+    servidor.snapshot_padrao = list(snapshots)[-1]
+    servidor.cache = CacheRespostas(tamanho_cache)
+    servidor.silencioso = silencioso
+    return servidor
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP/JSON local com os KPIs e resumos do dashboard.")
+    parser.add_argument("arquivos", nargs="+", help="planilhas .xlsx (ou .parquet/.csv do gerador) a carregar")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=porta_padrao)
+    parser.add_argument("--tamanho-cache", type=int, default=tamanho_cache_padrao, help="respostas mantidas no cache LRU")
+    parser.add_argument("--regra-duplicatas", default=regra_padrao, choices=[*regras_deduplicacao, "nenhuma"],
+                        help="como tratar linhas repetidas de Conta/Atendimento")
+    parser.add_argument("--silencioso", action="store_true", help="não registra cada requisição")
+    args = parser.parse_args()
+
+    snapshots = {}
+    for arquivo in args.arquivos:
+        inicio = time.perf_counter()
+        snapshots[Path(arquivo).stem] = Snapshot(Path(arquivo).stem, carregar_snapshot(
+            arquivo, None if args.regra_duplicatas == "nenhuma" else args.regra_duplicatas
+        ))
+        print(f"Snapshot {Path(arquivo).stem}: {len(snapshots[Path(arquivo).stem].df)} contas em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+    servidor = criar_servidor(snapshots, args.host, args.porta, args.tamanho_cache, args.silencioso)
+    print(f"API em http://{args.host}:{args.porta} (snapshots: {', '.join(snapshots)})", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
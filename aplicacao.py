@@ -1,130 +1,145 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
-import calendar
 
-# Função para formatar valores em reais (sem usar locale)
-def formatar_moeda(valor):
-    if pd.isna(valor):
-        return "R$ 0,00"
-    return f'R$ {valor:,.2f}'.replace(',', 'v').replace('.', ',').replace('v', '.')
+# Só o Streamlit é importado antes do upload: título e campo de upload aparecem sem esperar
+# pandas, plotly e os módulos de análise, que são carregados quando há um arquivo.
 
-# Função para gerar insights iniciais
-def gerar_insights(df):
-    q1 = df["Valor conta"].quantile(0.25)
-    q3 = df["Valor conta"].quantile(0.75)
-    iqr = q3 - q1
-    limite_superior = q3 + 1.5 * iqr
-    outliers = df[df["Valor conta"] > limite_superior]
+# Pool de threads compartilhado por todas as sessões para o pré-cálculo das visões pesadas
+@st.cache_resource
+def executor_precomputacao():
+    from precomputacao import criar_executor
+    return criar_executor()
 
-    resumo_convenio = df.groupby("Convênio")["Valor conta"].agg(
-        Quantidade="count", 
-        Valor_Total="sum"
-    ).sort_values(by="Valor_Total", ascending=False)
+# Gerenciador único da memória das sessões: descarrega em disco os dados das sessões ociosas
+@st.cache_resource
+def gerenciador_memoria():
+    from memoria_sessoes import GerenciadorMemoria
+    return GerenciadorMemoria()
 
-    contas_90_dias = df[df["Data entrada"] < pd.Timestamp.today() - pd.Timedelta(days=90)]
-    
-    contas_antiga_status = contas_90_dias.groupby("Último Setor destino").size().sort_values(ascending=False).reset_index()
-    gargalo = contas_antiga_status.iloc[0]["Último Setor destino"] if not contas_antiga_status.empty else "Nenhum"
+# Figuras Plotly já montadas, compartilhadas pelas sessões (mesmo arquivo e mesmos filtros)
+@st.cache_resource
+def figuras_compartilhadas():
+    from cache_figuras import CacheFiguras
+    return CacheFiguras()
 
-    zeradas = df[df["Valor conta"] == 0].shape[0]
-    sem_alta = df[df.columns[df.columns.str.lower().str.contains("alta")][0]].isna().sum() if any(df.columns.str.lower().str.contains("alta")) else 0
+# Histórico de snapshots (exports guardados), dividido pelas sessões
+@st.cache_resource
+def historico_contas():
+    from historico import HistoricoContas
+    return HistoricoContas()
 
-    # Projeção de recebíveis
-    valor_total = df["Valor conta"].sum()
-    projecao_30d = df[df["Data entrada"] > pd.Timestamp.today() - pd.Timedelta(days=30)]["Valor conta"].sum()
-    tendencia = (projecao_30d / df["Valor conta"].sum()) * 100 if valor_total > 0 else 0
+# Matrizes de transição entre faixas de aging dos snapshots do histórico, com os pares já
+# calculados divididos pelas sessões
+@st.cache_resource
+def transicoes_aging():
+    from transicoes import TransicoesAging
+    return TransicoesAging(historico_contas())
 
-    return f"""
-    **Principais insights iniciais:**
-    - {zeradas} contas estão com valor zerado, o que pode indicar falha de fechamento, isenção contratual ou erro de sistema.
-    - {sem_alta} contas estão associadas a pacientes sem alta, o que pode impactar o ciclo de faturamento e deve ser monitorado.
-    - Cerca de {(df["Valor conta"] < df["Valor conta"].median()).mean()*100:.0f}% das contas possuem valor abaixo de R$ {df["Valor conta"].median():,.2f}, sugerindo foco em resolução de volume com baixo impacto financeiro.
-    - {outliers.shape[0]} contas estão acima de R$ {limite_superior:,.2f} (outliers), recomendando revisão prioritária e validação de glosas ou auditoria específica.
-    - Os convênios {', '.join(resumo_convenio.head(2).index)} concentram {resumo_convenio.head(2)["Valor_Total"].sum() / resumo_convenio["Valor_Total"].sum() * 100:.0f}% do valor total em aberto e devem ser tratados com régua especial de cobrança.
-    - Identificamos {contas_90_dias.shape[0]} contas com mais de 90 dias desde a entrada, com maior concentração no setor "{gargalo}", indicando possível gargalo de processo.
-    - A tendência de novos valores nos últimos 30 dias representa {tendencia:.1f}% do valor total em aberto, o que indica {' aceleração' if tendencia > 33 else ' normalidade' if tendencia > 20 else ' desaceleração'} no ciclo de faturamento.
-    """
+# Formatos das colunas das tabelas. Os DataFrames vão para o st.dataframe sem Styler, que
+# formataria cada célula em Python a cada rerun; o navegador formata a partir do Arrow.
+def formatos_colunas(moeda=(), inteiros=(), percentuais=(), decimais=()):
+    formatos = {}
+    for coluna in moeda:
+        formatos[coluna] = st.column_config.NumberColumn(f"{coluna} (R$)", format="localized")
+    for coluna in inteiros:
+        formatos[coluna] = st.column_config.NumberColumn(format="%d")
+    for coluna in percentuais:
+        formatos[coluna] = st.column_config.NumberColumn(format="%.2f%%")
+    for coluna in decimais:
+        formatos[coluna] = st.column_config.NumberColumn(format="%.2f")
+    return formatos
 
-def calcular_aging(df):
-    hoje = pd.Timestamp.today().normalize()
-    df["Dias Pendentes"] = (hoje - df["Data entrada"].dt.normalize()).dt.days
-    
-    # Categorias de aging
-    categorias = [
-        (0, 30, "0-30 dias"),
-        (31, 60, "31-60 dias"),
-        (61, 90, "61-90 dias"),
-        (91, 180, "91-180 dias"),
-        (181, 365, "181-365 dias"),
-        (366, float('inf'), "+365 dias")
-    ]
-    
-    # Criar coluna de categoria de aging
-    df["Categoria Aging"] = pd.cut(
-        df["Dias Pendentes"],
-        bins=[c[0]-1 for c in categorias] + [float('inf')],
-        labels=[c[2] for c in categorias],
-        right=True
+# Transições entre faixas de aging em um fragmento: trocar o período, o grupo ou a medida
+# reexecuta só este trecho, e os pares de snapshots já ligados vêm do cache
+@st.fragment
+def explorar_transicoes(transicoes):
+    import pandas as pd
+    from transicoes import dimensoes, matriz_transicao, taxas_rolagem
+    from graficos import figura_matriz_transicao, figura_taxas_rolagem
+
+    snapshots = transicoes.historico.snapshots()
+    rotulos = list(snapshots)
+    if len(rotulos) < 2:
+        st.info("Guarde ao menos dois snapshots no histórico (painel 🗄️ Histórico) para ver as transições entre as faixas de aging.")
+        return
+
+    inicio, fim = st.select_slider(
+        "Snapshots:", options=rotulos, value=(rotulos[max(0, len(rotulos) - 31)], rotulos[-1]),
+        format_func=lambda rotulo: pd.Timestamp(rotulo).strftime("%d/%m/%Y")
     )
-    
-    return df
+    if inicio == fim:
+        st.warning("Escolha dois snapshots diferentes.")
+        return
+    transicoes_periodo = transicoes.obter(inicio, fim)
 
-def calcular_kpis(df):
-    # KPIs básicos
-    total_contas = df.shape[0]
-    valor_total = df["Valor conta"].sum()
-    ticket_medio = valor_total / total_contas if total_contas > 0 else 0
-    
-    # KPIs avançados
-    hoje = pd.Timestamp.today().normalize()
-    df_temp = df.copy()
-    df_temp["Dias Pendentes"] = (hoje - df_temp["Data entrada"].dt.normalize()).dt.days
-    
-    # Idade média das contas (em dias)
-    idade_media = df_temp["Dias Pendentes"].mean()
-    
-    # Contas por idade
-    contas_30d = df_temp[df_temp["Dias Pendentes"] <= 30].shape[0]
-    contas_60d = df_temp[(df_temp["Dias Pendentes"] > 30) & (df_temp["Dias Pendentes"] <= 60)].shape[0]
-    contas_90d = df_temp[(df_temp["Dias Pendentes"] > 60) & (df_temp["Dias Pendentes"] <= 90)].shape[0]
-    contas_mais_90d = df_temp[df_temp["Dias Pendentes"] > 90].shape[0]
-    
-    # Percentual de contas acima de 90 dias
-    perc_acima_90d = (contas_mais_90d / total_contas) * 100 if total_contas > 0 else 0
-    
-    # Valor por idade
-    valor_30d = df_temp[df_temp["Dias Pendentes"] <= 30]["Valor conta"].sum()
-    valor_60d = df_temp[(df_temp["Dias Pendentes"] > 30) & (df_temp["Dias Pendentes"] <= 60)]["Valor conta"].sum()
-    valor_90d = df_temp[(df_temp["Dias Pendentes"] > 60) & (df_temp["Dias Pendentes"] <= 90)]["Valor conta"].sum()
-    valor_mais_90d = df_temp[df_temp["Dias Pendentes"] > 90]["Valor conta"].sum()
-    
-    # Valor em risco (contas acima de 90 dias)
-    valor_em_risco = valor_mais_90d
-    perc_valor_em_risco = (valor_em_risco / valor_total) * 100 if valor_total > 0 else 0
-    
-    return {
-        "total_contas": total_contas,
-        "valor_total": valor_total,
-        "ticket_medio": ticket_medio,
-        "idade_media": idade_media,
-        "contas_30d": contas_30d,
-        "contas_60d": contas_60d,
-        "contas_90d": contas_90d,
-        "contas_mais_90d": contas_mais_90d,
-        "perc_acima_90d": perc_acima_90d,
-        "valor_30d": valor_30d,
-        "valor_60d": valor_60d,
-        "valor_90d": valor_90d,
-        "valor_mais_90d": valor_mais_90d,
-        "valor_em_risco": valor_em_risco,
-        "perc_valor_em_risco": perc_valor_em_risco
-    }
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        dimensao = st.radio("Detalhar por:", ["Todos", *dimensoes], horizontal=True)
+    grupo = None
+    if dimensao != "Todos":
+        grupos = transicoes_periodo[transicoes_periodo["Dimensão"] == dimensao].groupby("Grupo")["Valor"].sum()
+        with col2:
+            grupo = st.selectbox(f"{dimensao}:", grupos.sort_values(ascending=False).index.tolist())
+    with col3:
+        medida = st.radio("Medida:", ["Contas", "Valor"], horizontal=True)
+        taxas = st.checkbox("Percentual da faixa de origem", value=True)
+    dimensao = None if dimensao == "Todos" else dimensao
+
+    matriz = matriz_transicao(transicoes_periodo, dimensao, grupo, medida, taxas)
+    ids = tuple(resumo["id"] for rotulo, resumo in snapshots.items() if inicio <= rotulo <= fim)
+    estado = (ids, dimensao, grupo, medida, taxas)
+    rotulo_cor = "% da origem" if taxas else ("Valor (R$)" if medida == "Valor" else "Contas")
+    figuras = figuras_compartilhadas()
+    st.plotly_chart(
+        figuras.obter("matriz_transicao", estado, lambda: figura_matriz_transicao(matriz, rotulo_cor)),
+        use_container_width=True
+    )
+    colunas = list(matriz.columns)
+    if taxas:
+        formatos = formatos_colunas(percentuais=colunas)
+    else:
+        formatos = formatos_colunas(moeda=colunas) if medida == "Valor" else formatos_colunas(inteiros=colunas)
+    st.dataframe(matriz, column_config=formatos)
+    st.caption(
+        f"{len(ids) - 1} pares de snapshots consecutivos, de {pd.Timestamp(inicio):%d/%m/%Y} a {pd.Timestamp(fim):%d/%m/%Y}. "
+        "Cada par liga um snapshot ao seguinte pela Conta: \"Nova\" é a conta que não estava no anterior, "
+        "\"Resolvida\" a que saiu do seguinte. Usa todo o histórico, sem os filtros da barra lateral."
+    )
+
+    st.markdown("#### 📉 Taxas de rolagem por snapshot")
+    st.plotly_chart(
+        figuras.obter("taxas_rolagem", (ids, dimensao, grupo, medida), lambda: figura_taxas_rolagem(
+            taxas_rolagem(transicoes_periodo, dimensao, grupo, medida)
+        )),
+        use_container_width=True
+    )
+
+# Explorador hierárquico em um fragmento: abrir um nó reexecuta só este trecho, que lê os
+# subtotais já calculados, sem passar de novo pelo resto do dashboard
+@st.fragment
+def explorar_hierarquia(explorador):
+    caminho = []
+    for nivel, coluna in enumerate(explorador.niveis):
+        filhos = explorador.filhos(caminho)
+        st.markdown(f"#### {coluna}" + (f" — {' › '.join(map(str, caminho))}" if caminho else ""))
+        st.dataframe(
+            filhos,
+            column_config=formatos_colunas(
+                moeda=["Total", "Média"], inteiros=["Quantidade"],
+                percentuais=["% do Total"], decimais=["Idade Média (dias)"]
+            ),
+            height=250
+        )
+        if nivel == len(explorador.niveis) - 1 or filhos.empty:
+            break
+        
+        # Uma caixa por nó, para que cada nó lembre o filho que estava aberto
+        escolha = st.selectbox(
+            f"Detalhar {coluna}:", ["-"] + filhos.index.tolist(), key=f"hierarquia:{'/'.join(map(str, caminho))}"
+        )
+        if escolha == "-":
+            break
+        caminho.append(escolha)
 
 # Configuração da página
 st.set_page_config(
@@ -141,58 +156,241 @@ st.markdown("""
     de faturamento e oportunidades de melhoria no ciclo financeiro.
 """)
 
+# Fonte dos dados: a planilha enviada ou um snapshot guardado no histórico
+fonte_historico = st.radio(
+    "Fonte dos dados:", ["Planilha enviada", "Histórico de snapshots"], horizontal=True
+) == "Histórico de snapshots"
+
 # Upload de arquivo
-uploaded_file = st.file_uploader("Faça upload da planilha Excel (.xlsx)", type=["xlsx"])
+uploaded_file = None if fonte_historico else st.file_uploader("Faça upload da planilha Excel (.xlsx)", type=["xlsx"])
 
-if uploaded_file:
-    # Leitura do arquivo
-    xls = pd.ExcelFile(uploaded_file)
-    primeira_aba = xls.sheet_names[0]
+if uploaded_file or fonte_historico:
+    # Dependências pesadas, carregadas só a partir do primeiro arquivo (os reruns seguintes
+    # as encontram em sys.modules)
+    import pandas as pd
+    from analises import (
+        preparar_dados, formatar_moeda, gerar_insights, calcular_kpis,
+        aplicar_filtros, separar_contas_criticas, contas_criticas, calcular_resumo_setor,
+        calcular_tempo_medio_setor, gerar_excel_bytes, gerar_relatorio_excel
+    )
+    from precomputacao import Precomputador
+    from indice_datas import IndiceDatas
+    from rollup import (
+        construir_rollup_diario, filtrar_rollup, totais_diarios, calcular_tendencia_mensal,
+        calcular_tendencia_valor, calcular_sazonalidade_dia_semana, calcular_calendario
+    )
+    from previsao import ModeloPrevisao
+    from aging import MotorAging, series_do_recorte
+    from ingestao import listar_abas, carregar_abas
+    from deduplicacao import regras_deduplicacao, deduplicar, IndiceContas
+    from exportacao import formatos_exportacao, exportar_bytes
+    from memo_recortes import MemoRecortes, chave_recorte
+    from cache_figuras import impressao_arquivo
+    from qualidade import validar_contas, contar_alertas, mascara_alerta, descrever_alertas
+    from graficos import (
+        figura_aging, figura_evolucao_aging, figura_setores, figura_tempo_setor, figura_tendencia_mensal,
+        figura_boxplot_convenios, figura_treemap_convenios, figura_histograma_valores, figura_calendario,
+        figura_tendencia_valor, figura_projecao, figura_dia_semana_quantidade, figura_dia_semana_valor
+    )
     
-    with st.spinner('Carregando e processando dados...'):
-        df = pd.read_excel(xls, sheet_name=primeira_aba)
-        
-        # Verificar e selecionar colunas disponíveis
-        colunas_necessarias = [
-            "Status", "Tipo atendimento", "Conta", "Atendimento", "Status atendimento",
-            "Convênio", "Categoria", "Valor conta", "Etapa anterior",
-            "Último Setor destino", "Setor atendimento", "Estabelecimento",
-            "Data entrada", "Médico executor"
-        ]
-        
-        colunas_disponiveis = [col for col in colunas_necessarias if col in df.columns]
-        
-        if len(colunas_disponiveis) < len(colunas_necessarias):
-            colunas_faltantes = set(colunas_necessarias) - set(colunas_disponiveis)
-            st.warning(f"Algumas colunas esperadas não foram encontradas: {', '.join(colunas_faltantes)}")
-        
-        df = df[colunas_disponiveis].copy()
-        
-        # Converter e limpar dados
-        df["Valor conta"] = pd.to_numeric(df["Valor conta"], errors="coerce")
-        df["Data entrada"] = pd.to_datetime(df["Data entrada"], errors="coerce")
-        
-        # Adicionar colunas úteis
-        df["AnoMes"] = df["Data entrada"].dt.to_period("M").astype(str)
-        df = calcular_aging(df)
-        
-        # KPIs gerais
-        kpis = calcular_kpis(df)
+    # DataFrames e caches pesados da sessão ficam no armazém, que o gerenciador descarrega em
+    # disco quando a sessão fica ociosa; o primeiro acesso depois disso lê os dados de volta.
+    # Os caches descartáveis somem na descarga e são recriados abaixo quando faltam.
+    gerenciador = gerenciador_memoria()
+    if "armazem" not in st.session_state:
+        st.session_state["armazem"] = gerenciador.novo_armazem(
+            descartaveis=["memo_recortes", "indice_contas", "precomputador", "indice_datas", "modelo_previsao"]
+        )
+    armazem = st.session_state["armazem"]
+    gerenciador.tocar(armazem)
+    
+    if fonte_historico:
+        # Snapshot do histórico: só as partições (meses de entrada) do intervalo do Filtro de
+        # Data são lidas. O intervalo é o do rerun anterior, arredondado para meses inteiros,
+        # então mudar as datas dentro dos mesmos meses não relê nada.
+        historico = historico_contas()
+        snapshots = historico.snapshots()
+        if not snapshots:
+            st.info("O histórico está vazio. Envie uma planilha e guarde-a pelo painel lateral (🗄️ Histórico).")
+            st.stop()
+        snapshot = st.selectbox(
+            "Snapshot:", list(reversed(snapshots)), format_func=lambda r: pd.Timestamp(r).strftime("%d/%m/%Y")
+        )
+        resumo_snapshot = snapshots[snapshot]
+        limites_datas = (pd.Timestamp(resumo_snapshot["data_min"]).date(), pd.Timestamp(resumo_snapshot["data_max"]).date())
+        intervalo_padrao = (max(limites_datas[0], limites_datas[1] - timedelta(days=365)), limites_datas[1])
+        chave_intervalo = f"intervalo_historico:{snapshot}"
+        intervalo = st.session_state.get(chave_intervalo, intervalo_padrao)
+        if len(intervalo) != 2:
+            intervalo = intervalo_padrao
+        meses_lidos = (pd.Period(intervalo[0], "M"), pd.Period(intervalo[1], "M"))
+        chave_arquivo = ("historico", resumo_snapshot["id"], str(meses_lidos[0]), str(meses_lidos[1]))
+    else:
+        # Planilhas com várias abas (uma por estabelecimento ou por mês): todas ou só as escolhidas
+        id_arquivo = getattr(uploaded_file, "file_id", uploaded_file.name)
+        if st.session_state.get("id_arquivo_abas") != id_arquivo:
+            st.session_state.update(id_arquivo_abas=id_arquivo, abas_arquivo=listar_abas(uploaded_file))
+        abas_arquivo = st.session_state["abas_arquivo"]
+        if len(abas_arquivo) > 1:
+            abas_selecionadas = st.multiselect("Abas a importar:", abas_arquivo, default=abas_arquivo)
+            if not abas_selecionadas:
+                st.error("Selecione ao menos uma aba da planilha.")
+                st.stop()
+        else:
+            abas_selecionadas = abas_arquivo
+        chave_arquivo = (id_arquivo, tuple(abas_selecionadas))
+    
+    # Linhas repetidas da mesma Conta/Atendimento (a conta passou por mais de um setor)
+    opcoes_duplicatas = {rotulo: regra for regra, (_, rotulo) in regras_deduplicacao.items()}
+    opcoes_duplicatas["Manter todas as linhas"] = None
+    regra_duplicatas = opcoes_duplicatas[st.selectbox("Linhas repetidas da mesma Conta/Atendimento:", list(opcoes_duplicatas))]
+    
+    # Leitura das abas em processos paralelos, com validação do esquema de cada uma (ou dos
+    # meses do snapshot, no histórico)
+    if st.session_state.get("chave_arquivo") != chave_arquivo:
+        if fonte_historico:
+            with st.spinner('Lendo o histórico...'):
+                df_importado, colunas_faltantes = preparar_dados(historico.ler(
+                    [snapshot], meses_lidos[0].start_time, meses_lidos[1].end_time
+                ))
+            if df_importado.empty:
+                st.warning("O snapshot não tem contas com entrada nos meses do intervalo escolhido.")
+                st.stop()
+            relatorio_abas = pd.DataFrame(columns=["Aba", "Linhas", "Tempo de leitura (s)", "Colunas faltantes", "Situação"])
+            impressao = f"historico:{resumo_snapshot['id']}:{meses_lidos[0]}:{meses_lidos[1]}"
+        else:
+            with st.spinner('Carregando dados...'):
+                try:
+                    df_importado, colunas_faltantes, relatorio_abas = carregar_abas(uploaded_file, abas_selecionadas)
+                except ValueError as e:
+                    st.error(str(e))
+                    st.stop()
+            impressao = impressao_arquivo(uploaded_file)
+        armazem["df_importado"] = df_importado
+        st.session_state.update(
+            chave_arquivo=chave_arquivo, impressao_arquivo=impressao,
+            colunas_faltantes=colunas_faltantes, relatorio_abas=relatorio_abas
+        )
+    
+    # Os dados e o índice de datas são montados uma vez por arquivo (e regra de duplicatas)
+    # e reaproveitados nos reruns
+    chave_dados = (chave_arquivo, regra_duplicatas)
+    if st.session_state.get("chave_dados") != chave_dados:
+        with st.spinner('Processando dados...'):
+            # Remoção das repetições de Conta/Atendimento
+            if regra_duplicatas is not None:
+                df, relatorio_duplicatas = deduplicar(armazem["df_importado"], regra_duplicatas)
+            else:
+                df, relatorio_duplicatas = armazem["df_importado"], None
+            
+            # Alertas dos valores (outliers, mediana etc.) sobre as contas que ficaram
+            df = validar_contas(df)
+            
+            # Índice de somas acumuladas por data de entrada (KPIs de intervalos por busca binária)
+            indice_datas = IndiceDatas(df)
+            
+            # Totais diários por convênio e setor para as visões temporais
+            rollup_diario = construir_rollup_diario(df)
+            
+            # Modelos de projeção de todas as séries convênio x setor, ajustados uma vez
+            modelo_previsao = ModeloPrevisao(rollup_diario)
+            
+            # KPIs gerais e alertas do arquivo (gravados por linha)
+            kpis = indice_datas.kpis()
+            alertas_arquivo = contar_alertas(df)
+            
+        armazem.update(df=df, rollup_diario=rollup_diario, indice_datas=indice_datas, modelo_previsao=modelo_previsao)
+        for chave in ("memo_recortes", "indice_contas"):
+            armazem.pop(chave, None)
+        st.session_state.update(
+            chave_dados=chave_dados, relatorio_duplicatas=relatorio_duplicatas, kpis=kpis,
+            alertas_arquivo=alertas_arquivo
+        )
+    
+    df = armazem["df"]
+    rollup_diario = armazem["rollup_diario"]
+    kpis = st.session_state["kpis"]
+    if "indice_datas" not in armazem:
+        armazem["indice_datas"] = IndiceDatas(df)
+    if "modelo_previsao" not in armazem:
+        armazem["modelo_previsao"] = ModeloPrevisao(rollup_diario)
+    indice_datas = armazem["indice_datas"]
+    if "memo_recortes" not in armazem:
+        armazem["memo_recortes"] = MemoRecortes()
+    if "indice_contas" not in armazem:
+        armazem["indice_contas"] = IndiceContas(df)
+    memo = armazem["memo_recortes"]
+    
+    relatorio_abas = st.session_state["relatorio_abas"]
+    relatorio_duplicatas = st.session_state["relatorio_duplicatas"]
+    
+    if relatorio_duplicatas and relatorio_duplicatas["linhas_removidas"]:
+        linhas_removidas = f"{relatorio_duplicatas['linhas_removidas']:,}".replace(",", ".")
+        contas_repetidas = f"{relatorio_duplicatas['contas_repetidas']:,}".replace(",", ".")
+        st.info(
+            f"{linhas_removidas} linhas repetidas de {contas_repetidas} contas removidas "
+            f"({formatar_moeda(relatorio_duplicatas['valor_removido'])} que seriam contados em dobro)."
+        )
+    
+    if st.session_state["colunas_faltantes"]:
+        st.warning(f"Algumas colunas esperadas não foram encontradas: {', '.join(st.session_state['colunas_faltantes'])}")
+    
+    # Valores e datas que não puderam ser lidos (ficaram vazios na conversão)
+    alertas_arquivo = st.session_state["alertas_arquivo"]
+    if alertas_arquivo["valor_invalido"] or alertas_arquivo["data_invalida"]:
+        col1, col2 = st.columns([0.9, 0.1])
+        with col1:
+            st.warning(
+                f"{alertas_arquivo['valor_invalido']} contas com \"Valor conta\" e {alertas_arquivo['data_invalida']} com "
+                "\"Data entrada\" preenchidos na planilha não puderam ser lidos e ficaram vazios."
+            )
+        with col2:
+            st.download_button(
+                label="⬇️",
+                data=lambda: gerar_excel_bytes(
+                    df[mascara_alerta(df, "valor_invalido") | mascara_alerta(df, "data_invalida")], "Dados Inválidos"
+                ).getvalue(),
+                file_name="contas_dados_invalidos.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="dados_invalidos"
+            )
+    
+    if len(relatorio_abas) > 1:
+        ignoradas = relatorio_abas.loc[relatorio_abas["Situação"] != "Importada", "Aba"].tolist()
+        if ignoradas:
+            st.warning(f"Abas ignoradas por não conterem as colunas obrigatórias: {', '.join(ignoradas)}")
+        with st.expander("📄 Abas importadas", expanded=False):
+            st.dataframe(relatorio_abas, column_config=formatos_colunas(decimais=["Tempo de leitura (s)"]))
 
     # Sidebar com filtros
     st.sidebar.header("Filtros Gerais")
     
     # Filtro de data
     with st.sidebar.expander("Filtro de Data", expanded=False):
-        data_min = df["Data entrada"].min().date() if not df["Data entrada"].isna().all() else datetime.today().date()
-        data_max = df["Data entrada"].max().date() if not df["Data entrada"].isna().all() else datetime.today().date()
+        if fonte_historico:
+            # Limites do snapshot inteiro (do manifesto), não só dos meses já lidos
+            data_min, data_max = limites_datas
+            valor_intervalo = intervalo_padrao
+        else:
+            data_min = df["Data entrada"].min().date() if not df["Data entrada"].isna().all() else datetime.today().date()
+            data_max = df["Data entrada"].max().date() if not df["Data entrada"].isna().all() else datetime.today().date()
+            chave_intervalo, valor_intervalo = None, (data_min, data_max)
         
         data_inicio, data_fim = st.date_input(
             "Intervalo de Data:",
-            value=(data_min, data_max),
+            value=valor_intervalo,
             min_value=data_min,
-            max_value=data_max
+            max_value=data_max,
+            key=chave_intervalo
+        )
+        
+        # Data em que o aging e os KPIs são avaliados (hoje, ou por exemplo o último fim de
+        # mês); no histórico, a data do snapshot
+        hoje = datetime.today().date()
+        data_referencia = st.date_input(
+            "Data de referência do aging:", value=pd.Timestamp(snapshot).date() if fonte_historico else hoje, min_value=data_min
         )
+        referencia = None if data_referencia == hoje else pd.Timestamp(data_referencia)
     
     # Filtro de convênios
     with st.sidebar.expander("Filtro de Convênios", expanded=False):
@@ -233,24 +431,107 @@ if uploaded_file:
             setores_filtrados = setores_disponiveis
         else:
             setores_filtrados = st.multiselect("Setores:", setores_disponiveis)
+
+    # Consulta de uma conta pelo número (índice hash, sem varrer o DataFrame)
+    with st.sidebar.expander("🔎 Buscar Conta", expanded=False):
+        numero_conta = st.text_input("Número da conta:").strip()
+        if numero_conta:
+            contas_encontradas = armazem["indice_contas"].buscar_numero(numero_conta)
+            if contas_encontradas.empty:
+                st.write("Conta não encontrada.")
+            else:
+                st.dataframe(descrever_alertas(contas_encontradas).T)
     
-    # Aplicar filtros
-    mask = (
-        (df["Data entrada"].dt.date >= data_inicio) & 
-        (df["Data entrada"].dt.date <= data_fim) &
-        (df["Convênio"].isin(convenios_filtrados)) &
-        (df["Médico executor"].isin(medicos_filtrados)) &
-        (df["Status"].isin(status_filtrados)) &
-        (df["Último Setor destino"].isin(setores_filtrados))
+    # Histórico: guardar a planilha enviada como snapshot e compactar as partições
+    with st.sidebar.expander("🗄️ Histórico", expanded=False):
+        historico = historico_contas()
+        if not fonte_historico:
+            data_export = st.date_input("Data do export:", value=datetime.today().date())
+            if st.button("Guardar no histórico"):
+                with st.spinner("Guardando..."):
+                    resumo_guardado = historico.guardar(armazem["df_importado"], data_export)
+                st.success(f"Snapshot de {data_export:%d/%m/%Y} guardado ({resumo_guardado['linhas']:,} contas).".replace(",", "."))
+        estatisticas_historico = historico.estatisticas()
+        st.caption(
+            f"{estatisticas_historico['snapshots']} snapshots em {estatisticas_historico['particoes']} partições, "
+            f"{estatisticas_historico['arquivos']} arquivos ({estatisticas_historico['bytes'] / 1024 ** 2:.1f} MB)"
+        )
+        if st.button("Compactar partições", disabled=estatisticas_historico["maior_particao"] <= 1):
+            st.write(f"{historico.compactar(max_arquivos=1)} partições compactadas.")
+
+    # Aplicar filtros (None quando "Selecionar todos" está marcado). O recorte e o que é
+    # calculado a partir dele ficam no memo da sessão, pela chave canônica dos filtros:
+    # voltar a uma seleção anterior reaproveita tudo
+    selecoes = (
+        None if todos_conv else convenios_filtrados,
+        None if todos_med else medicos_filtrados,
+        None if todos_status else status_filtrados,
+        None if todos_setores else setores_filtrados
     )
+    chave_filtros = chave_recorte(chave_dados, data_inicio, data_fim, *selecoes)
+    df_filtrado = memo.recorte(chave_filtros, lambda: aplicar_filtros(df, data_inicio, data_fim, *selecoes))
     
-    df_filtrado = df[mask]
+    # Pré-cálculo das visões pesadas em segundo plano, por estado de filtros
+    if "precomputador" not in armazem:
+        armazem["precomputador"] = Precomputador(executor_precomputacao())
+    precomputador = armazem["precomputador"]
     
     if df_filtrado.empty:
+        precomputador.cancelar()
         st.error("Nenhum dado encontrado com os filtros selecionados.")
     else:
-        # Recalcular KPIs com dados filtrados
-        kpis_filtrados = calcular_kpis(df_filtrado)
+        # Os gargalos contam os dias até hoje, e o aging por convênio e a idade média da
+        # hierarquia até a data de referência: as duas datas entram na chave
+        precomputador.agendar(
+            (chave_filtros, hoje, data_referencia), df_filtrado,
+            prontas=memo.resultado(chave_filtros, ("visoes", hoje, data_referencia)), data_referencia=referencia
+        )
+        
+        # Estado das figuras: o conteúdo do arquivo (não o id do upload) e os filtros; nas
+        # figuras que contam dias até hoje, também a data
+        figuras = figuras_compartilhadas()
+        estado_figuras = ((st.session_state["impressao_arquivo"], *chave_dados[0][1:], *chave_dados[1:]), *chave_filtros[1:])
+        estado_figuras_hoje = (estado_figuras, hoje)
+        
+        # Recalcular KPIs com dados filtrados: recortes de data/convênio saem do índice
+        # de datas; com filtros de médico, status ou setor o cálculo percorre df_filtrado. A
+        # chave leva a data de referência efetiva (a de hoje, quando não foi escolhida outra).
+        if todos_med and todos_status and todos_setores:
+            kpis_filtrados = memo.obter(chave_filtros, ("kpis", data_referencia), lambda: indice_datas.kpis(
+                data_inicio, data_fim, None if todos_conv else convenios_filtrados, hoje=referencia
+            ))
+        else:
+            kpis_filtrados = memo.obter(chave_filtros, ("kpis", data_referencia), lambda: calcular_kpis(df_filtrado, referencia))
+        
+        # Aging em datas de referência: sobre o índice de datas (recorte de data/convênio) ou
+        # sobre as somas acumuladas de df_filtrado
+        if todos_med and todos_status and todos_setores:
+            motor_aging = memo.obter(chave_filtros, "motor_aging", lambda: MotorAging(
+                indice_datas.series(None if todos_conv else convenios_filtrados), data_inicio, data_fim
+            ))
+        else:
+            motor_aging = memo.obter(chave_filtros, "motor_aging", lambda: MotorAging(series_do_recorte(df_filtrado)))
+        
+        # Série diária das visões temporais: recortada do rollup quando os filtros são de
+        # data, convênio ou setor; com filtro de médico ou status, agregada de df_filtrado
+        if todos_med and todos_status:
+            rollup_filtrado = memo.obter(chave_filtros, "rollup", lambda: filtrar_rollup(
+                rollup_diario, data_inicio, data_fim,
+                None if todos_conv else convenios_filtrados,
+                None if todos_setores else setores_filtrados
+            ))
+        else:
+            rollup_filtrado = memo.obter(chave_filtros, "rollup", lambda: construir_rollup_diario(df_filtrado))
+        diario = memo.obter(chave_filtros, "diario", lambda: totais_diarios(rollup_filtrado))
+        
+        # Projeções: o modelo do arquivo responde a recortes de convênio e setor; com filtro
+        # de médico ou status, as séries são reajustadas
+        if todos_med and todos_status:
+            modelo_previsao = armazem["modelo_previsao"]
+        else:
+            modelo_previsao = memo.obter(chave_filtros, "modelo_previsao", lambda: ModeloPrevisao(rollup_filtrado))
+        convenios_previsao = None if todos_conv else convenios_filtrados
+        setores_previsao = None if todos_setores else setores_filtrados
         
         # Dashboard Principal
         st.markdown("## 📊 Dashboard Principal")
@@ -281,128 +562,118 @@ if uploaded_file:
         
         # Gráfico de distribuição de valores por aging
         st.markdown("### 📈 Distribuição do Valor por Aging")
-        aging_df = df_filtrado.groupby("Categoria Aging")["Valor conta"].sum().reset_index()
-        fig_aging = px.bar(
-            aging_df, 
-            x="Categoria Aging", 
-            y="Valor conta",
-            color="Categoria Aging",
-            text_auto=True,
-            category_orders={"Categoria Aging": ["0-30 dias", "31-60 dias", "61-90 dias", "91-180 dias", "181-365 dias", "+365 dias"]},
-            labels={"Valor conta": "Valor Total (R$)", "Categoria Aging": "Faixa de Idade"}
-        )
-        fig_aging.update_layout(xaxis_title="Faixa de Idade", yaxis_title="Valor Total (R$)")
-        fig_aging.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
+        data_aging = referencia if referencia is not None else pd.Timestamp.today().normalize()
+        fig_aging = figuras.obter("aging", (estado_figuras, data_aging), lambda: figura_aging(
+            motor_aging.matriz([data_aging])[1].iloc[0].rename_axis("Categoria Aging").rename("Valor conta").reset_index()
+        ))
         st.plotly_chart(fig_aging, use_container_width=True)
         
+        # Evolução das faixas de aging nos últimos 24 fins de mês
+        st.markdown("### 📉 Evolução do Aging (fins de mês)")
+        fig_evolucao_aging = figuras.obter("evolucao_aging", (estado_figuras, data_referencia), lambda: figura_evolucao_aging(
+            motor_aging.historico_mensal(data_referencia)[1]
+        ))
+        st.plotly_chart(fig_evolucao_aging, use_container_width=True)
+        st.caption("Contas do arquivo que já tinham entrado em cada data, pela idade naquela data.")
+        
         # Tabs para análises detalhadas
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
             "📋 Insights", 
             "🏥 Análise por Convênio", 
             "🔄 Análise por Fluxo", 
             "🩺 Análise por Médico",
-            "📊 Visualizações Avançadas"
+            "📊 Visualizações Avançadas",
+            "🧭 Explorar Hierarquia",
+            "🔁 Transições de Aging"
         ])
         
         with tab1:
             st.markdown("### 🔍 Insights e Oportunidades de Melhoria")
             
+            # Contagens dos alertas gravados por linha e das contas com mais de 90 dias na data de
+            # referência (as listas só são montadas no download)
+            criticas = memo.obter(chave_filtros, ("criticas", data_referencia), lambda: separar_contas_criticas(df_filtrado, referencia))
+            
             # Insights baseados nos dados
-            st.markdown(gerar_insights(df_filtrado))
+            st.markdown(memo.obter(chave_filtros, ("insights", data_referencia), lambda: gerar_insights(
+                df_filtrado, modelo_previsao.resumo_proximo_mes(convenios_previsao, setores_previsao), referencia
+            )))
             
             # Análises específicas
             st.markdown("### 📑 Análises Detalhadas")
             
-            # Criar DataFrames específicos para análise
-            zeradas_df = df_filtrado[df_filtrado["Valor conta"] == 0]
-            sem_alta_df = df_filtrado[df_filtrado[df_filtrado.columns[df_filtrado.columns.str.lower().str.contains("alta")][0]].isna()] if any(df_filtrado.columns.str.lower().str.contains("alta")) else pd.DataFrame()
-            abaixo_mediana_df = df_filtrado[df_filtrado["Valor conta"] < df_filtrado["Valor conta"].median()]
-            negativos_df = df_filtrado[df_filtrado["Valor conta"] < 0]
-            
-            # Calcular outliers
-            q1 = df_filtrado["Valor conta"].quantile(0.25)
-            q3 = df_filtrado["Valor conta"].quantile(0.75)
-            iqr = q3 - q1
-            limite_superior = q3 + 1.5 * iqr
-            outliers_df = df_filtrado[df_filtrado["Valor conta"] > limite_superior]
-            
-            # Contas antigas
-            antigas_df = df_filtrado[df_filtrado["Data entrada"] < pd.Timestamp.today() - pd.Timedelta(days=90)]
-            
-            # Função para gerar Excel para download
-            from io import BytesIO
-            def gerar_excel_bytes(df, nome_aba):
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name=nome_aba)
-                return buffer
+            contagens = criticas["contagens"]
+            limite_escore = criticas["limite_escore"]
             
             # Lista de insights com botões de download
+            # (a lista e o Excel de cada alerta só são gerados quando o botão é clicado)
             insights = [
-                (f"{outliers_df.shape[0]} contas são outliers (acima de {formatar_moeda(limite_superior)}).", 
-                 gerar_excel_bytes(outliers_df, "Outliers"), "contas_outliers.xlsx", "outliers"),
+                (f"{contagens['outliers']} contas são outliers no seu convênio e tipo de atendimento (escore robusto acima de {str(limite_escore).replace('.', ',')}).", 
+                 "Outliers", "contas_outliers.xlsx", "outliers"),
                 
-                (f"{antigas_df.shape[0]} contas com mais de 90 dias desde a entrada.", 
-                 gerar_excel_bytes(antigas_df, "Mais Antigas"), "contas_90_dias.xlsx", "antigas"),
+                (f"{contagens['antigas']} contas com mais de 90 dias desde a entrada.", 
+                 "Mais Antigas", "contas_90_dias.xlsx", "antigas"),
                 
-                (f"{zeradas_df.shape[0]} contas estão com valor zerado.", 
-                 gerar_excel_bytes(zeradas_df, "Zeradas"), "contas_zeradas.xlsx", "zeradas"),
+                (f"{contagens['zeradas']} contas estão com valor zerado.", 
+                 "Zeradas", "contas_zeradas.xlsx", "zeradas"),
                 
-                (f"{sem_alta_df.shape[0]} contas estão com pacientes sem alta." if not sem_alta_df.notnull else "Não foram identificadas contas sem alta.", 
-                 gerar_excel_bytes(sem_alta_df, "Sem Alta"), "contas_sem_alta.xlsx", "sem_alta"),
+                (f"{contagens['sem_alta']} contas estão com pacientes sem alta." if contagens["sem_alta"] else "Não foram identificadas contas sem alta.", 
+                 "Sem Alta", "contas_sem_alta.xlsx", "sem_alta"),
                 
-                (f"{negativos_df.shape[0]} contas possuem valor negativo.", 
-                 gerar_excel_bytes(negativos_df, "Negativos"), "contas_valor_negativo.xlsx", "negativos"),
+                (f"{contagens['negativos']} contas possuem valor negativo.", 
+                 "Negativos", "contas_valor_negativo.xlsx", "negativos"),
                 
-                (f"{abaixo_mediana_df.shape[0]} contas estão abaixo da mediana ({formatar_moeda(df_filtrado['Valor conta'].median())}).", 
-                 gerar_excel_bytes(abaixo_mediana_df, "Abaixo Mediana"), "contas_abaixo_mediana.xlsx", "abaixo_mediana")
+                (f"{contagens['abaixo_mediana']} contas estão abaixo da mediana do arquivo ({formatar_moeda(criticas['mediana'])}).", 
+                 "Abaixo Mediana", "contas_abaixo_mediana.xlsx", "abaixo_mediana")
             ]
             
             # Mostrar insights com botões de download
-            for texto, arquivo, nome_arquivo, chave in insights:
+            for texto, nome_aba, nome_arquivo, chave in insights:
                 col1, col2 = st.columns([0.9, 0.1])
                 with col1:
                     st.markdown(f"- {texto}")
                 with col2:
-                    if arquivo.getvalue() and "Não foram identificadas" not in texto:
+                    if "Não foram identificadas" not in texto:
                         st.download_button(
                             label="⬇️", 
-                            data=arquivo.getvalue(), 
+                            data=lambda chave=chave, nome_aba=nome_aba: gerar_excel_bytes(contas_criticas(df_filtrado, chave, referencia), nome_aba).getvalue(), 
                             file_name=nome_arquivo, 
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
                             key=chave
                         )
+            
+            # Contas do recorte em CSV ou Parquet, escritas em blocos só quando o botão é clicado
+            st.markdown("#### ⬇️ Exportar Dados Filtrados")
+            col1, col2 = st.columns([0.7, 0.3])
+            with col1:
+                formato = st.radio(
+                    "Formato", list(formatos_exportacao), horizontal=True,
+                    format_func=lambda f: formatos_exportacao[f][0], key="formato_exportacao"
+                )
+            with col2:
+                st.download_button(
+                    label=f"⬇️ {len(df_filtrado):,} contas".replace(",", "."),
+                    data=lambda df=df_filtrado, formato=formato: exportar_bytes(df, formato),
+                    file_name=f"contas_filtradas_{datetime.today():%Y-%m-%d}.{formato}",
+                    mime=formatos_exportacao[formato][1],
+                    key="exportar_dados"
+                )
         
         with tab2:
             st.markdown("### 🏥 Análise por Convênio")
             
-            # Resumo por convênio
-            resumo_convenio = df_filtrado.groupby("Convênio")["Valor conta"].agg(
-                Quantidade="count", 
-                Total="sum", 
-                Média="mean",
-                Mediana="median",
-                Mínimo="min",
-                Máximo="max"
-            ).sort_values(by="Total", ascending=False)
-            
-            # Adicionar proporção do total
-            if resumo_convenio["Total"].sum() > 0:
-                resumo_convenio["% do Total"] = (resumo_convenio["Total"] / resumo_convenio["Total"].sum()) * 100
-            else:
-                resumo_convenio["% do Total"] = 0
+            # Resumo por convênio (pré-calculado em segundo plano)
+            visao_convenio = precomputador.obter("convenio", df_filtrado)
+            resumo_convenio = visao_convenio["resumo"]
             
             # Mostrar tabela estilizada
             st.dataframe(
-                resumo_convenio.style.format({
-                    "Total": formatar_moeda, 
-                    "Média": formatar_moeda,
-                    "Mediana": formatar_moeda,
-                    "Mínimo": formatar_moeda,
-                    "Máximo": formatar_moeda,
-                    "Quantidade": "{:.0f}",
-                    "% do Total": "{:.2f}%"
-                }),
+                resumo_convenio,
+                column_config=formatos_colunas(
+                    moeda=["Total", "Média", "Mediana", "Mínimo", "Máximo"],
+                    inteiros=["Quantidade"],
+                    percentuais=["% do Total"]
+                ),
                 height=400
             )
             
@@ -411,78 +682,30 @@ if uploaded_file:
             
             with col1:
                 st.markdown("#### Distribuição do Valor Total por Convênio")
-                # Pegar top 10 convênios por valor
-                top_convenios = resumo_convenio.head(10).reset_index()
-                
-                fig_pie = px.pie(
-                    top_convenios, 
-                    values="Total", 
-                    names="Convênio",
-                    hole=0.4,
-                    labels={"Total": "Valor Total"}
-                )
-                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                fig_pie = visao_convenio["fig_pizza"]
                 st.plotly_chart(fig_pie, use_container_width=True)
             
             with col2:
                 st.markdown("#### Aging por Convênio")
                 # Aging por convênio (top 5)
-                top5_convenios = resumo_convenio.head(5).index.tolist()
-                
-                # Filtrar apenas top 5 convênios
-                df_top5 = df_filtrado[df_filtrado["Convênio"].isin(top5_convenios)]
-                
-                aging_convenio = df_top5.groupby(["Convênio", "Categoria Aging"])["Valor conta"].sum().reset_index()
-                
-                fig_aging_conv = px.bar(
-                    aging_convenio,
-                    x="Convênio",
-                    y="Valor conta",
-                    color="Categoria Aging",
-                    text_auto='.2s',
-                    category_orders={"Categoria Aging": ["0-30 dias", "31-60 dias", "61-90 dias", "91-180 dias", "181-365 dias", "+365 dias"]},
-                    labels={"Valor conta": "Valor Total (R$)", "Categoria Aging": "Faixa de Idade"}
-                )
+                fig_aging_conv = visao_convenio["fig_aging"]
                 st.plotly_chart(fig_aging_conv, use_container_width=True)
             
             # Análise de ticket médio
             st.markdown("#### Ticket Médio por Convênio")
-            df_ticket = resumo_convenio.reset_index()[["Convênio", "Média"]].sort_values(by="Média", ascending=False)
-            
-            fig_ticket = px.bar(
-                df_ticket.head(10),
-                x="Convênio",
-                y="Média",
-                text_auto=True,
-                labels={"Média": "Ticket Médio (R$)"}
-            )
-            fig_ticket.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
+            fig_ticket = visao_convenio["fig_ticket"]
             st.plotly_chart(fig_ticket, use_container_width=True)
         
         with tab3:
             st.markdown("### 🔄 Análise por Fluxo")
             
             # Resumo por etapa/setor
-            resumo_etapa = df_filtrado.groupby("Último Setor destino")["Valor conta"].agg(
-                Quantidade="count", 
-                Total="sum", 
-                Média="mean"
-            ).sort_values(by="Total", ascending=False)
-            
-            # Adicionar proporção do total
-            if resumo_etapa["Total"].sum() > 0:
-                resumo_etapa["% do Total"] = (resumo_etapa["Total"] / resumo_etapa["Total"].sum()) * 100
-            else:
-                resumo_etapa["% do Total"] = 0
+            resumo_etapa = memo.obter(chave_filtros, "resumo_etapa", lambda: calcular_resumo_setor(df_filtrado))
             
             # Mostrar tabela
             st.dataframe(
-                resumo_etapa.style.format({
-                    "Total": formatar_moeda, 
-                    "Média": formatar_moeda, 
-                    "Quantidade": "{:.0f}",
-                    "% do Total": "{:.2f}%"
-                }),
+                resumo_etapa,
+                column_config=formatos_colunas(moeda=["Total", "Média"], inteiros=["Quantidade"], percentuais=["% do Total"]),
                 height=300
             )
             
@@ -492,136 +715,45 @@ if uploaded_file:
             with col1:
                 st.markdown("#### Distribuição por Setor")
                 
-                # Pegar top 10 setores
-                top_setores = resumo_etapa.head(10).reset_index()
-                
-                fig_setores = px.bar(
-                    top_setores,
-                    x="Último Setor destino",
-                    y="Total",
-                    text_auto=True,
-                    labels={"Total": "Valor Total (R$)", "Último Setor destino": "Setor"}
-                )
-                fig_setores.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
-                fig_setores.update_layout(xaxis_tickangle=-45)
+                # Top 10 setores
+                fig_setores = figuras.obter("setores", estado_figuras, lambda: figura_setores(resumo_etapa))
                 st.plotly_chart(fig_setores, use_container_width=True)
             
             with col2:
                 st.markdown("#### Tempo Médio por Setor (dias)")
                 
                 # Calcular tempo médio por setor
-                df_filtrado_tempo = df_filtrado.copy()
-                df_filtrado_tempo["Dias Pendentes"] = (pd.Timestamp.today().normalize() - df_filtrado_tempo["Data entrada"].dt.normalize()).dt.days
-                
-                tempo_medio = df_filtrado_tempo.groupby("Último Setor destino")["Dias Pendentes"].mean().reset_index()
-                tempo_medio = tempo_medio.sort_values(by="Dias Pendentes", ascending=False).head(10)
-                
-                fig_tempo = px.bar(
-                    tempo_medio,
-                    x="Último Setor destino",
-                    y="Dias Pendentes",
-                    text_auto=True,
-                    labels={"Dias Pendentes": "Tempo Médio (dias)", "Último Setor destino": "Setor"}
-                )
-                fig_tempo.update_traces(texttemplate='%{y:.1f}', textposition='outside')
-                fig_tempo.update_layout(xaxis_tickangle=-45)
+                tempo_medio_setor = memo.obter(chave_filtros, ("tempo_medio_setor", hoje), lambda: calcular_tempo_medio_setor(df_filtrado))
+                fig_tempo = figuras.obter("tempo_setor", estado_figuras_hoje, lambda: figura_tempo_setor(tempo_medio_setor))
                 st.plotly_chart(fig_tempo, use_container_width=True)
             
             # Diagrama Sankey
             st.markdown("#### Fluxo Sankey - Status para Convênio")
             if "Status" in df_filtrado.columns and "Convênio" in df_filtrado.columns:
-                origem = df_filtrado["Status"].fillna("Desconhecido")
-                destino = df_filtrado["Convênio"].fillna("Desconhecido")
-                labels = list(pd.unique(origem.tolist() + destino.tolist()))
-                label_index = {k: v for v, k in enumerate(labels)}
-                
-                # Criar dataframe para o sankey
-                sankey_df = df_filtrado.groupby([origem.name, destino.name]).size().reset_index(name="valor")
-                
-                # Criar figura sankey
-                fig_sankey = go.Figure(go.Sankey(
-                    node=dict(label=labels, pad=15, thickness=20),
-                    link=dict(
-                        source=sankey_df[origem.name].map(label_index),
-                        target=sankey_df[destino.name].map(label_index),
-                        value=sankey_df["valor"]
-                    )
-                ))
+                fig_sankey = precomputador.obter("sankey", df_filtrado)["fig_sankey"]
                 st.plotly_chart(fig_sankey, use_container_width=True)
             
             # Análise de tendência temporal
             st.markdown("#### Tendência de Contas no Tempo")
             
-            # Agrupar por mês
-            df_tendencia = df_filtrado.copy()
-            df_tendencia["Mês"] = df_tendencia["Data entrada"].dt.to_period("M")
-            tendencia_mensal = df_tendencia.groupby("Mês").agg(
-                Quantidade=("Conta", "count"),
-                Valor_Total=("Valor conta", "sum")
-            ).reset_index()
-            tendencia_mensal["Mês"] = tendencia_mensal["Mês"].astype(str)
-            
-            # Criar gráfico de linhas
-            fig_tendencia = go.Figure()
-            
-            # Adicionar linha para quantidade
-            fig_tendencia.add_trace(go.Scatter(
-                x=tendencia_mensal["Mês"],
-                y=tendencia_mensal["Quantidade"],
-                name="Quantidade de Contas",
-                mode="lines+markers",
-                yaxis="y"
+            # Quantidade e valor por mês
+            fig_tendencia = figuras.obter("tendencia_mensal", estado_figuras, lambda: figura_tendencia_mensal(
+                calcular_tendencia_mensal(diario)
             ))
             
-            # Adicionar linha para valor
-            fig_tendencia.add_trace(go.Scatter(
-                x=tendencia_mensal["Mês"],
-                y=tendencia_mensal["Valor_Total"],
-                name="Valor Total (R$)",
-                mode="lines+markers",
-                yaxis="y2"
-            ))
-            
-            # Configurar layout com dois eixos Y
-            fig_tendencia.update_layout(
-                title="Tendência de Contas e Valores",
-                xaxis=dict(title="Mês"),
-                yaxis=dict(title="Quantidade de Contas", side="left"),
-                yaxis2=dict(
-                    title="Valor Total (R$)",
-                    side="right",
-                    overlaying="y",
-                    showgrid=False
-                ),
-                legend=dict(x=0.01, y=0.99)
-            )
-            
             st.plotly_chart(fig_tendencia, use_container_width=True)
         
         with tab4:
             st.markdown("### 🩺 Análise por Médico Executor")
             
-            # Resumo por médico
-            resumo_medico = df_filtrado.groupby("Médico executor")["Valor conta"].agg(
-                Quantidade="count", 
-                Total="sum", 
-                Média="mean"
-            ).sort_values(by="Total", ascending=False)
-            
-            # Adicionar proporção do total
-            if resumo_medico["Total"].sum() > 0:
-                resumo_medico["% do Total"] = (resumo_medico["Total"] / resumo_medico["Total"].sum()) * 100
-            else:
-                resumo_medico["% do Total"] = 0
+            # Resumo por médico (pré-calculado em segundo plano)
+            visao_medico = precomputador.obter("medico", df_filtrado)
+            resumo_medico = visao_medico["resumo"]
             
             # Mostrar tabela estilizada
             st.dataframe(
-                resumo_medico.style.format({
-                    "Total": formatar_moeda, 
-                    "Média": formatar_moeda, 
-                    "Quantidade": "{:.0f}",
-                    "% do Total": "{:.2f}%"
-                }),
+                resumo_medico,
+                column_config=formatos_colunas(moeda=["Total", "Média"], inteiros=["Quantidade"], percentuais=["% do Total"]),
                 height=300
             )
             
@@ -631,61 +763,21 @@ if uploaded_file:
             with col1:
                 st.markdown("#### Top 10 Médicos por Valor Total")
                 
-                # Pegar top 10 médicos
-                top_medicos = resumo_medico.head(10).reset_index()
-                
-                fig_medicos = px.bar(
-                    top_medicos,
-                    x="Médico executor",
-                    y="Total",
-                    text_auto=True,
-                    labels={"Total": "Valor Total (R$)", "Médico executor": "Médico"}
-                )
-                fig_medicos.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
-                fig_medicos.update_layout(xaxis_tickangle=-45)
+                fig_medicos = visao_medico["fig_top"]
                 st.plotly_chart(fig_medicos, use_container_width=True)
             
             with col2:
                 st.markdown("#### Top 10 Médicos por Ticket Médio")
                 
-                # Pegar top 10 médicos por ticket médio (com pelo menos 5 contas)
-                medicos_ticket = resumo_medico[resumo_medico["Quantidade"] >= 5].sort_values(by="Média", ascending=False).head(10).reset_index()
-                
-                fig_ticket_med = px.bar(
-                    medicos_ticket,
-                    x="Médico executor",
-                    y="Média",
-                    text_auto=True,
-                    labels={"Média": "Ticket Médio (R$)", "Médico executor": "Médico"}
-                )
-                fig_ticket_med.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
-                fig_ticket_med.update_layout(xaxis_tickangle=-45)
+                # Top 10 médicos por ticket médio (com pelo menos 5 contas)
+                fig_ticket_med = visao_medico["fig_ticket"]
                 st.plotly_chart(fig_ticket_med, use_container_width=True)
             
             # Relação médico-convênio
             st.markdown("#### Relação Médico x Convênio")
             
-            # Selecionar top 5 médicos
-            top5_medicos = resumo_medico.head(5).index.tolist()
-            df_med_conv = df_filtrado[df_filtrado["Médico executor"].isin(top5_medicos)]
-            
-            # Agrupar por médico e convênio
-            med_conv = df_med_conv.groupby(["Médico executor", "Convênio"])["Valor conta"].sum().reset_index()
-            
-            # Criar heatmap
-            pivot_med_conv = med_conv.pivot(index="Médico executor", columns="Convênio", values="Valor conta")
-            
-            # Preencher NaN com zeros
-            pivot_med_conv = pivot_med_conv.fillna(0)
-            
-            # Criar mapa de calor com Plotly
-            fig_heatmap = px.imshow(
-                pivot_med_conv,
-                labels=dict(x="Convênio", y="Médico executor", color="Valor Total"),
-                text_auto=True  # ou text_auto='.2s' para formato numérico simples
-            )
-            
-            fig_heatmap.update_layout(height=400)
+            # Mapa de calor dos top 5 médicos por convênio
+            fig_heatmap = visao_medico["fig_heatmap"]
             st.plotly_chart(fig_heatmap, use_container_width=True)
             
                     
@@ -700,18 +792,10 @@ if uploaded_file:
                     if viz_type == "Boxplot por Convênio":
                             st.markdown("#### Boxplot por Convênio")
                             
-                            # Filtrar para mostrar apenas os top 10 convênios
-                            top10_convenios = resumo_convenio.head(10).index.tolist()
-                            df_box = df_filtrado[df_filtrado["Convênio"].isin(top10_convenios)]
-                            
-                            # Criar boxplot
-                            fig_box = px.box(
-                                df_box,
-                                x="Convênio",
-                                y="Valor conta",
-                                points="all",
-                                labels={"Valor conta": "Valor da Conta (R$)", "Convênio": "Convênio"}
-                            )
+                            # Boxplot só dos top 10 convênios
+                            fig_box = figuras.obter("boxplot", estado_figuras, lambda: figura_boxplot_convenios(
+                                df_filtrado, resumo_convenio.head(10).index.tolist()
+                            ))
                             st.plotly_chart(fig_box, use_container_width=True)
                             
                             st.markdown("""
@@ -725,28 +809,7 @@ if uploaded_file:
                     elif viz_type == "TreeMap de Valor por Convênio":
                         st.markdown("#### TreeMap de Valor Total por Convênio")
                         
-                        df_treemap = df_filtrado.groupby("Convênio")["Valor conta"].sum().reset_index()
-                        df_treemap = df_treemap.sort_values(by="Valor conta", ascending=False)
-                        
-                        fig_tree = px.treemap(
-                            df_treemap, 
-                            path=["Convênio"], 
-                            values="Valor conta",
-                            color="Valor conta",
-                            color_continuous_scale="Viridis",
-                            labels={"Valor conta": "Valor Total (R$)"}
-                        )
-                        
-                        # Substituindo hoverinfo por hovertemplate, que é o correto para treemaps
-                        fig_tree.update_traces(
-                            hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percentRoot:.1%}<extra></extra>'
-                        )
-                        
-                        # Melhorando o layout do gráfico
-                        fig_tree.update_layout(
-                            margin=dict(t=30, l=10, r=10, b=10),
-                            coloraxis_showscale=True
-                        )
+                        fig_tree = figuras.obter("treemap", estado_figuras, lambda: figura_treemap_convenios(df_filtrado))
                         
                         st.plotly_chart(fig_tree, use_container_width=True)
                         
@@ -759,13 +822,7 @@ if uploaded_file:
                             st.markdown("#### Distribuição dos Valores das Contas")
                             
                             # Criar histograma com plotly
-                            fig_hist = px.histogram(
-                                df_filtrado,
-                                x="Valor conta",
-                                nbins=50,
-                                marginal="box",
-                                labels={"Valor conta": "Valor da Conta (R$)", "count": "Frequência"}
-                            )
+                            fig_hist = figuras.obter("histograma", estado_figuras, lambda: figura_histograma_valores(df_filtrado))
                             st.plotly_chart(fig_hist, use_container_width=True)
                             
                             # Estatísticas da distribuição
@@ -789,85 +846,11 @@ if uploaded_file:
                         st.markdown("#### Mapa de Calor por Mês/Dia")
                         
                         try:
-                            # Extrair mês e dia da semana (já existem no df_filtrado)
-                            df_calendar = df_filtrado.copy()
-                            # Não precisamos extrair novamente, já temos "Mês" e "Dia da Semana" no dataframe
-                            
-                            # Agrupar por mês e dia da semana
-                            calendar_agg = df_calendar.groupby(["Mês", "Dia da Semana"])["Valor conta"].agg(
-                                Quantidade="count",
-                                Valor_Total="sum"
-                            ).reset_index()
-                            
-                            # Ordenar meses e dias da semana
-                            import calendar
-                            meses_ordem = ["January", "February", "March", "April", "May", "June", 
-                                           "July", "August", "September", "October", "November", "December"]
-                            dias_ordem = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-                            
-                            # Traduzir para português
-                            meses_pt = {
-                                "January": "Janeiro", "February": "Fevereiro", "March": "Março",
-                                "April": "Abril", "May": "Maio", "June": "Junho",
-                                "July": "Julho", "August": "Agosto", "September": "Setembro",
-                                "October": "Outubro", "November": "Novembro", "December": "Dezembro"
-                            }
-                            
-                            dias_pt = {
-                                "Monday": "Segunda", "Tuesday": "Terça", "Wednesday": "Quarta",
-                                "Thursday": "Quinta", "Friday": "Sexta", "Saturday": "Sábado", "Sunday": "Domingo"
-                            }
-                            
-                            # Converter para categorias para ordenar corretamente
-                            calendar_agg["Mês"] = pd.Categorical(calendar_agg["Mês"], categories=meses_ordem, ordered=True)
-                            calendar_agg["Dia da Semana"] = pd.Categorical(calendar_agg["Dia da Semana"], categories=dias_ordem, ordered=True)
-                            calendar_agg = calendar_agg.sort_values(["Mês", "Dia da Semana"])
-                            
-                            # Criar pivot para o heatmap
-                            pivot_calendar = calendar_agg.pivot(index="Dia da Semana", columns="Mês", values="Valor_Total")
-                            
-                            # Substituir nomes em inglês por português
-                            pivot_calendar.index = pivot_calendar.index.map(lambda x: dias_pt.get(x, x))
-                            pivot_calendar.columns = pivot_calendar.columns.map(lambda x: meses_pt.get(x, x))
-                            
-                            # Preencher valores NaN com 0
-                            pivot_calendar = pivot_calendar.fillna(0)
-                            
-                            # Formatar os valores para exibição no heatmap
-                            # Em vez de usar uma função de formatação personalizada, vamos usar 
-                            # um array de strings formatadas para o text_auto
-                            text_values = []
-                            for idx, row in enumerate(pivot_calendar.values):
-                                row_texts = []
-                                for val in row:
-                                    if pd.isna(val) or val == 0:
-                                        row_texts.append("")
-                                    else:
-                                        # Formatação direta para moeda brasileira (R$)
-                                        row_texts.append(f"R$ {val:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-                                text_values.append(row_texts)
-                            
-                            # Criar heatmap com formatação simplificada
-                            fig_calendar = px.imshow(
-                                pivot_calendar,
-                                labels=dict(x="Mês", y="Dia da Semana", color="Valor Total"),
-                                aspect="auto",
-                                text_auto=False,  # Desabilitar formatação automática
-                            )
-                            
-                            # Adicionar anotações formatadas manualmente
-                            for i in range(len(pivot_calendar.index)):
-                                for j in range(len(pivot_calendar.columns)):
-                                    if pivot_calendar.iloc[i, j] > 0:  # Só adicionar texto para valores positivos
-                                        fig_calendar.add_annotation(
-                                            x=j,
-                                            y=i,
-                                            text=text_values[i][j],
-                                            showarrow=False,
-                                            font=dict(color="white" if pivot_calendar.iloc[i, j] > pivot_calendar.values.max()/2 else "black")
-                                        )
-                            
-                            fig_calendar.update_layout(height=400)
+                            # Valor por dia da semana e mês, a partir da série diária, com os
+                            # valores em R$ anotados em cada célula
+                            fig_calendar = figuras.obter("calendario", estado_figuras, lambda: figura_calendario(
+                                calcular_calendario(diario)
+                            ))
                             st.plotly_chart(fig_calendar, use_container_width=True)
                             
                             st.markdown("""
@@ -889,175 +872,83 @@ if uploaded_file:
                         # Análise de tendência mensal
                         st.markdown("#### Tendência de Valores Pendentes")
                         
-                        df_mensal = df_filtrado.copy()
-                        df_mensal["AnoMes"] = df_mensal["Data entrada"].dt.to_period("M")
-                        tendencia_valor = df_mensal.groupby("AnoMes")["Valor conta"].sum().reset_index()
-                        tendencia_valor["AnoMes"] = tendencia_valor["AnoMes"].astype(str)
-                        
-                        # Calcular média móvel de 3 meses
-                        if len(tendencia_valor) >= 3:
-                            tendencia_valor["Media_Movel"] = tendencia_valor["Valor conta"].rolling(window=3).mean()
-                        
-                        # Criar gráfico de tendência
-                        fig_trend = px.line(
-                            tendencia_valor,
-                            x="AnoMes",
-                            y="Valor conta",
-                            markers=True,
-                            labels={"Valor conta": "Valor Total (R$)", "AnoMes": "Mês"}
-                        )
-                        
-                        # Adicionar média móvel se tiver dados suficientes
-                        if len(tendencia_valor) >= 3:
-                            fig_trend.add_scatter(
-                                x=tendencia_valor["AnoMes"],
-                                y=tendencia_valor["Media_Movel"],
-                                mode="lines",
-                                name="Média Móvel (3 meses)",
-                                line=dict(color="red", dash="dash")
-                            )
+                        # Valor por mês com média móvel de 3 meses
+                        fig_trend = figuras.obter("tendencia_valor", estado_figuras, lambda: figura_tendencia_valor(
+                            calcular_tendencia_valor(diario)
+                        ))
                         
                         st.plotly_chart(fig_trend, use_container_width=True)
-                        
+
+                        # Projeção por convênio x setor (suavização exponencial ou ingênuo sazonal)
+                        st.markdown("#### Projeção de Novos Valores por Convênio e Setor")
+
+                        horizonte = st.slider("Meses de projeção", min_value=1, max_value=12, value=3)
+                        fig_projecao = figuras.obter("projecao", (estado_figuras, horizonte), lambda: figura_projecao(
+                            modelo_previsao.serie_total(horizonte, convenios_previsao, setores_previsao)
+                        ))
+                        st.plotly_chart(fig_projecao, use_container_width=True)
+
+                        parametros_previsao = modelo_previsao.parametros(horizonte, convenios_previsao, setores_previsao)
+                        st.dataframe(parametros_previsao.head(20), column_config=formatos_colunas(
+                            moeda=["Erro (RMSE)", f"Projeção {horizonte} meses"], decimais=["Alfa"]
+                        ))
+
+                        st.caption(
+                            f"{len(parametros_previsao)} séries ajustadas em {modelo_previsao.tempo_ajuste * 1000:.0f} ms. "
+                            "Cada série usa o modelo de menor erro um passo à frente no histórico mensal "
+                            "(o mês corrente, ainda incompleto, não entra no ajuste)."
+                        )
+
                         # Análise de sazonalidade
                         st.markdown("#### Sazonalidade por Dia da Semana")
                         
-                        df_dia_semana = df_filtrado.copy()
-                        df_dia_semana["Dia da Semana"] = df_dia_semana["Data entrada"].dt.day_name()
-                        
-                        # Ordenar os dias da semana
-                        dias_ordem = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-                        dias_pt = {
-                            "Monday": "Segunda", "Tuesday": "Terça", "Wednesday": "Quarta",
-                            "Thursday": "Quinta", "Friday": "Sexta", "Saturday": "Sábado", "Sunday": "Domingo"
-                        }
-                        
-                        dia_semana_agg = df_dia_semana.groupby("Dia da Semana")["Valor conta"].agg(
-                            Quantidade="count",
-                            Valor_Total="sum"
-                        ).reset_index()
-                        
-                        # Ordenar os dias e traduzir se necessário
-                        dia_semana_agg["Dia da Semana"] = pd.Categorical(dia_semana_agg["Dia da Semana"], categories=dias_ordem, ordered=True)
-                        dia_semana_agg = dia_semana_agg.sort_values("Dia da Semana")
-                        dia_semana_agg["Dia da Semana"] = dia_semana_agg["Dia da Semana"].map(lambda x: dias_pt.get(x, x))
+                        dia_semana_agg = memo.obter(chave_filtros, "dia_semana", lambda: calcular_sazonalidade_dia_semana(diario))
                         
                         # Criar gráfico de barras
                         col1, col2 = st.columns(2)
                         
                         with col1:
-                            fig_dia_qtd = px.bar(
-                                dia_semana_agg,
-                                x="Dia da Semana",
-                                y="Quantidade",
-                                text_auto=True,
-                                labels={"Quantidade": "Quantidade de Contas", "Dia da Semana": "Dia da Semana"}
-                            )
+                            fig_dia_qtd = figuras.obter("dia_semana_quantidade", estado_figuras, lambda: figura_dia_semana_quantidade(dia_semana_agg))
                             st.plotly_chart(fig_dia_qtd, use_container_width=True)
                         
                         with col2:
-                            fig_dia_valor = px.bar(
-                                dia_semana_agg,
-                                x="Dia da Semana",
-                                y="Valor_Total",
-                                text_auto=True,
-                                labels={"Valor_Total": "Valor Total (R$)", "Dia da Semana": "Dia da Semana"}
-                            )
-                            fig_dia_valor.update_traces(texttemplate='%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'), textposition='outside')
+                            fig_dia_valor = figuras.obter("dia_semana_valor", estado_figuras, lambda: figura_dia_semana_valor(dia_semana_agg))
                             st.plotly_chart(fig_dia_valor, use_container_width=True)
                     
                     # Adicionar seção para insights de eficiência operacional
                     with st.expander("🔄 Eficiência Operacional", expanded=False):
                         st.markdown("### 🔄 Análise de Eficiência Operacional")
                         
-                        # Calcular métricas de eficiência
-                        df_eficiencia = df_filtrado.copy()
-                        df_eficiencia["Dias Pendentes"] = (pd.Timestamp.today().normalize() - df_eficiencia["Data entrada"].dt.normalize()).dt.days
-                        
                         # Tempo médio por setor
-                        tempo_medio_setor = df_eficiencia.groupby("Último Setor destino")["Dias Pendentes"].mean().sort_values(ascending=False)
+                        tempo_medio_setor = memo.obter(chave_filtros, ("tempo_medio_setor", hoje), lambda: calcular_tempo_medio_setor(df_filtrado))
                         
                         # Gráfico de tempo médio por setor
                         st.markdown("#### Tempo Médio por Setor (Top 10)")
-                        fig_tempo_setor = px.bar(
-                            tempo_medio_setor.head(10).reset_index(),
-                            x="Último Setor destino",
-                            y="Dias Pendentes",
-                            text_auto=True,
-                            labels={"Dias Pendentes": "Dias Médios", "Último Setor destino": "Setor"}
-                        )
-                        fig_tempo_setor.update_traces(texttemplate='%{y:.1f}', textposition='outside')
-                        fig_tempo_setor.update_layout(xaxis_tickangle=-45)
+                        fig_tempo_setor = figuras.obter("tempo_setor_eficiencia", estado_figuras_hoje, lambda: figura_tempo_setor(
+                            tempo_medio_setor, rotulo_dias="Dias Médios"
+                        ))
                         st.plotly_chart(fig_tempo_setor, use_container_width=True)
                         
                         # Análise de gargalos
                         st.markdown("#### Gargalos Identificados (Contas > 90 dias)")
                         
-                        gargalos = df_eficiencia[df_eficiencia["Dias Pendentes"] > 90].groupby("Último Setor destino").agg(
-                            Quantidade=("Conta", "count"),
-                            Valor_Total=("Valor conta", "sum"),
-                            Tempo_Medio=("Dias Pendentes", "mean")
-                        ).sort_values(by="Quantidade", ascending=False).reset_index()
+                        visao_gargalos = precomputador.obter("gargalos", df_filtrado)
+                        gargalos = visao_gargalos["gargalos"]
                         
                         if not gargalos.empty:
-                            gargalos["% do Total de Contas"] = (gargalos["Quantidade"] / df_eficiencia[df_eficiencia["Dias Pendentes"] > 90].shape[0]) * 100
-                            
                             st.dataframe(
-                                gargalos.head(10).style.format({
-                                    "Valor_Total": formatar_moeda,
-                                    "Tempo_Medio": "{:.1f}",
-                                    "% do Total de Contas": "{:.2f}%"
-                                }),
+                                gargalos.drop(columns="Percentual Acumulado").head(10),
+                                column_config={
+                                    **formatos_colunas(moeda=["Valor_Total"], percentuais=["% do Total de Contas"]),
+                                    "Tempo_Medio": st.column_config.NumberColumn(format="%.1f")
+                                },
                                 height=300
                             )
                             
                             # Gráfico de Pareto para gargalos
                             st.markdown("#### Análise de Pareto - Gargalos por Quantidade de Contas")
                             
-                            # Preparar dados para Pareto
-                            pareto_data = gargalos.copy()
-                            pareto_data = pareto_data.sort_values(by="Quantidade", ascending=False)
-                            pareto_data["Percentual Acumulado"] = pareto_data["Quantidade"].cumsum() / pareto_data["Quantidade"].sum() * 100
-                            
-                            # Criar gráfico de Pareto
-                            fig_pareto = go.Figure()
-                            
-                            # Adicionar barras
-                            fig_pareto.add_trace(go.Bar(
-                                x=pareto_data["Último Setor destino"].head(10),
-                                y=pareto_data["Quantidade"].head(10),
-                                name="Quantidade",
-                                text=pareto_data["Quantidade"].head(10),
-                                textposition="outside"
-                            ))
-                            
-                            # Adicionar linha de percentual acumulado
-                            fig_pareto.add_trace(go.Scatter(
-                                x=pareto_data["Último Setor destino"].head(10),
-                                y=pareto_data["Percentual Acumulado"].head(10),
-                                name="% Acumulado",
-                                mode="lines+markers",
-                                yaxis="y2",
-                                line=dict(color="red"),
-                                marker=dict(size=8)
-                            ))
-                            
-                            # Configurar layout
-                            fig_pareto.update_layout(
-                                xaxis=dict(title="Setor"),
-                                yaxis=dict(title="Quantidade de Contas", side="left"),
-                                yaxis2=dict(
-                                    title="Percentual Acumulado (%)",
-                                    side="right",
-                                    overlaying="y",
-                                    range=[0, 100],
-                                    showgrid=False,
-                                    ticksuffix="%"
-                                ),
-                                legend=dict(x=0.01, y=0.99),
-                                barmode="group"
-                            )
-                            
+                            fig_pareto = visao_gargalos["fig_pareto"]
                             st.plotly_chart(fig_pareto, use_container_width=True)
                             
                             st.markdown("""
@@ -1068,95 +959,129 @@ if uploaded_file:
                             """)
                         else:
                             st.info("Não foram encontradas contas com mais de 90 dias pendentes.")
-                    
-                            # Adicionar botão para exportar análise completa
-                            st.markdown("### 📊 Exportar Análise Completa")
-                            
-                            if st.button("Gerar Relatório Completo"):
-                                from io import BytesIO
-                                
-                                # Criar buffer para o Excel
-                                buffer = BytesIO()
-                                
-                                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                                    # Resumo geral
-                                    pd.DataFrame([kpis_filtrados]).to_excel(writer, sheet_name="Resumo Geral", index=False)
-                                    
-                                    # Análise por convênio
-                                    resumo_convenio.reset_index().to_excel(writer, sheet_name="Análise por Convênio", index=False)
-                                    
-                                    # Análise por setor
-                                    resumo_etapa.reset_index().to_excel(writer, sheet_name="Análise por Setor", index=False)
-                                    
-                                    # Análise por médico
-                                    resumo_medico.reset_index().to_excel(writer, sheet_name="Análise por Médico", index=False)
-                                    
-                                    # Contas com problemas
-                                    if not zeradas_df.empty:
-                                        zeradas_df.to_excel(writer, sheet_name="Contas Zeradas", index=False)
-                                    
-                                    if not outliers_df.empty:
-                                        outliers_df.to_excel(writer, sheet_name="Contas Outliers", index=False)
-                                    
-                                    if not antigas_df.empty:
-                                        antigas_df.to_excel(writer, sheet_name="Contas >90 dias", index=False)
-                                    
-                                    # Análise de aging
-                                    df_filtrado.groupby("Categoria Aging").agg(
-                                        Quantidade=("Conta", "count"),
-                                        Valor_Total=("Valor conta", "sum")
-                                    ).reset_index().to_excel(writer, sheet_name="Aging", index=False)
-                                    
-                                    # Dados filtrados
-                                    df_filtrado.to_excel(writer, sheet_name="Dados Completos", index=False)
-                                
-                                # Oferecer para download
-                                st.download_button(
-                                    label="📥 Baixar Relatório Excel",
-                                    data=buffer.getvalue(),
-                                    file_name=f"analise_faturamento_hospital_{datetime.today().strftime('%Y-%m-%d')}.xlsx",
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                )
-                                
-                                st.success("Relatório gerado com sucesso! Clique no botão acima para baixar.")
-                            else:
-                                st.info("👆 Faça o upload de uma planilha Excel para começar a análise de faturamento hospitalar.")
-                                
-                                # Mostrar modelo de exemplo
-                                st.markdown("""
-                                ### 📋 Como usar esta ferramenta
-                                
-                                1. Faça o upload de uma planilha Excel contendo os dados de contas pendentes do hospital
-                                2. A planilha deve conter as seguintes colunas:
-                                    - Status
-                                    - Tipo atendimento
-                                    - Conta
-                                    - Atendimento
-                                    - Status atendimento
-                                    - Convênio
-                                    - Categoria
-                                    - Valor conta
-                                    - Etapa anterior
-                                    - Último Setor destino
-                                    - Setor atendimento
-                                    - Estabelecimento
-                                    - Data entrada
-                                    - Médico executor
-                                3. Após o upload, utilize os filtros no painel lateral para refinar sua análise
-                                4. Explore as diferentes abas para obter insights específicos
-                                
-                                ### 🔍 Principais recursos
-                                
-                                - **Dashboard Principal**: Visão geral dos KPIs mais importantes
-                                - **Insights**: Análises rápidas com possibilidade de download de planilhas específicas
-                                - **Análise por Convênio**: Detalhamento financeiro por convênio
-                                - **Análise por Fluxo**: Identificação de gargalos no processo
-                                - **Análise por Médico**: Performance financeira por médico
-                                - **Visualizações Avançadas**: Gráficos detalhados para análise aprofundada
-                                - **Projeções e Tendências**: Análise temporal e sazonalidade
-                                - **Eficiência Operacional**: Identificação de gargalos e oportunidades de melhoria
-                                
-                                ### 📊 Exportação de dados
-                                
-                                Você pode exportar qualquer análise específica ou gerar um relatório completo em Excel.
-                                """)
+
+                    # Adicionar botão para exportar análise completa
+                    st.markdown("### 📊 Exportar Análise Completa")
+
+                    if st.button("Gerar Relatório Completo"):
+                        buffer = gerar_relatorio_excel(
+                            df_filtrado, kpis_filtrados, resumo_convenio,
+                            resumo_etapa, resumo_medico, df_completo=df, data_referencia=referencia
+                        )
+
+                        # Oferecer para download
+                        st.download_button(
+                            label="📥 Baixar Relatório Excel",
+                            data=buffer.getvalue(),
+                            file_name=f"analise_faturamento_hospital_{datetime.today().strftime('%Y-%m-%d')}.xlsx",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+
+                        st.success("Relatório gerado com sucesso! Clique no botão acima para baixar.")
+
+        with tab6:
+            st.markdown("### 🧭 Estabelecimento → Convênio → Setor → Médico → Conta")
+            st.caption("Escolha um item em cada nível para abrir o nível seguinte. Os subtotais de todos os níveis são calculados uma vez por estado de filtros.")
+            explorador = precomputador.obter("hierarquia", df_filtrado)["explorador"]
+            explorar_hierarquia(explorador)
+
+        with tab7:
+            st.markdown("### 🔁 Transições entre Faixas de Aging")
+            explorar_transicoes(transicoes_aging())
+        
+        # Visões pré-calculadas guardadas junto do recorte, para não agendá-las de novo ao
+        # voltar a este estado de filtros
+        visoes_concluidas = precomputador.concluidas()
+        if len(visoes_concluidas) > len(memo.resultado(chave_filtros, ("visoes", hoje, data_referencia)) or {}):
+            memo.guardar(chave_filtros, ("visoes", hoje, data_referencia), visoes_concluidas)
+        
+        # Tempos do pré-cálculo em segundo plano
+        with st.sidebar.expander("⏱️ Desempenho", expanded=False):
+            for aba, segundos in zip(relatorio_abas["Aba"], relatorio_abas["Tempo de leitura (s)"]):
+                st.write(f"Leitura da aba {aba}: {segundos * 1000:.0f} ms")
+            if relatorio_duplicatas:
+                st.write(f"Remoção de duplicatas: {relatorio_duplicatas['segundos'] * 1000:.0f} ms ({relatorio_duplicatas['linhas_removidas']} linhas)")
+            for nome, segundos in precomputador.tempos.items():
+                st.write(f"Pré-cálculo {nome}: {segundos * 1000:.0f} ms")
+            for nome, segundos in explorador.tempos.items():
+                st.write(f"Hierarquia ({nome}): {segundos * 1000:.1f} ms")
+            for (data_historico, meses), segundos in motor_aging.tempos.items():
+                st.write(f"Aging de {meses} fins de mês até {data_historico:%d/%m/%Y}: {segundos * 1000:.1f} ms")
+            st.write(f"Ajuste das projeções ({len(modelo_previsao.chaves)} séries): {modelo_previsao.tempo_ajuste * 1000:.0f} ms")
+            estatisticas_memo = memo.estatisticas()
+            st.write(
+                f"Memo de filtros: {estatisticas_memo['entradas']} recortes, "
+                f"{estatisticas_memo['memoria'] / 1024 ** 2:.0f} de {estatisticas_memo['orcamento'] / 1024 ** 2:.0f} MB, "
+                f"{estatisticas_memo['descartes']} descartados"
+            )
+            for nome, taxa in estatisticas_memo["resultados"].items():
+                st.write(f"Memo {nome}: {taxa['taxa_acerto']:.0%} de acertos ({taxa['acertos']} de {taxa['acertos'] + taxa['faltas']})")
+            estatisticas_figuras = figuras.estatisticas()
+            acertos_figuras = sum(v["acertos"] for v in estatisticas_figuras["visoes"].values())
+            consultas_figuras = acertos_figuras + sum(v["faltas"] for v in estatisticas_figuras["visoes"].values())
+            st.write(
+                f"Cache de figuras (todas as sessões): {estatisticas_figuras['figuras']} figuras, "
+                f"{estatisticas_figuras['memoria'] / 1024 ** 2:.1f} de {estatisticas_figuras['orcamento'] / 1024 ** 2:.0f} MB, "
+                f"{acertos_figuras / consultas_figuras:.0%} de acertos, {estatisticas_figuras['descartes']} descartadas"
+            )
+            estatisticas_transicoes = transicoes_aging().estatisticas()
+            st.write(
+                f"Transições de aging (todas as sessões): {estatisticas_transicoes['pares']} pares em cache, "
+                f"{estatisticas_transicoes['taxa_acerto']:.0%} de acertos"
+            )
+            for pares, segundos in transicoes_aging().tempos.items():
+                st.write(f"Transições de {pares} pares novos: {segundos * 1000:.0f} ms")
+            estatisticas_sessoes = gerenciador.estatisticas()
+            st.write(
+                f"Sessões: {estatisticas_sessoes['sessoes']} ({estatisticas_sessoes['em_disco']} descarregadas em disco), "
+                f"{estatisticas_sessoes['memoria'] / 1024 ** 2:.0f} de {estatisticas_sessoes['teto'] / 1024 ** 2:.0f} MB; "
+                f"esta sessão: {armazem.tamanho / 1024 ** 2:.0f} MB"
+            )
+            for nome, segundos in armazem.tempos.items():
+                st.write(f"Última {nome} desta sessão: {segundos * 1000:.0f} ms")
+    
+    # Fim do rerun: mede a sessão e descarrega outras sessões se a memória passou do teto
+    gerenciador.concluir(armazem)
+
+else:
+    st.info("👆 Faça o upload de uma planilha Excel para começar a análise de faturamento hospitalar.")
+
+    # Mostrar modelo de exemplo
+    st.markdown("""
+    ### 📋 Como usar esta ferramenta
+
+    1. Faça o upload de uma planilha Excel contendo os dados de contas pendentes do hospital
+    2. A planilha deve conter as seguintes colunas:
+        - Status
+        - Tipo atendimento
+        - Conta
+        - Atendimento
+        - Status atendimento
+        - Convênio
+        - Categoria
+        - Valor conta
+        - Etapa anterior
+        - Último Setor destino
+        - Setor atendimento
+        - Estabelecimento
+        - Data entrada
+        - Médico executor
+    3. Após o upload, utilize os filtros no painel lateral para refinar sua análise
+    4. Explore as diferentes abas para obter insights específicos
+
+    ### 🔍 Principais recursos
+
+    - **Dashboard Principal**: Visão geral dos KPIs mais importantes
+    - **Insights**: Análises rápidas com possibilidade de download de planilhas específicas
+    - **Análise por Convênio**: Detalhamento financeiro por convênio
+    - **Análise por Fluxo**: Identificação de gargalos no processo
+    - **Análise por Médico**: Performance financeira por médico
+    - **Visualizações Avançadas**: Gráficos detalhados para análise aprofundada
+    - **Projeções e Tendências**: Análise temporal e sazonalidade
+    - **Eficiência Operacional**: Identificação de gargalos e oportunidades de melhoria
+
+    ### 📊 Exportação de dados
+
+    Você pode exportar qualquer análise específica ou gerar um relatório completo em Excel.
+    Os dados filtrados também saem em CSV (padrão brasileiro) ou Parquet na aba de Insights.
+    """)
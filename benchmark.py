@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from gerador_dados import gerar_contas, interpretar_tamanho, rotulo_tamanho
+from analises import (
+    preparar_dados, carregar_planilha, calcular_aging, calcular_kpis, gerar_insights,
+    aplicar_filtros, separar_contas_criticas, contas_criticas, calcular_resumo_convenio, calcular_resumo_setor,
+    calcular_resumo_medico, calcular_aging_convenio, calcular_tempo_medio_setor,
+    calcular_fluxo_sankey, calcular_medico_convenio,
+    calcular_gargalos, gerar_excel_bytes, gerar_relatorio_excel
+)
+from indice_datas import IndiceDatas
+from rollup import (
+    construir_rollup_diario, filtrar_rollup, totais_diarios, calcular_tendencia_mensal,
+    calcular_tendencia_valor, calcular_sazonalidade_dia_semana, calcular_calendario
+)
+from previsao import ModeloPrevisao
+from aging import MotorAging, series_do_recorte
+from ingestao import carregar_abas
+from deduplicacao import deduplicar
+from hierarquia import ExploradorHierarquia
+from outliers import escore_robusto
+from qualidade import validar_contas
+from memo_recortes import MemoRecortes, chave_recorte
+from cache_figuras import CacheFiguras
+from memoria_sessoes import GerenciadorMemoria
+from graficos import (
+    figura_setores, figura_tempo_setor, figura_tendencia_mensal, figura_treemap_convenios,
+    figura_histograma_valores, figura_calendario, figura_tendencia_valor
+)
+
+# Suíte de benchmarks do pipeline completo sobre dados sintéticos (gerador_dados.py).
+#
+# Uso:
+#   python benchmark.py                              # 10k e 100k, compara com o baseline
+#   python benchmark.py --tamanhos 10k,100k,1M,10M
+#   python benchmark.py --salvar-baseline            # grava benchmark_baseline.json
+#
+# Etapas que dependem de Excel (leitura e exportação) só rodam até --max-linhas-excel,
+# pois o openpyxl leva minutos acima disso e o formato não comporta 10M linhas numa aba.
+
+# Baseline versionado ao lado deste arquivo (não na pasta de onde o benchmark é chamado)
+arquivo_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Regressões menores que este tempo (em segundos) são consideradas ruído
+tempo_minimo_comparacao = 0.005
+
+def medir(funcao, repeticoes):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {"mediana": statistics.median(tempos), "minimo": min(tempos)}, resultado
+
+# Filtro típico de um analista: último ano e os 10 maiores convênios
+def filtros_tipicos(df):
+    data_fim = df["Data entrada"].max().date()
+    data_inicio = (df["Data entrada"].max() - pd.Timedelta(days=365)).date()
+    top_convenios = df.groupby("Convênio")["Valor conta"].sum().nlargest(10).index.tolist()
+    return dict(
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        convenios=top_convenios,
+        medicos=df["Médico executor"].dropna().unique(),
+        status=df["Status"].dropna().unique(),
+        setores=df["Último Setor destino"].dropna().unique(),
+    )
+
+def aba_convenio(df):
+    resumo = calcular_resumo_convenio(df)
+    return resumo, calcular_aging_convenio(df, resumo, top=5)
+
+def aba_fluxo(df):
+    return calcular_resumo_setor(df), calcular_tempo_medio_setor(df), calcular_fluxo_sankey(df)
+
+# Tendência mensal, tendência de valores, sazonalidade e calendário a partir do rollup diário
+def visoes_temporais(rollup, filtros):
+    diario = totais_diarios(filtrar_rollup(rollup, filtros["data_inicio"], filtros["data_fim"], filtros["convenios"]))
+    return (
+        calcular_tendencia_mensal(diario), calcular_tendencia_valor(diario),
+        calcular_sazonalidade_dia_semana(diario), calcular_calendario(diario)
+    )
+
+def aba_medico(df):
+    resumo = calcular_resumo_medico(df)
+    return resumo, calcular_medico_convenio(df, resumo, top=5)
+
+def aba_eficiencia(df):
+    return calcular_tempo_medio_setor(df), calcular_gargalos(df)
+
+def exportar_insights(df):
+    nomes = ["outliers", "antigas", "zeradas", "sem_alta", "negativos", "abaixo_mediana"]
+    return [gerar_excel_bytes(contas_criticas(df, nome), nome) for nome in nomes]
+
+# Explorador com os subtotais de todos os níveis, como no pré-cálculo do app
+def subtotais_hierarquia(df):
+    explorador = ExploradorHierarquia(df)
+    for nivel in range(len(explorador.niveis)):
+        explorador.subtotais(nivel)
+    return explorador
+
+# Abre o maior nó de cada nível, do estabelecimento até as contas de um médico
+def abrir_nos(explorador):
+    caminho = []
+    for _ in explorador.niveis:
+        filhos = explorador.filhos(caminho)
+        if filhos.empty or len(caminho) == len(explorador.niveis) - 1:
+            break
+        caminho.append(filhos.index[0])
+    return caminho
+
+# Volta a dois estados de filtros já vistos: recorte, KPIs e contas críticas de cada um,
+# refeitos a cada troca ou lidos do memo de recortes
+def alternar_filtros(df, estados, memo=None):
+    for filtros in estados:
+        if memo is None:
+            recorte = aplicar_filtros(df, **filtros)
+            calcular_kpis(recorte), separar_contas_criticas(recorte)
+        else:
+            chave = chave_recorte(None, **filtros)
+            recorte = memo.recorte(chave, lambda: aplicar_filtros(df, **filtros))
+            memo.obter(chave, "kpis", lambda: calcular_kpis(recorte))
+            memo.obter(chave, "criticas", lambda: separar_contas_criticas(recorte))
+
+# Figuras das abas montadas a partir do recorte: agregação e px.* a cada chamada ou, com o
+# cache de figuras, só na primeira vez para o mesmo estado
+def montar_figuras(df, rollup, filtros, cache=None):
+    diario = totais_diarios(filtrar_rollup(rollup, filtros["data_inicio"], filtros["data_fim"], filtros["convenios"]))
+    figuras = {
+        "setores": lambda: figura_setores(calcular_resumo_setor(df)),
+        "tempo_setor": lambda: figura_tempo_setor(calcular_tempo_medio_setor(df)),
+        "tendencia_mensal": lambda: figura_tendencia_mensal(calcular_tendencia_mensal(diario)),
+        "treemap": lambda: figura_treemap_convenios(df),
+        "histograma": lambda: figura_histograma_valores(df),
+        "calendario": lambda: figura_calendario(calcular_calendario(diario)),
+        "tendencia_valor": lambda: figura_tendencia_valor(calcular_tendencia_valor(diario)),
+    }
+    if cache is None:
+        return [construir() for construir in figuras.values()]
+    estado = chave_recorte(None, **filtros)
+    return [cache.obter(visao, estado, construir) for visao, construir in figuras.items()]
+
+# Executa todas as etapas para um tamanho de dados e devolve os tempos por etapa
+def executar_tamanho(linhas, repeticoes, repeticoes_excel, max_linhas_excel, seed):
+    etapas = {}
+    usa_excel = linhas <= max_linhas_excel
+
+    df_bruto = gerar_contas(linhas, seed=seed)
+
+    if usa_excel:
+        planilha = BytesIO()
+        with pd.ExcelWriter(planilha, engine="openpyxl") as writer:
+            df_bruto.to_excel(writer, index=False)
+        conteudo = planilha.getvalue()
+        etapas["ingestao_excel"], _ = medir(lambda: carregar_planilha(BytesIO(conteudo)), repeticoes_excel)
+
+        # Mesmo volume com uma aba por estabelecimento, lidas em paralelo
+        planilha_abas = BytesIO()
+        with pd.ExcelWriter(planilha_abas, engine="openpyxl") as writer:
+            for estabelecimento, grupo in df_bruto.groupby("Estabelecimento", observed=True):
+                grupo.to_excel(writer, sheet_name=str(estabelecimento)[:31], index=False)
+        conteudo_abas = planilha_abas.getvalue()
+        etapas["ingestao_excel_abas"], (_, _, relatorio_abas) = medir(
+            lambda: carregar_abas(BytesIO(conteudo_abas)), repeticoes_excel
+        )
+        for aba, segundos in zip(relatorio_abas["Aba"], relatorio_abas["Tempo de leitura (s)"]):
+            print(f"  aba {aba}: {segundos:.2f} s", file=sys.stderr)
+
+    etapas["preparar_dados"], (df, _) = medir(lambda: preparar_dados(df_bruto), repeticoes)
+    etapas["validar_contas"], df = medir(lambda: validar_contas(df), repeticoes)
+
+    # Remoção de duplicatas sobre os mesmos dados com 5% de linhas repetidas
+    df_repetido, _ = preparar_dados(gerar_contas(linhas, seed=seed, duplicadas=0.05))
+    etapas["deduplicar"], (_, relatorio_duplicatas) = medir(lambda: deduplicar(df_repetido), repeticoes)
+    print(f"  {relatorio_duplicatas['linhas_removidas']} linhas repetidas removidas", file=sys.stderr)
+    del df_repetido
+    etapas["calcular_aging"], _ = medir(lambda: calcular_aging(df), repeticoes)
+    etapas["calcular_kpis"], kpis = medir(lambda: calcular_kpis(df), repeticoes)
+    etapas["gerar_insights"], _ = medir(lambda: gerar_insights(df), repeticoes)
+    etapas["outliers_por_grupo"], _ = medir(lambda: escore_robusto(df), repeticoes)
+
+    filtros = filtros_tipicos(df)
+    etapas["aplicar_filtros"], df_filtrado = medir(lambda: aplicar_filtros(df, **filtros), repeticoes)
+
+    etapas["indice_datas"], indice = medir(lambda: IndiceDatas(df), repeticoes)
+    etapas["kpis_intervalo_indice"], _ = medir(
+        lambda: indice.kpis(filtros["data_inicio"], filtros["data_fim"], filtros["convenios"]), repeticoes
+    )
+
+    etapas["aging_24_meses"], _ = medir(
+        lambda: MotorAging(indice.series(filtros["convenios"])).historico_mensal(pd.Timestamp.today()), repeticoes
+    )
+    etapas["aging_24_meses_recorte"], _ = medir(
+        lambda: MotorAging(series_do_recorte(df_filtrado)).historico_mensal(pd.Timestamp.today()), repeticoes
+    )
+
+    etapas["rollup_diario"], rollup = medir(lambda: construir_rollup_diario(df), repeticoes)
+    etapas["visoes_temporais"], _ = medir(lambda: visoes_temporais(rollup, filtros), repeticoes)
+    etapas["ajuste_previsao"], modelo = medir(lambda: ModeloPrevisao(rollup), repeticoes)
+    etapas["projecao_recorte"], _ = medir(
+        lambda: modelo.serie_total(convenios=filtros["convenios"]), repeticoes
+    )
+
+    etapas["aba_insights"], _ = medir(lambda: separar_contas_criticas(df_filtrado), repeticoes)
+    etapas["aba_convenio"], (resumo_convenio, _) = medir(lambda: aba_convenio(df_filtrado), repeticoes)
+    etapas["aba_fluxo"], (resumo_etapa, *_) = medir(lambda: aba_fluxo(df_filtrado), repeticoes)
+    etapas["aba_medico"], (resumo_medico, _) = medir(lambda: aba_medico(df_filtrado), repeticoes)
+    etapas["aba_eficiencia"], _ = medir(lambda: aba_eficiencia(df_filtrado), repeticoes)
+    etapas["hierarquia_subtotais"], explorador = medir(lambda: subtotais_hierarquia(df_filtrado), repeticoes)
+    etapas["hierarquia_abrir_no"], _ = medir(lambda: abrir_nos(explorador), repeticoes)
+
+    estados = [filtros, dict(filtros, convenios=filtros["convenios"][:3])]
+    memo = MemoRecortes()
+    alternar_filtros(df, estados, memo)
+    etapas["trocar_filtros"], _ = medir(lambda: alternar_filtros(df, estados), repeticoes)
+    etapas["trocar_filtros_memo"], _ = medir(lambda: alternar_filtros(df, estados, memo), repeticoes)
+
+    cache_figuras = CacheFiguras()
+    montar_figuras(df_filtrado, rollup, filtros, cache_figuras)
+    etapas["montar_figuras"], _ = medir(lambda: montar_figuras(df_filtrado, rollup, filtros), repeticoes)
+    etapas["montar_figuras_cache"], _ = medir(lambda: montar_figuras(df_filtrado, rollup, filtros, cache_figuras), repeticoes)
+
+    # Sessão ociosa: DataFrame preparado gravado em Feather e lido de volta por memory map
+    armazem = GerenciadorMemoria(vigiar=False).novo_armazem()
+    armazem["df"] = df
+    etapas["descarregar_sessao"], _ = medir(lambda: (armazem.__setitem__("df", df), armazem.descarregar()), repeticoes)
+    quadro_em_disco = armazem.dados["df"]
+    etapas["restaurar_sessao"], _ = medir(lambda: (armazem.__setitem__("df", quadro_em_disco), armazem["df"]), repeticoes)
+
+    if usa_excel:
+        etapas["exportar_insights"], _ = medir(lambda: exportar_insights(df_filtrado), repeticoes_excel)
+        etapas["exportar_relatorio"], _ = medir(
+            lambda: gerar_relatorio_excel(df_filtrado, kpis, resumo_convenio, resumo_etapa, resumo_medico),
+            repeticoes_excel
+        )
+
+    return {"linhas": linhas, "linhas_filtradas": len(df_filtrado), "etapas": etapas}
+
+def descrever_ambiente():
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+    }
+
+def imprimir_resultados(resultados, baseline, tolerancia):
+    regressoes = []
+    referencia = (baseline or {}).get("resultados", {})
+
+    for rotulo, resultado in resultados.items():
+        linhas = f"{resultado['linhas']:,}".replace(",", ".")
+        filtradas = f"{resultado['linhas_filtradas']:,}".replace(",", ".")
+        print(f"\n== {rotulo} ({linhas} linhas, {filtradas} após filtros) ==")
+        print(f"{'etapa':<22}{'mediana (s)':>14}{'baseline (s)':>14}{'razão':>9}")
+        etapas_base = referencia.get(rotulo, {}).get("etapas", {})
+
+        for etapa, tempos in resultado["etapas"].items():
+            linha = f"{etapa:<22}{tempos['mediana']:>14.4f}"
+            if etapa in etapas_base:
+                base = etapas_base[etapa]["mediana"]
+                razao = tempos["mediana"] / base if base > 0 else float("inf")
+                linha += f"{base:>14.4f}{razao:>8.2f}x"
+                if razao > tolerancia and tempos["mediana"] > tempo_minimo_comparacao:
+                    linha += "  REGRESSÃO"
+                    regressoes.append((rotulo, etapa, razao))
+            print(linha)
+
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de análise de contas pendentes.")
+    parser.add_argument("--tamanhos", default="10k,100k", help="tamanhos separados por vírgula (ex.: 10k,100k,1M,10M)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="repetições por etapa (usa a mediana)")
+    parser.add_argument("--repeticoes-excel", type=int, default=1, help="repetições das etapas de leitura/exportação Excel")
+    parser.add_argument("--max-linhas-excel", default="100k", help="maior tamanho em que leitura/exportação Excel são medidas")
+    parser.add_argument("--seed", type=int, default=42, help="semente dos dados sintéticos")
+    parser.add_argument("--baseline", default=arquivo_baseline, help="arquivo de baseline para comparação")
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como novo baseline")
+    parser.add_argument("--saida", help="grava os resultados desta execução em JSON")
+    parser.add_argument("--tolerancia", type=float, default=1.25, help="razão acima da qual uma etapa é regressão")
+    parser.add_argument("--falhar-em-regressao", action="store_true", help="retorna código 1 se houver regressões")
+    args = parser.parse_args()
+
+    tamanhos = [interpretar_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]
+    max_linhas_excel = interpretar_tamanho(args.max_linhas_excel)
+
+    resultados = {}
+    for linhas in tamanhos:
+        print(f"Executando {rotulo_tamanho(linhas)}...", file=sys.stderr)
+        resultados[rotulo_tamanho(linhas)] = executar_tamanho(
+            linhas, args.repeticoes, args.repeticoes_excel, max_linhas_excel, args.seed
+        )
+
+    execucao = {
+        "gerado_em": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "ambiente": descrever_ambiente(),
+        "repeticoes": args.repeticoes,
+        "repeticoes_excel": args.repeticoes_excel,
+        "resultados": resultados,
+    }
+
+    baseline = None
+    if not args.salvar_baseline:
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"Baseline {args.baseline} não encontrado; exibindo apenas os tempos atuais.", file=sys.stderr)
+
+    regressoes = imprimir_resultados(resultados, baseline, args.tolerancia)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(execucao, f, indent=2, ensure_ascii=False)
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(execucao, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline gravado em {args.baseline}")
+
+    if regressoes:
+        print(f"\n{len(regressoes)} etapa(s) acima da tolerância de {args.tolerancia:.2f}x")
+        if args.falhar_em_regressao:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+import pandas as pd
+import pyarrow as pa
+from gerador_dados import gerar_contas, interpretar_tamanho, rotulo_tamanho
+from analises import preparar_dados, calcular_resumo_convenio, calcular_resumo_medico, formatar_moeda
+
+# Custo de levar as tabelas do app para o navegador: o st.dataframe serializa cada DataFrame
+# em Arrow IPC a cada rerun.
+#
+# Para as tabelas por convênio, por médico e os dados completos, compara:
+#   - objeto  colunas de texto como objetos Python (o pipeline no pandas 2, antes do Arrow)
+#   - arrow   colunas como saem de preparar_dados (texto em arrays do Arrow)
+#   - styler  a tabela com Styler e formatar_moeda, como o app exibia os resumos (o Streamlit
+#             formata cada célula em Python e envia também os textos formatados)
+#
+# Uso:
+#   python benchmark_arrow.py
+#   python benchmark_arrow.py --tamanhos 100k,1M --saida arrow.json
+
+formatos_resumo = {
+    "Total": formatar_moeda,
+    "Média": formatar_moeda,
+    "Quantidade": "{:.0f}",
+    "% do Total": "{:.2f}%",
+}
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+# O que o st.dataframe faz com um DataFrame: Table.from_pandas e escrita em IPC
+def serializar(df):
+    tabela = pa.Table.from_pandas(df)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue().size
+
+def serializar_styler(df):
+    from streamlit.elements.lib.pandas_styler_utils import marshall_styler
+    from streamlit.proto.ArrowData_pb2 import ArrowData
+    marshall_styler(ArrowData(), df.style.format({c: f for c, f in formatos_resumo.items() if c in df.columns}), "benchmark")
+    return serializar(df)
+
+def como_objeto(df):
+    colunas_texto = [col for col in df.columns if isinstance(df[col].dtype, pd.StringDtype) or str(df[col].dtype) == "str"]
+    df = df.astype({col: object for col in colunas_texto})
+    if isinstance(df.index.dtype, pd.StringDtype) or str(df.index.dtype) == "str":
+        df.index = df.index.astype(object)
+    return df
+
+def medir_tabela(df, modo, repeticoes):
+    funcao = serializar_styler if modo == "styler" else serializar
+    return {
+        "linhas": len(df),
+        "memoria_mb": df.memory_usage(deep=True).sum() / 1e6,
+        "serializacao_ms": medir(lambda: funcao(df), repeticoes) * 1000,
+        "arrow_mb": serializar(df) / 1e6,
+    }
+
+def executar_tamanho(linhas, repeticoes, seed):
+    # O gerador devolve categorias; a planilha chega com texto, como object
+    df_bruto = gerar_contas(linhas, seed=seed)
+    df, _ = preparar_dados(df_bruto.astype({col: object for col in df_bruto.select_dtypes("category").columns}))
+    tabelas = {
+        "convenio": calcular_resumo_convenio(df),
+        "medico": calcular_resumo_medico(df),
+        "dados_completos": df,
+    }
+
+    resultados = {}
+    for nome, tabela in tabelas.items():
+        resultados[f"{nome}:objeto"] = medir_tabela(como_objeto(tabela), "objeto", repeticoes)
+        resultados[f"{nome}:arrow"] = medir_tabela(tabela, "arrow", repeticoes)
+        if nome != "dados_completos":
+            resultados[f"{nome}:styler"] = medir_tabela(tabela, "styler", repeticoes)
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialização para Arrow das tabelas do dashboard.")
+    parser.add_argument("--tamanhos", default="10k,100k", help="tamanhos separados por vírgula (ex.: 10k,100k,1M)")
+    parser.add_argument("--repeticoes", type=int, default=5, help="repetições por medida (usa a mediana)")
+    parser.add_argument("--seed", type=int, default=42, help="semente dos dados sintéticos")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    resultados = {}
+    for linhas in [interpretar_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]:
+        print(f"Executando {rotulo_tamanho(linhas)}...", file=sys.stderr)
+        resultados[rotulo_tamanho(linhas)] = executar_tamanho(linhas, args.repeticoes, args.seed)
+
+    for tamanho, medidas in resultados.items():
+        print(f"\n{tamanho}")
+        print(f"{'tabela:modo':<26}{'linhas':>10}{'memória (MB)':>15}{'serialização (ms)':>20}{'Arrow (MB)':>13}")
+        for nome, m in medidas.items():
+            print(f"{nome:<26}{m['linhas']:>10}{m['memoria_mb']:>15.2f}{m['serializacao_ms']:>20.1f}{m['arrow_mb']:>13.2f}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from gerador_dados import gerar_contas, interpretar_tamanho, rotulo_tamanho
+from analises import preparar_dados, gerar_excel_bytes
+from exportacao import escritores, tamanho_bloco_padrao
+
+# Vazão e memória da exportação dos dados filtrados.
+#
+# Compara o Excel de "Dados Completos" (planilha inteira do openpyxl em memória), o CSV
+# montado de uma vez com to_csv e a exportação em blocos (CSV brasileiro e Parquet) gravada
+# direto em arquivo, como a API faz no socket. A memória é o pico de RSS acima do início de
+# cada medida, amostrado de /proc/self/statm (Linux) por uma thread.
+#
+# Uso:
+#   python benchmark_exportacao.py
+#   python benchmark_exportacao.py --tamanhos 100k,1M,5M --max-linhas-excel 100k
+
+tamanho_pagina = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_atual():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * tamanho_pagina
+
+# Tempo e pico de RSS (acima do início) de uma função
+def medir(funcao):
+    gc.collect()
+    inicio_rss = rss_atual()
+    pico = inicio_rss
+    parar = threading.Event()
+
+    def amostrar():
+        nonlocal pico
+        while not parar.wait(0.002):
+            pico = max(pico, rss_atual())
+
+    amostrador = threading.Thread(target=amostrar, daemon=True)
+    amostrador.start()
+    inicio = time.perf_counter()
+    tamanho = funcao()
+    segundos = time.perf_counter() - inicio
+    parar.set()
+    amostrador.join()
+    return segundos, max(pico, rss_atual()) - inicio_rss, tamanho
+
+def em_arquivo(escritor, df, tamanho_bloco):
+    def exportar():
+        with tempfile.TemporaryFile() as destino:
+            escritor(df, destino, tamanho_bloco)
+            return destino.tell()
+    return exportar
+
+def executar_tamanho(linhas, tamanho_bloco, max_linhas_excel, seed):
+    df, _ = preparar_dados(gerar_contas(linhas, seed=seed))
+    modos = {
+        "csv_em_blocos": em_arquivo(escritores["csv"], df, tamanho_bloco),
+        "parquet_em_blocos": em_arquivo(escritores["parquet"], df, tamanho_bloco),
+        "csv_inteiro": lambda: len(df.to_csv(sep=";", decimal=",", index=False, date_format="%d/%m/%Y").encode("utf-8")),
+    }
+    if linhas <= max_linhas_excel:
+        modos["excel_inteiro"] = lambda: len(gerar_excel_bytes(df, "Dados Completos").getvalue())
+
+    resultados = {}
+    for nome, funcao in modos.items():
+        segundos, memoria, tamanho = medir(funcao)
+        resultados[nome] = {
+            "segundos": segundos,
+            "linhas_por_s": linhas / segundos,
+            "mb_por_s": tamanho / 1e6 / segundos,
+            "arquivo_mb": tamanho / 1e6,
+            "pico_memoria_mb": memoria / 1e6,
+        }
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão e memória da exportação dos dados filtrados.")
+    parser.add_argument("--tamanhos", default="100k,1M", help="tamanhos separados por vírgula (ex.: 100k,1M,5M)")
+    parser.add_argument("--tamanho-bloco", type=int, default=tamanho_bloco_padrao, help="linhas por bloco")
+    parser.add_argument("--max-linhas-excel", default="100k", help="maior tamanho em que o Excel é medido")
+    parser.add_argument("--seed", type=int, default=42, help="semente dos dados sintéticos")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    tamanho_bloco = args.tamanho_bloco
+    max_linhas_excel = interpretar_tamanho(args.max_linhas_excel)
+
+    resultados = {}
+    for linhas in [interpretar_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]:
+        print(f"Executando {rotulo_tamanho(linhas)}...", file=sys.stderr)
+        resultados[rotulo_tamanho(linhas)] = executar_tamanho(linhas, tamanho_bloco, max_linhas_excel, args.seed)
+
+    for tamanho, medidas in resultados.items():
+        print(f"\n{tamanho} (blocos de {tamanho_bloco} linhas)")
+        print(f"{'modo':<20}{'tempo (s)':>11}{'linhas/s':>13}{'MB/s':>9}{'arquivo (MB)':>14}{'pico RSS (MB)':>15}")
+        for nome, m in medidas.items():
+            print(f"{nome:<20}{m['segundos']:>11.2f}{m['linhas_por_s']:>13,.0f}{m['mb_por_s']:>9.1f}{m['arquivo_mb']:>14.1f}{m['pico_memoria_mb']:>15.1f}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"tamanho_bloco": tamanho_bloco, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
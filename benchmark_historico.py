@@ -0,0 +1,100 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+import pandas as pd
+from gerador_dados import gerar_snapshots, interpretar_tamanho, rotulo_tamanho
+from analises import preparar_dados
+from historico import HistoricoContas, max_arquivos_particao
+from transicoes import TransicoesAging
+
+# Gravação, leitura com poda de partições e compactação do histórico de snapshots.
+#
+# Gera uma série de exports diários sintéticos (contas resolvidas saem, novas entram), guarda
+# cada um no histórico e mede a leitura do último snapshot inteiro, dos últimos 3 e 12 meses
+# (só as partições desses meses são abertas) e de todos os snapshots de um mês. Mostra também
+# quantos arquivos a compactação automática deixou e o efeito de uma compactação completa,
+# além das matrizes de transição de aging de todos os pares (do zero e com o cache de pares).
+#
+# Uso:
+#   python benchmark_historico.py
+#   python benchmark_historico.py --tamanhos 100k,1M --snapshots 60
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+def executar_tamanho(linhas, quantidade, repeticoes, seed):
+    snapshots = [(data, preparar_dados(df)[0]) for data, df in gerar_snapshots(linhas, quantidade, seed=seed)]
+    ultimo = snapshots[-1][0]
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        historico = HistoricoContas(diretorio)
+        inicio = time.perf_counter()
+        for data, df in snapshots:
+            historico.guardar(df, data)
+        gravacao = (time.perf_counter() - inicio) / quantidade
+        antes = historico.estatisticas()
+
+        leituras = {
+            "snapshot_inteiro": lambda: historico.ler([ultimo]),
+            "ultimos_12_meses": lambda: historico.ler([ultimo], ultimo - pd.DateOffset(months=12), ultimo),
+            "ultimos_3_meses": lambda: historico.ler([ultimo], ultimo - pd.DateOffset(months=3), ultimo),
+            "todos_snapshots_1_mes": lambda: historico.ler(None, ultimo - pd.DateOffset(months=1), ultimo),
+        }
+        resultados = {"gravacao_por_snapshot_s": gravacao, "arquivos_antes": antes, "leituras": {}}
+        for nome, funcao in leituras.items():
+            segundos, df = medir(funcao, repeticoes)
+            resultados["leituras"][nome] = {"segundos": segundos, "linhas": len(df)}
+
+        transicoes = TransicoesAging(historico)
+        inicio = time.perf_counter()
+        transicoes.obter()
+        resultados["transicoes_s"] = time.perf_counter() - inicio
+        resultados["transicoes_cache_s"] = medir(transicoes.obter, repeticoes)[0]
+
+        inicio = time.perf_counter()
+        historico.compactar(max_arquivos=1)
+        resultados["compactacao_s"] = time.perf_counter() - inicio
+        resultados["arquivos_depois"] = historico.estatisticas()
+        segundos, df = medir(leituras["ultimos_3_meses"], repeticoes)
+        resultados["leituras"]["ultimos_3_meses_compactado"] = {"segundos": segundos, "linhas": len(df)}
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Poda de partições e compactação do histórico de snapshots.")
+    parser.add_argument("--tamanhos", default="100k", help="contas por snapshot, separados por vírgula (ex.: 100k,1M)")
+    parser.add_argument("--snapshots", type=int, default=30, help="quantidade de exports diários")
+    parser.add_argument("--repeticoes", type=int, default=3, help="repetições de cada leitura (vale o menor tempo)")
+    parser.add_argument("--seed", type=int, default=42, help="semente dos dados sintéticos")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    resultados = {}
+    for linhas in [interpretar_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]:
+        print(f"Executando {rotulo_tamanho(linhas)} x {args.snapshots} snapshots...", file=sys.stderr)
+        resultados[rotulo_tamanho(linhas)] = executar_tamanho(linhas, args.snapshots, args.repeticoes, args.seed)
+
+    for tamanho, r in resultados.items():
+        antes, depois = r["arquivos_antes"], r["arquivos_depois"]
+        print(f"\n{tamanho} x {args.snapshots} snapshots: {r['gravacao_por_snapshot_s'] * 1000:.0f} ms por snapshot guardado")
+        print(f"Arquivos: {antes['arquivos']} em {antes['particoes']} partições (até {antes['maior_particao']} por partição, "
+              f"compactação a partir de {max_arquivos_particao + 1}); {depois['arquivos']} após compactar tudo "
+              f"em {r['compactacao_s']:.2f} s ({antes['bytes'] / 1e6:.0f} -> {depois['bytes'] / 1e6:.0f} MB)")
+        print(f"Transições de {args.snapshots - 1} pares: {r['transicoes_s'] * 1000:.0f} ms do zero, "
+              f"{r['transicoes_cache_s'] * 1000:.1f} ms com o cache de pares")
+        print(f"{'leitura':<28}{'tempo (ms)':>12}{'linhas':>12}")
+        for nome, m in r["leituras"].items():
+            print(f"{nome:<28}{m['segundos'] * 1000:>12.1f}{m['linhas']:>12,}".replace(",", "."))
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"snapshots": args.snapshots, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
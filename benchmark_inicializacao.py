@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Tempo de inicialização a frio do app (o que o Streamlit Cloud paga a cada cold start).
+#
+# Cada medida roda em um processo Python novo, sem módulos em cache:
+#   - importacao:<módulo>  tempo de "import <módulo>" isolado
+#   - primeira_pintura     do início do processo até o fim da primeira execução de
+#                          aplicacao.py sem arquivo (título e campo de upload na tela)
+#   - carga_apos_upload    dependências carregadas só quando chega o primeiro arquivo
+#
+# Uso:
+#   python benchmark_inicializacao.py
+#   python benchmark_inicializacao.py --repeticoes 5 --orcamento 3 --falhar-acima-do-orcamento
+
+diretorio = os.path.dirname(os.path.abspath(__file__))
+
+modulos_medidos = ["streamlit", "pandas", "plotly.express", "openpyxl"]
+
+# Módulos que aplicacao.py só importa depois do upload
+modulos_apos_upload = [
+    "pandas", "plotly.graph_objects", "plotly.express", "analises", "precomputacao",
+    "indice_datas", "rollup", "previsao", "aging", "ingestao", "exportacao",
+    "memo_recortes", "cache_figuras", "graficos", "memoria_sessoes", "historico", "transicoes"
+]
+
+# Orçamento (em segundos) para a primeira pintura em um cold start
+orcamento_padrao = 2.0
+
+codigo_importacao = """
+import time
+inicio = time.perf_counter()
+import {modulo}
+print(time.perf_counter() - inicio)
+"""
+
+codigo_primeira_pintura = """
+import time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({caminho!r}, default_timeout=120)
+app.run()
+assert not app.exception, [e.value for e in app.exception]
+print(time.perf_counter() - inicio)
+"""
+
+def executar(codigo):
+    saida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=diretorio, capture_output=True, text=True, check=True
+    )
+    return float(saida.stdout.strip().splitlines()[-1])
+
+def medir(codigo, repeticoes):
+    tempos = [executar(codigo) for _ in range(repeticoes)]
+    return {"mediana": statistics.median(tempos), "minimo": min(tempos)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização a frio do dashboard.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="processos por medida (usa a mediana)")
+    parser.add_argument("--orcamento", type=float, default=orcamento_padrao, help="orçamento da primeira pintura, em segundos")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    parser.add_argument("--falhar-acima-do-orcamento", action="store_true", help="retorna código 1 se o orçamento for excedido")
+    args = parser.parse_args()
+
+    resultados = {}
+    for modulo in modulos_medidos:
+        print(f"Medindo import {modulo}...", file=sys.stderr)
+        resultados[f"importacao:{modulo}"] = medir(codigo_importacao.format(modulo=modulo), args.repeticoes)
+
+    print("Medindo primeira pintura...", file=sys.stderr)
+    resultados["primeira_pintura"] = medir(
+        codigo_primeira_pintura.format(caminho=os.path.join(diretorio, "aplicacao.py")), args.repeticoes
+    )
+
+    print("Medindo carga após upload...", file=sys.stderr)
+    resultados["carga_apos_upload"] = medir(
+        codigo_importacao.format(modulo=", ".join(modulos_apos_upload)), args.repeticoes
+    )
+
+    print(f"{'medida':<28}{'mediana (s)':>14}{'mínimo (s)':>14}")
+    for nome, tempos in resultados.items():
+        print(f"{nome:<28}{tempos['mediana']:>14.3f}{tempos['minimo']:>14.3f}")
+
+    primeira_pintura = resultados["primeira_pintura"]["mediana"]
+    dentro = primeira_pintura <= args.orcamento
+    print(f"\nPrimeira pintura: {primeira_pintura:.2f} s (orçamento {args.orcamento:.2f} s) — {'OK' if dentro else 'ACIMA DO ORÇAMENTO'}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"orcamento": args.orcamento, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+
+    if not dentro and args.falhar_acima_do_orcamento:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
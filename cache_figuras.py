@@ -0,0 +1,81 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+
+# Cache das figuras Plotly já montadas, compartilhado pelas sessões.
+#
+# A cada rerun o app refazia a agregação e o px.* de cada gráfico, mesmo sem nada ter mudado
+# nos dados ou nos filtros que o alimentam. Aqui cada figura fica guardada pela visão, pela
+# impressão digital dos dados (conteúdo do arquivo, abas e regra de duplicatas, não o id do
+# upload) e pelo estado de filtros; duas sessões com o mesmo arquivo e os mesmos filtros
+# usam a mesma figura. O limite é o tamanho somado das especificações em JSON, que é o que
+# vai para o navegador: gráficos com todos os pontos (boxplot, histograma) pesam bem mais
+# que os de barras.
+#
+# O Streamlit ainda converte a figura em JSON ao exibi-la (to_dict e orjson, alguns ms por
+# figura); o que o cache evita é a agregação e a montagem da figura, que levam de dezenas a
+# centenas de ms. As figuras guardadas não devem ser alteradas depois de obtidas.
+
+# Tamanho máximo somado das especificações guardadas, em bytes
+orcamento_figuras_padrao = 64 * 1024 ** 2
+
+# Conteúdo do arquivo enviado, lido em blocos (o mesmo arquivo em outro upload tem a mesma
+# impressão digital)
+def impressao_arquivo(arquivo, tamanho_bloco=1024 ** 2):
+    resumo = hashlib.blake2b(digest_size=16)
+    arquivo.seek(0)
+    for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+        resumo.update(bloco)
+    arquivo.seek(0)
+    return resumo.hexdigest()
+
+class CacheFiguras:
+    # LRU de figuras por (visão, estado), limitado pelo tamanho das especificações
+
+    def __init__(self, orcamento=orcamento_figuras_padrao):
+        self.orcamento = orcamento
+        self.figuras = OrderedDict()
+        self.tamanhos = {}
+        self.lock = threading.Lock()
+        self.acertos = {}
+        self.faltas = {}
+        self.descartes = 0
+
+    # Figura da visão no estado indicado (impressão digital dos dados, filtros e parâmetros
+    # da própria visão); construir só é chamado na falta
+    def obter(self, visao, estado, construir):
+        chave = (visao, estado)
+        with self.lock:
+            figura = self.figuras.get(chave)
+            contagem = self.faltas if figura is None else self.acertos
+            contagem[visao] = contagem.get(visao, 0) + 1
+            if figura is not None:
+                self.figuras.move_to_end(chave)
+                return figura
+
+        figura = construir()
+        tamanho = len(pio.to_json(figura, validate=False))
+        with self.lock:
+            self.figuras[chave] = figura
+            self.tamanhos[chave] = tamanho
+            self.figuras.move_to_end(chave)
+            while len(self.figuras) > 1 and sum(self.tamanhos.values()) > self.orcamento:
+                antiga, _ = self.figuras.popitem(last=False)
+                del self.tamanhos[antiga]
+                self.descartes += 1
+        return figura
+
+    def estatisticas(self):
+        with self.lock:
+            visoes = list(dict.fromkeys([*self.faltas, *self.acertos]))
+            return {
+                "figuras": len(self.figuras),
+                "memoria": sum(self.tamanhos.values()),
+                "orcamento": self.orcamento,
+                "descartes": self.descartes,
+                "visoes": {
+                    visao: {"acertos": self.acertos.get(visao, 0), "faltas": self.faltas.get(visao, 0)}
+                    for visao in visoes
+                },
+            }
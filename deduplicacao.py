@@ -0,0 +1,127 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Remoção de linhas repetidas da mesma conta e índice de contas por hash.
+#
+# O export do ERP repete a linha de uma Conta/Atendimento quando ela passa por mais de um
+# setor, o que infla "Valor conta" em todos os KPIs. Cada linha recebe um hash de 64 bits
+# das chaves; as linhas são ordenadas por (hash, critério da regra) e, em cada grupo de
+# chaves iguais, fica só a última. Tudo é feito com operações vetorizadas sobre arrays.
+
+chaves_conta = ["Conta", "Atendimento"]
+
+# Regras de desempate entre linhas da mesma conta: coluna ordenada e rótulo para o app.
+# A linha mantida é a de maior valor na coluna (a mais recente, a de maior valor) ou, com
+# coluna None, a última do arquivo.
+regras_deduplicacao = {
+    "mais_recente": ("Data entrada", "Manter a mais recente (Data entrada)"),
+    "maior_valor": ("Valor conta", "Manter a de maior valor"),
+    "ultima_do_arquivo": (None, "Manter a última do arquivo"),
+}
+regra_padrao = "mais_recente"
+
+def hash_chaves(df):
+    return pd.util.hash_pandas_object(df[chaves_conta], index=False).to_numpy()
+
+# Remove as repetições de Conta/Atendimento conforme a regra e devolve o DataFrame sem
+# duplicatas (o mesmo objeto, se não houver nenhuma) e um relatório da remoção
+def deduplicar(df, regra=regra_padrao):
+    inicio = time.perf_counter()
+    relatorio = {"regra": regra, "linhas_removidas": 0, "contas_repetidas": 0, "valor_removido": 0.0}
+
+    if not all(coluna in df.columns for coluna in chaves_conta) or df.empty:
+        relatorio["segundos"] = time.perf_counter() - inicio
+        return df, relatorio
+
+    hashes = hash_chaves(df)
+    coluna = regras_deduplicacao[regra][0]
+
+    # Ordem por hash e, dentro do hash, pelo critério da regra (NaN/NaT primeiro, para
+    # perder o desempate); a posição original desempata, então a última linha vence
+    posicoes = np.arange(len(df))
+    if coluna is None:
+        ordem = np.lexsort((posicoes, hashes))
+    else:
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            criterio = serie.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+            criterio[serie.isna().to_numpy()] = -np.inf
+        else:
+            criterio = np.nan_to_num(pd.to_numeric(serie, errors="coerce").to_numpy(dtype=float, na_value=np.nan), nan=-np.inf)
+        ordem = np.lexsort((posicoes, criterio, hashes))
+
+    # Uma linha é repetida quando a próxima (na ordem) tem o mesmo hash e as mesmas chaves;
+    # a comparação das chaves descarta colisões de hash
+    hashes_ordenados = hashes[ordem]
+    repetida = hashes_ordenados[:-1] == hashes_ordenados[1:]
+    for chave in chaves_conta:
+        valores = df[chave].to_numpy()[ordem]
+        repetida &= valores[:-1] == valores[1:]
+
+    if repetida.any():
+        remover = np.zeros(len(df), dtype=bool)
+        remover[ordem[:-1][repetida]] = True
+        removidas = df[remover]
+        relatorio.update(
+            linhas_removidas=int(remover.sum()),
+            contas_repetidas=int(np.unique(hashes[remover]).size),
+            valor_removido=float(removidas["Valor conta"].sum()) if "Valor conta" in df.columns else 0.0,
+        )
+        df = df[~remover].reset_index(drop=True)
+
+    relatorio["segundos"] = time.perf_counter() - inicio
+    return df, relatorio
+
+class IndiceContas:
+    # Localização de contas em O(1) pelas chaves (Conta, Atendimento) ou só pela Conta.
+    # Os índices do pandas guardam uma tabela hash; ambos são montados na primeira consulta.
+
+    def __init__(self, df):
+        self.df = df
+        self._por_chaves = None
+        self._por_conta = None
+
+    @property
+    def por_chaves(self):
+        if self._por_chaves is None:
+            self._por_chaves = pd.MultiIndex.from_arrays([self.df[chave].to_numpy() for chave in chaves_conta])
+        return self._por_chaves
+
+    @property
+    def por_conta(self):
+        if self._por_conta is None:
+            self._por_conta = pd.Index(self.df["Conta"].to_numpy())
+        return self._por_conta
+
+    def linhas(self, indice, chave):
+        try:
+            posicoes = indice.get_loc(chave)
+        except (KeyError, TypeError):
+            return self.df.iloc[0:0]
+        if isinstance(posicoes, (int, np.integer)):
+            return self.df.iloc[[posicoes]]
+        return self.df.iloc[posicoes]
+
+    # Linha(s) da conta (Conta, Atendimento); só uma depois de deduplicar
+    def localizar(self, conta, atendimento):
+        return self.linhas(self.por_chaves, (conta, atendimento))
+
+    # Todas as linhas com o número de Conta (uma por atendimento)
+    def buscar_conta(self, conta):
+        return self.linhas(self.por_conta, conta)
+
+    # Número digitado (texto) no tipo da coluna Conta: número nas colunas numéricas e o
+    # próprio texto nas de texto, onde zeros à esquerda fazem parte do número (colunas mistas
+    # podem guardar o mesmo número como inteiro)
+    def buscar_numero(self, texto):
+        if pd.api.types.is_numeric_dtype(self.df["Conta"]):
+            try:
+                numero = float(texto)
+            except ValueError:
+                return self.df.iloc[0:0]
+            return self.buscar_conta(int(numero) if numero.is_integer() else numero)
+        contas = self.buscar_conta(texto)
+        if contas.empty and texto.isdigit():
+            contas = self.buscar_conta(int(texto))
+        return contas
@@ -0,0 +1,70 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from qualidade import descrever_alertas
+
+# Exportação dos dados filtrados em blocos, sem montar o arquivo inteiro de uma vez.
+#
+# O Excel de "Dados Completos" carrega todo o recorte em uma planilha do openpyxl dentro de
+# um BytesIO, o que chega a triplicar a memória. Aqui as linhas são escritas em fatias do
+# DataFrame (sem cópia): CSV no formato brasileiro (";" e vírgula decimal, o mesmo que o
+# gerador de dados e a API leem) ou Parquet com um row group por bloco. A memória de
+# trabalho é a de um bloco, qualquer que seja o tamanho do recorte. A coluna de alertas sai
+# com a descrição de cada alerta, não com o byte.
+
+tamanho_bloco_padrao = 50_000
+
+formatos_exportacao = {
+    "csv": ("CSV (padrão brasileiro)", "text/csv"),
+    "parquet": ("Parquet", "application/octet-stream"),
+}
+
+# Datas já como texto dd/mm/aaaa, formatadas pelo Arrow: o date_format do to_csv chama
+# strftime linha a linha e era metade do tempo da exportação
+def formatar_datas(bloco):
+    colunas_data = [col for col in bloco.columns if pd.api.types.is_datetime64_any_dtype(bloco[col])]
+    if not colunas_data:
+        return bloco
+    return bloco.assign(**{
+        col: pd.array(pc.strftime(pa.array(bloco[col]), format="%d/%m/%Y"), dtype=pd.ArrowDtype(pa.string()))
+        for col in colunas_data
+    })
+
+# Blocos do CSV já codificados; o primeiro leva o BOM e o cabeçalho, para o Excel reconhecer
+# o UTF-8 ao abrir o arquivo
+def blocos_csv(df, tamanho_bloco=tamanho_bloco_padrao):
+    for inicio in range(0, max(len(df), 1), tamanho_bloco):
+        texto = formatar_datas(descrever_alertas(df.iloc[inicio:inicio + tamanho_bloco])).to_csv(
+            sep=";", decimal=",", index=False, header=inicio == 0
+        )
+        yield ("\ufeff" + texto if inicio == 0 else texto).encode("utf-8")
+
+def escrever_csv(df, destino, tamanho_bloco=tamanho_bloco_padrao):
+    for bloco in blocos_csv(df, tamanho_bloco):
+        destino.write(bloco)
+
+# Um row group por bloco; o esquema vem do primeiro bloco e vale para os seguintes. O
+# destino só precisa aceitar write (o rodapé é escrito no fim, sem voltar no arquivo).
+def escrever_parquet(df, destino, tamanho_bloco=tamanho_bloco_padrao):
+    esquema = pa.Schema.from_pandas(descrever_alertas(df.iloc[:tamanho_bloco]), preserve_index=False)
+    with pq.ParquetWriter(pa.PythonFile(destino, mode="w"), esquema) as escritor:
+        for inicio in range(0, len(df), tamanho_bloco):
+            bloco = descrever_alertas(df.iloc[inicio:inicio + tamanho_bloco])
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=esquema, preserve_index=False))
+
+escritores = {
+    "csv": escrever_csv,
+    "parquet": escrever_parquet,
+}
+
+def exportar(df, formato, destino, tamanho_bloco=tamanho_bloco_padrao):
+    escritores[formato](df, destino, tamanho_bloco)
+
+# Arquivo completo em bytes, para o botão de download do Streamlit (que guarda o arquivo
+# pronto em memória para servir o clique)
+def exportar_bytes(df, formato, tamanho_bloco=tamanho_bloco_padrao):
+    destino = io.BytesIO()
+    exportar(df, formato, destino, tamanho_bloco)
+    return destino.getvalue()
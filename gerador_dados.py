@@ -0,0 +1,252 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from analises import colunas_necessarias
+
+# Gerador de planilhas sintéticas de contas pendentes, no mesmo formato do export do ERP.
+# Não contém dados de pacientes: nomes, contas e valores são aleatórios (reprodutíveis pela semente).
+#
+# Uso:
+#   python gerador_dados.py 100k -o contas_100k.xlsx
+#   python gerador_dados.py 10M -o contas_10M.parquet --seed 7
+
+# Limite de linhas por aba do Excel (o formato aceita 1.048.576 incluindo o cabeçalho)
+linhas_por_aba = 1_000_000
+
+convenios_base = [
+    "SUS", "UNIMED", "BRADESCO SAÚDE", "AMIL", "SULAMÉRICA", "CASSI", "GEAP",
+    "PORTO SEGURO", "NOTREDAME INTERMÉDICA", "HAPVIDA", "PARTICULAR", "GOLDEN CROSS",
+    "MEDISERVICE", "CABESP", "POSTAL SAÚDE", "SAÚDE CAIXA", "PETROBRAS DISTRIBUIDORA",
+    "ALLIANZ SAÚDE", "MEDSENIOR", "PREVENT SENIOR"
+]
+
+# Tipo de atendimento: (proporção, valor mediano em R$)
+tipos_atendimento = {
+    "Internação": (0.22, 9500.0),
+    "Ambulatorial": (0.30, 380.0),
+    "Pronto Socorro": (0.25, 650.0),
+    "Externo": (0.12, 240.0),
+    "Oncologia": (0.06, 14000.0),
+    "Hemodiálise": (0.05, 1700.0),
+}
+
+status_contas = {
+    "Pendente": 0.38, "Em auditoria": 0.20, "Em conferência": 0.15,
+    "Aguardando documentação": 0.12, "Reapresentação": 0.08, "Glosa parcial": 0.07
+}
+status_atendimento = {"Alta": 0.78, "Internado": 0.12, "Transferido": 0.05, "Óbito": 0.03, "Em atendimento": 0.02}
+categorias = {"Enfermaria": 0.40, "Apartamento": 0.30, "Ambulatorial": 0.20, "UTI": 0.07, "Day clinic": 0.03}
+estabelecimentos = {"Hospital Central": 0.55, "Unidade Norte": 0.20, "Unidade Sul": 0.15, "Centro Oncológico": 0.10}
+
+setores_faturamento = [
+    "Faturamento", "Auditoria Médica", "Auditoria de Enfermagem", "Contas Médicas",
+    "Central de Guias", "Autorização", "SAME", "Recepção", "Glosas", "Tesouraria",
+    "Comercial", "Controladoria"
+]
+setores_atendimento = [
+    "Pronto Socorro", "Clínica Médica", "Centro Cirúrgico", "UTI Adulto", "Ambulatório",
+    "Diagnóstico por Imagem", "Laboratório", "Oncologia", "Maternidade", "Pediatria",
+    "Hemodinâmica", "UTI Neonatal"
+]
+
+nomes = [
+    "ANA", "BRUNO", "CARLA", "DANIEL", "EDUARDO", "FERNANDA", "GUSTAVO", "HELENA", "IGOR",
+    "JULIANA", "LUCAS", "MARIANA", "NATÁLIA", "OTÁVIO", "PAULA", "RAFAEL", "SÉRGIO",
+    "TATIANA", "VINÍCIUS", "BEATRIZ", "CAMILA", "FELIPE", "LETÍCIA", "RICARDO"
+]
+sobrenomes = [
+    "SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA",
+    "LIMA", "GOMES", "COSTA", "RIBEIRO", "MARTINS", "CARVALHO", "ALMEIDA", "LOPES",
+    "SOARES", "FERNANDES", "VIEIRA", "BARBOSA"
+]
+
+# Converte "10k", "1M", "2.5M" ou "1000" em número de linhas
+def interpretar_tamanho(texto):
+    texto = str(texto).strip().lower().replace("_", "")
+    multiplicadores = {"k": 1_000, "m": 1_000_000}
+    if texto and texto[-1] in multiplicadores:
+        return int(float(texto[:-1]) * multiplicadores[texto[-1]])
+    return int(texto)
+
+# Rótulo curto para um número de linhas (10000 -> "10k")
+def rotulo_tamanho(linhas):
+    if linhas >= 1_000_000 and linhas % 1_000_000 == 0:
+        return f"{linhas // 1_000_000}M"
+    if linhas >= 1_000 and linhas % 1_000 == 0:
+        return f"{linhas // 1_000}k"
+    return str(linhas)
+
+# Pesos de uma distribuição de Zipf: poucas categorias concentram a maior parte das linhas
+def pesos_zipf(n, expoente):
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+def sortear_categoria(rng, categorias_pesos, linhas):
+    rotulos = list(categorias_pesos)
+    pesos = np.array(list(categorias_pesos.values()), dtype=float)
+    codigos = rng.choice(len(rotulos), size=linhas, p=pesos / pesos.sum())
+    return pd.Categorical.from_codes(codigos, categories=rotulos), codigos
+
+def sortear_zipf(rng, rotulos, linhas, expoente):
+    codigos = rng.choice(len(rotulos), size=linhas, p=pesos_zipf(len(rotulos), expoente))
+    return pd.Categorical.from_codes(codigos, categories=rotulos)
+
+def gerar_convenios(n_convenios):
+    extras = [f"CONVÊNIO {i:03d}" for i in range(1, max(0, n_convenios - len(convenios_base)) + 1)]
+    return (convenios_base + extras)[:n_convenios]
+
+def gerar_medicos(rng, n_medicos):
+    crms = rng.choice(np.arange(10_000, 99_999), size=n_medicos, replace=False)
+    primeiros = rng.choice(nomes, size=n_medicos)
+    ultimos = rng.choice(sobrenomes, size=n_medicos)
+    return [f"{p} {u} (CRM {c})" for p, u, c in zip(primeiros, ultimos, crms)]
+
+# Gera um DataFrame com o esquema de colunas_necessarias
+def gerar_contas(linhas, seed=42, data_fim=None, anos=3, n_convenios=40, n_medicos=None, duplicadas=0.0):
+    rng = np.random.default_rng(seed)
+    data_fim = pd.Timestamp(data_fim if data_fim is not None else pd.Timestamp.today()).normalize()
+    if n_medicos is None:
+        n_medicos = int(np.clip(linhas // 40, 50, 3000))
+
+    # Convênios e médicos com distribuição assimétrica (poucos concentram o volume)
+    convenios = gerar_convenios(n_convenios)
+    convenio = sortear_zipf(rng, convenios, linhas, expoente=1.1)
+    medico = sortear_zipf(rng, gerar_medicos(rng, n_medicos), linhas, expoente=0.9)
+
+    tipo, codigos_tipo = sortear_categoria(rng, {t: p for t, (p, _) in tipos_atendimento.items()}, linhas)
+
+    # Valor conta: log-normal em torno do valor típico do tipo de atendimento, com fator por
+    # convênio e cauda longa (Pareto) em ~2% das contas; inclui contas zeradas e estornos
+    medianas = np.array([v for _, v in tipos_atendimento.values()])
+    fator_convenio = rng.lognormal(0.0, 0.35, size=len(convenios))[convenio.codes]
+    valor = medianas[codigos_tipo] * fator_convenio * rng.lognormal(0.0, 0.9, size=linhas)
+    cauda = rng.random(linhas) < 0.02
+    valor[cauda] *= 1.0 + rng.pareto(2.0, size=cauda.sum()) * 3
+    valor[rng.random(linhas) < 0.02] = 0.0
+    negativos = rng.random(linhas) < 0.003
+    valor[negativos] = -valor[negativos] * 0.1
+    valor = np.round(valor, 2)
+
+    # Data entrada: maioria recente (fila em andamento) e uma parcela antiga represada,
+    # com menos entradas nos fins de semana
+    dias_max = int(anos * 365)
+    recentes = rng.random(linhas) < 0.7
+    idade = np.where(recentes, rng.exponential(45.0, size=linhas), rng.uniform(0, dias_max, size=linhas))
+    idade = np.minimum(idade, dias_max).astype(np.int64)
+    data_entrada = data_fim - pd.to_timedelta(idade, unit="D")
+    fim_de_semana = (data_entrada.dayofweek >= 5) & (rng.random(linhas) < 0.6)
+    recuo = data_entrada.dayofweek - 4 + rng.integers(0, 4, size=linhas)
+    data_entrada = data_entrada - pd.to_timedelta(np.where(fim_de_semana, recuo, 0), unit="D")
+
+    # Contas únicas; parte dos atendimentos gera mais de uma conta
+    conta = 1_000_000 + rng.permutation(linhas)
+    atendimento = 5_000_000 + (conta - 1_000_000) * 85 // 100
+
+    status, _ = sortear_categoria(rng, status_contas, linhas)
+    status_atend, _ = sortear_categoria(rng, status_atendimento, linhas)
+    categoria, _ = sortear_categoria(rng, categorias, linhas)
+    estabelecimento, _ = sortear_categoria(rng, estabelecimentos, linhas)
+
+    df = pd.DataFrame({
+        "Status": status,
+        "Tipo atendimento": tipo,
+        "Conta": conta,
+        "Atendimento": atendimento,
+        "Status atendimento": status_atend,
+        "Convênio": convenio,
+        "Categoria": categoria,
+        "Valor conta": valor,
+        "Etapa anterior": sortear_zipf(rng, setores_faturamento, linhas, expoente=0.8),
+        "Último Setor destino": sortear_zipf(rng, setores_faturamento, linhas, expoente=1.0),
+        "Setor atendimento": sortear_zipf(rng, setores_atendimento, linhas, expoente=0.7),
+        "Estabelecimento": estabelecimento,
+        "Data entrada": data_entrada,
+        "Médico executor": medico,
+    })
+
+    # Linhas repetidas da mesma Conta/Atendimento, como no export do ERP quando a conta
+    # passa por outro setor: mesma conta, outro setor de destino e entrada alguns dias depois
+    if duplicadas > 0:
+        repetidas = df.iloc[rng.choice(linhas, size=int(linhas * duplicadas), replace=True)].copy()
+        repetidas["Último Setor destino"] = sortear_zipf(rng, setores_faturamento, len(repetidas), expoente=1.0)
+        repetidas["Data entrada"] = np.minimum(
+            repetidas["Data entrada"] + pd.to_timedelta(rng.integers(1, 15, size=len(repetidas)), unit="D"), data_fim
+        )
+        df = pd.concat([df, repetidas], ignore_index=True).iloc[rng.permutation(linhas + len(repetidas))]
+        df = df.reset_index(drop=True)
+
+    return df[colunas_necessarias]
+
+# Série de exports da mesma fila, um a cada intervalo_dias até data_fim: entre dois exports
+# parte das contas é resolvida (sai da planilha), parte muda de setor e contas novas entram
+# com data de entrada no intervalo, sorteadas do primeiro export (mesmos convênios e médicos)
+def gerar_snapshots(linhas, quantidade, intervalo_dias=1, seed=42, data_fim=None, resolvidas_por_dia=0.02):
+    rng = np.random.default_rng(seed)
+    data_fim = pd.Timestamp(data_fim if data_fim is not None else pd.Timestamp.today()).normalize()
+    datas = [data_fim - pd.Timedelta(days=intervalo_dias * (quantidade - 1 - i)) for i in range(quantidade)]
+
+    base = gerar_contas(linhas, seed=seed, data_fim=datas[0])
+    proxima_conta = int(base["Conta"].max()) + 1
+    taxa = 1 - (1 - resolvidas_por_dia) ** intervalo_dias
+    setores = base["Último Setor destino"].unique()
+
+    df = base
+    snapshots = [(datas[0], df)]
+    for data in datas[1:]:
+        df = df[rng.random(len(df)) >= taxa].copy()
+        mudam = rng.random(len(df)) < taxa
+        df.loc[mudam, "Último Setor destino"] = rng.choice(setores, size=mudam.sum())
+
+        novas = base.iloc[rng.integers(0, len(base), size=int(round(linhas * taxa)))].copy()
+        novas["Conta"] = proxima_conta + np.arange(len(novas))
+        novas["Atendimento"] = 5_000_000 + (novas["Conta"] - 1_000_000) * 85 // 100
+        novas["Data entrada"] = data - pd.to_timedelta(rng.integers(0, intervalo_dias, size=len(novas)), unit="D")
+        proxima_conta += len(novas)
+
+        df = pd.concat([df, novas], ignore_index=True)
+        snapshots.append((data, df))
+    return snapshots
+
+# Salva no formato indicado pela extensão (.xlsx, .csv ou .parquet)
+def salvar_dados(df, caminho):
+    caminho = str(caminho)
+    if caminho.endswith(".xlsx"):
+        # Acima do limite do Excel os dados são divididos em várias abas
+        with pd.ExcelWriter(caminho, engine="openpyxl") as writer:
+            for i, inicio in enumerate(range(0, max(len(df), 1), linhas_por_aba)):
+                nome_aba = "Contas" if i == 0 else f"Contas {i + 1}"
+                df.iloc[inicio:inicio + linhas_por_aba].to_excel(writer, sheet_name=nome_aba, index=False)
+    elif caminho.endswith(".csv"):
+        df.to_csv(caminho, sep=";", decimal=",", index=False, encoding="utf-8-sig", date_format="%d/%m/%Y")
+    elif caminho.endswith(".parquet"):
+        df.to_parquet(caminho, index=False)
+    else:
+        raise ValueError(f"Formato não suportado: {caminho} (use .xlsx, .csv ou .parquet)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera planilhas sintéticas de contas pendentes.")
+    parser.add_argument("linhas", help="número de linhas (ex.: 10k, 100k, 1M, 10M)")
+    parser.add_argument("-o", "--saida", help="arquivo de saída (.xlsx, .csv ou .parquet)")
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador aleatório")
+    parser.add_argument("--data-fim", help="data de entrada mais recente (AAAA-MM-DD); padrão: hoje")
+    parser.add_argument("--anos", type=float, default=3, help="janela de datas de entrada em anos")
+    parser.add_argument("--convenios", type=int, default=40, help="quantidade de convênios")
+    parser.add_argument("--medicos", type=int, help="quantidade de médicos (padrão: proporcional às linhas)")
+    parser.add_argument("--duplicadas", type=float, default=0.0, help="fração de linhas repetidas de Conta/Atendimento")
+    args = parser.parse_args()
+
+    linhas = interpretar_tamanho(args.linhas)
+    saida = args.saida or f"contas_sinteticas_{rotulo_tamanho(linhas)}.xlsx"
+
+    inicio = time.perf_counter()
+    df = gerar_contas(linhas, seed=args.seed, data_fim=args.data_fim, anos=args.anos,
+                      n_convenios=args.convenios, n_medicos=args.medicos, duplicadas=args.duplicadas)
+    gerado = time.perf_counter()
+    salvar_dados(df, saida)
+    fim = time.perf_counter()
+
+    print(f"{linhas:,} linhas geradas em {gerado - inicio:.2f}s e salvas em {saida} ({fim - gerado:.2f}s)".replace(",", "."))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import plotly.graph_objects as go
+import plotly.express as px
+from analises import ordem_aging
+
+# Formato pt-BR para rótulos de valores em R$ nos gráficos de barras
+texttemplate_moeda = '%{y:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+def figura_pizza_convenios(resumo_convenio):
+    # Pegar top 10 convênios por valor
+    top_convenios = resumo_convenio.head(10).reset_index()
+
+    fig_pie = px.pie(
+        top_convenios,
+        values="Total",
+        names="Convênio",
+        hole=0.4,
+        labels={"Total": "Valor Total"}
+    )
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+    return fig_pie
+
+def figura_aging_convenio(aging_convenio):
+    return px.bar(
+        aging_convenio,
+        x="Convênio",
+        y="Valor conta",
+        color="Categoria Aging",
+        text_auto='.2s',
+        category_orders={"Categoria Aging": ordem_aging},
+        labels={"Valor conta": "Valor Total (R$)", "Categoria Aging": "Faixa de Idade"}
+    )
+
+def figura_ticket_convenio(resumo_convenio):
+    df_ticket = resumo_convenio.reset_index()[["Convênio", "Média"]].sort_values(by="Média", ascending=False)
+
+    fig_ticket = px.bar(
+        df_ticket.head(10),
+        x="Convênio",
+        y="Média",
+        text_auto=True,
+        labels={"Média": "Ticket Médio (R$)"}
+    )
+    fig_ticket.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    return fig_ticket
+
+def figura_top_medicos(resumo_medico):
+    # Pegar top 10 médicos
+    top_medicos = resumo_medico.head(10).reset_index()
+
+    fig_medicos = px.bar(
+        top_medicos,
+        x="Médico executor",
+        y="Total",
+        text_auto=True,
+        labels={"Total": "Valor Total (R$)", "Médico executor": "Médico"}
+    )
+    fig_medicos.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    fig_medicos.update_layout(xaxis_tickangle=-45)
+    return fig_medicos
+
+def figura_ticket_medicos(resumo_medico):
+    # Pegar top 10 médicos por ticket médio (com pelo menos 5 contas)
+    medicos_ticket = resumo_medico[resumo_medico["Quantidade"] >= 5].sort_values(by="Média", ascending=False).head(10).reset_index()
+
+    fig_ticket_med = px.bar(
+        medicos_ticket,
+        x="Médico executor",
+        y="Média",
+        text_auto=True,
+        labels={"Média": "Ticket Médio (R$)", "Médico executor": "Médico"}
+    )
+    fig_ticket_med.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    fig_ticket_med.update_layout(xaxis_tickangle=-45)
+    return fig_ticket_med
+
+def figura_heatmap_medico_convenio(pivot_med_conv):
+    fig_heatmap = px.imshow(
+        pivot_med_conv,
+        labels=dict(x="Convênio", y="Médico executor", color="Valor Total"),
+        text_auto=True  # ou text_auto='.2s' para formato numérico simples
+    )
+    fig_heatmap.update_layout(height=400)
+    return fig_heatmap
+
+def figura_sankey(fluxo):
+    return go.Figure(go.Sankey(
+        node=dict(label=fluxo["labels"], pad=15, thickness=20),
+        link=dict(
+            source=fluxo["source"],
+            target=fluxo["target"],
+            value=fluxo["value"]
+        )
+    ))
+
+# Gráfico de Pareto dos setores com contas > 90 dias (gargalos já ordenados por quantidade)
+def figura_pareto(gargalos):
+    fig_pareto = go.Figure()
+
+    # Adicionar barras
+    fig_pareto.add_trace(go.Bar(
+        x=gargalos["Último Setor destino"].head(10),
+        y=gargalos["Quantidade"].head(10),
+        name="Quantidade",
+        text=gargalos["Quantidade"].head(10),
+        textposition="outside"
+    ))
+
+    # Adicionar linha de percentual acumulado
+    fig_pareto.add_trace(go.Scatter(
+        x=gargalos["Último Setor destino"].head(10),
+        y=gargalos["Percentual Acumulado"].head(10),
+        name="% Acumulado",
+        mode="lines+markers",
+        yaxis="y2",
+        line=dict(color="red"),
+        marker=dict(size=8)
+    ))
+
+    # Configurar layout
+    fig_pareto.update_layout(
+        xaxis=dict(title="Setor"),
+        yaxis=dict(title="Quantidade de Contas", side="left"),
+        yaxis2=dict(
+            title="Percentual Acumulado (%)",
+            side="right",
+            overlaying="y",
+            range=[0, 100],
+            showgrid=False,
+            ticksuffix="%"
+        ),
+        legend=dict(x=0.01, y=0.99),
+        barmode="group"
+    )
+    return fig_pareto
+
+def figura_aging(aging_df):
+    fig_aging = px.bar(
+        aging_df,
+        x="Categoria Aging",
+        y="Valor conta",
+        color="Categoria Aging",
+        text_auto=True,
+        category_orders={"Categoria Aging": ordem_aging},
+        labels={"Valor conta": "Valor Total (R$)", "Categoria Aging": "Faixa de Idade"}
+    )
+    fig_aging.update_layout(xaxis_title="Faixa de Idade", yaxis_title="Valor Total (R$)")
+    fig_aging.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    return fig_aging
+
+# Faixas de aging em cada fim de mês (historico_mensal do motor de aging)
+def figura_evolucao_aging(historico_aging):
+    return px.bar(
+        historico_aging.reset_index().melt(
+            id_vars="Data referência", var_name="Categoria Aging", value_name="Valor conta"
+        ),
+        x="Data referência",
+        y="Valor conta",
+        color="Categoria Aging",
+        category_orders={"Categoria Aging": ordem_aging},
+        labels={"Valor conta": "Valor Total (R$)", "Data referência": "Data de Referência", "Categoria Aging": "Faixa de Idade"}
+    )
+
+# Matriz de transição entre faixas de aging (origem nas linhas, destino nas colunas)
+def figura_matriz_transicao(matriz, rotulo_cor):
+    fig_matriz = px.imshow(
+        matriz,
+        labels=dict(x="Faixa no snapshot seguinte", y="Faixa no snapshot anterior", color=rotulo_cor),
+        text_auto=".1f" if rotulo_cor.startswith("%") else ".3s",
+        color_continuous_scale="Blues",
+        aspect="auto"
+    )
+    fig_matriz.update_layout(height=450)
+    return fig_matriz
+
+# Taxas de rolagem para a faixa seguinte e de resolução em cada par de snapshots
+def figura_taxas_rolagem(taxas):
+    return px.line(
+        taxas.reset_index().melt(id_vars="Para", var_name="Transição", value_name="Taxa"),
+        x="Para",
+        y="Taxa",
+        color="Transição",
+        labels={"Para": "Snapshot", "Taxa": "% da faixa de origem"}
+    )
+
+def figura_setores(resumo_etapa):
+    # Pegar top 10 setores
+    top_setores = resumo_etapa.head(10).reset_index()
+
+    fig_setores = px.bar(
+        top_setores,
+        x="Último Setor destino",
+        y="Total",
+        text_auto=True,
+        labels={"Total": "Valor Total (R$)", "Último Setor destino": "Setor"}
+    )
+    fig_setores.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    fig_setores.update_layout(xaxis_tickangle=-45)
+    return fig_setores
+
+# Top 10 setores por tempo médio (rótulo do eixo conforme a aba)
+def figura_tempo_setor(tempo_medio_setor, rotulo_dias="Tempo Médio (dias)"):
+    fig_tempo = px.bar(
+        tempo_medio_setor.head(10).reset_index(),
+        x="Último Setor destino",
+        y="Dias Pendentes",
+        text_auto=True,
+        labels={"Dias Pendentes": rotulo_dias, "Último Setor destino": "Setor"}
+    )
+    fig_tempo.update_traces(texttemplate='%{y:.1f}', textposition='outside')
+    fig_tempo.update_layout(xaxis_tickangle=-45)
+    return fig_tempo
+
+# Quantidade e valor por mês, com dois eixos Y
+def figura_tendencia_mensal(tendencia_mensal):
+    fig_tendencia = go.Figure()
+
+    # Adicionar linha para quantidade
+    fig_tendencia.add_trace(go.Scatter(
+        x=tendencia_mensal["Mês"],
+        y=tendencia_mensal["Quantidade"],
+        name="Quantidade de Contas",
+        mode="lines+markers",
+        yaxis="y"
+    ))
+
+    # Adicionar linha para valor
+    fig_tendencia.add_trace(go.Scatter(
+        x=tendencia_mensal["Mês"],
+        y=tendencia_mensal["Valor_Total"],
+        name="Valor Total (R$)",
+        mode="lines+markers",
+        yaxis="y2"
+    ))
+
+    # Configurar layout com dois eixos Y
+    fig_tendencia.update_layout(
+        title="Tendência de Contas e Valores",
+        xaxis=dict(title="Mês"),
+        yaxis=dict(title="Quantidade de Contas", side="left"),
+        yaxis2=dict(
+            title="Valor Total (R$)",
+            side="right",
+            overlaying="y",
+            showgrid=False
+        ),
+        legend=dict(x=0.01, y=0.99)
+    )
+    return fig_tendencia
+
+# Boxplot dos valores dos convênios escolhidos, com todos os pontos
+def figura_boxplot_convenios(df, convenios):
+    return px.box(
+        df[df["Convênio"].isin(convenios)],
+        x="Convênio",
+        y="Valor conta",
+        points="all",
+        labels={"Valor conta": "Valor da Conta (R$)", "Convênio": "Convênio"}
+    )
+
+def figura_treemap_convenios(df):
+    df_treemap = df.groupby("Convênio")["Valor conta"].sum().reset_index()
+    df_treemap = df_treemap.sort_values(by="Valor conta", ascending=False)
+
+    fig_tree = px.treemap(
+        df_treemap,
+        path=["Convênio"],
+        values="Valor conta",
+        color="Valor conta",
+        color_continuous_scale="Viridis",
+        labels={"Valor conta": "Valor Total (R$)"}
+    )
+
+    # Substituindo hoverinfo por hovertemplate, que é o correto para treemaps
+    fig_tree.update_traces(
+        hovertemplate='<b>%{label}</b><br>Valor: R$ %{value:,.2f}<br>Percentual: %{percentRoot:.1%}<extra></extra>'
+    )
+
+    # Melhorando o layout do gráfico
+    fig_tree.update_layout(
+        margin=dict(t=30, l=10, r=10, b=10),
+        coloraxis_showscale=True
+    )
+    return fig_tree
+
+def figura_histograma_valores(df):
+    return px.histogram(
+        df,
+        x="Valor conta",
+        nbins=50,
+        marginal="box",
+        labels={"Valor conta": "Valor da Conta (R$)", "count": "Frequência"}
+    )
+
+# Mapa de calor mês x dia da semana, com os valores em R$ anotados em cada célula positiva
+def figura_calendario(pivot_calendar):
+    fig_calendar = px.imshow(
+        pivot_calendar,
+        labels=dict(x="Mês", y="Dia da Semana", color="Valor Total"),
+        aspect="auto",
+        text_auto=False,  # Desabilitar formatação automática
+    )
+
+    # Adicionar anotações formatadas manualmente
+    valores = pivot_calendar.to_numpy()
+    maximo = valores.max()
+    for i in range(valores.shape[0]):
+        for j in range(valores.shape[1]):
+            if valores[i, j] > 0:  # Só adicionar texto para valores positivos
+                fig_calendar.add_annotation(
+                    x=j,
+                    y=i,
+                    text=f"R$ {valores[i, j]:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+                    showarrow=False,
+                    font=dict(color="white" if valores[i, j] > maximo / 2 else "black")
+                )
+
+    fig_calendar.update_layout(height=400)
+    return fig_calendar
+
+# Valor por mês com a média móvel de 3 meses (quando houver meses suficientes)
+def figura_tendencia_valor(tendencia_valor):
+    fig_trend = px.line(
+        tendencia_valor,
+        x="AnoMes",
+        y="Valor conta",
+        markers=True,
+        labels={"Valor conta": "Valor Total (R$)", "AnoMes": "Mês"}
+    )
+
+    if len(tendencia_valor) >= 3:
+        fig_trend.add_scatter(
+            x=tendencia_valor["AnoMes"],
+            y=tendencia_valor["Media_Movel"],
+            mode="lines",
+            name="Média Móvel (3 meses)",
+            line=dict(color="red", dash="dash")
+        )
+    return fig_trend
+
+def figura_projecao(serie_projecao):
+    return px.line(
+        serie_projecao,
+        x="AnoMes",
+        y="Valor conta",
+        color="Tipo",
+        markers=True,
+        labels={"Valor conta": "Valor Total (R$)", "AnoMes": "Mês", "Tipo": ""}
+    )
+
+def figura_dia_semana_quantidade(dia_semana_agg):
+    return px.bar(
+        dia_semana_agg,
+        x="Dia da Semana",
+        y="Quantidade",
+        text_auto=True,
+        labels={"Quantidade": "Quantidade de Contas", "Dia da Semana": "Dia da Semana"}
+    )
+
+def figura_dia_semana_valor(dia_semana_agg):
+    fig_dia_valor = px.bar(
+        dia_semana_agg,
+        x="Dia da Semana",
+        y="Valor_Total",
+        text_auto=True,
+        labels={"Valor_Total": "Valor Total (R$)", "Dia da Semana": "Dia da Semana"}
+    )
+    fig_dia_valor.update_traces(texttemplate=texttemplate_moeda, textposition='outside')
+    return fig_dia_valor
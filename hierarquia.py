@@ -0,0 +1,110 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Explorador da hierarquia Estabelecimento → Convênio → Setor → Médico → Conta.
+#
+# As contas são ordenadas uma vez pelos códigos dos cinco níveis; com isso os grupos de
+# qualquer nível, e os filhos de qualquer nó, ficam contíguos. Os subtotais de cada nível
+# saem de somas acumuladas nas fronteiras dos grupos e ficam guardados, e abrir um nó é
+# uma busca binária e uma fatia da tabela do nível seguinte, sem reagrupar os dados.
+
+niveis_hierarquia = ["Estabelecimento", "Convênio", "Último Setor destino", "Médico executor", "Conta"]
+
+# Rótulo dos nós sem valor no nível (Estabelecimento em branco, por exemplo)
+rotulo_vazio = "(não informado)"
+
+class ExploradorHierarquia:
+
+    # A idade média dos nós é contada até a data de referência do aging (hoje, por padrão)
+    def __init__(self, df, niveis=niveis_hierarquia, data_referencia=None):
+        inicio = time.perf_counter()
+        self.niveis = [nivel for nivel in niveis if nivel in df.columns]
+        self.tempos = {}
+        self._subtotais = {}
+
+        # Códigos ordenados de cada nível (valores ausentes viram um grupo próprio, ao final)
+        codigos, self.rotulos = [], []
+        for nivel in self.niveis:
+            c, r = pd.factorize(df[nivel], sort=True, use_na_sentinel=False)
+            r = pd.Index(r)
+            codigos.append(c)
+            self.rotulos.append(r.astype(object).fillna(rotulo_vazio) if r.hasnans else r)
+
+        ordem = np.lexsort(codigos[::-1])
+        self.codigos = [c[ordem] for c in codigos]
+        self.n = len(ordem)
+
+        valores = np.nan_to_num(df["Valor conta"].to_numpy(dtype=float, na_value=np.nan)[ordem])
+        self.valor_acumulado = np.concatenate(([0.0], np.cumsum(valores)))
+        if "Data entrada" in df.columns:
+            hoje = pd.Timestamp(data_referencia).normalize() if data_referencia is not None else pd.Timestamp.today().normalize()
+            dias = (hoje - df["Data entrada"].dt.normalize()).dt.days.to_numpy(dtype=float, na_value=np.nan)[ordem]
+            # Só as contas que já tinham entrado na data de referência entram na média
+            entradas = dias >= 0
+            self.dias_acumulados = np.concatenate(([0.0], np.cumsum(np.where(entradas, dias, 0.0))))
+            self.entradas_acumuladas = np.concatenate(([0], np.cumsum(entradas)))
+        else:
+            self.dias_acumulados = None
+
+        # Início de grupo em cada nível: a linha difere da anterior em algum nível até ele
+        self.inicios = []
+        mudou = np.zeros(self.n, dtype=bool)
+        mudou[:1] = True
+        for c in self.codigos:
+            mudou[1:] |= c[1:] != c[:-1]
+            self.inicios.append(np.flatnonzero(mudou))
+
+        # Para cada grupo, o índice do grupo pai no nível anterior
+        self.pais = [np.zeros(len(self.inicios[0]), dtype=np.int64)] + [
+            np.searchsorted(self.inicios[i - 1], self.inicios[i], side="right") - 1
+            for i in range(1, len(self.niveis))
+        ]
+        self.tempos["ordenacao"] = time.perf_counter() - inicio
+
+    # Subtotais de todos os nós de um nível, calculados uma vez e guardados
+    def subtotais(self, nivel):
+        if nivel not in self._subtotais:
+            inicio = time.perf_counter()
+            inicios = self.inicios[nivel]
+            fins = np.append(inicios[1:], self.n)
+            quantidade = fins - inicios
+            total = self.valor_acumulado[fins] - self.valor_acumulado[inicios]
+
+            # % do total do nó pai (no primeiro nível, do total geral)
+            if nivel == 0:
+                total_pai = np.full(len(inicios), self.valor_acumulado[-1])
+            else:
+                total_pai = self.subtotais(nivel - 1)["Total"].to_numpy()[self.pais[nivel]]
+
+            tabela = pd.DataFrame(
+                {"Quantidade": quantidade, "Total": total, "Média": total / quantidade},
+                index=self.rotulos[nivel].take(self.codigos[nivel][inicios]).rename(self.niveis[nivel])
+            )
+            with np.errstate(divide="ignore", invalid="ignore"):
+                tabela["% do Total"] = np.where(total_pai != 0, total / total_pai * 100, 0.0)
+            if self.dias_acumulados is not None:
+                entradas = self.entradas_acumuladas[fins] - self.entradas_acumuladas[inicios]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    tabela["Idade Média (dias)"] = (self.dias_acumulados[fins] - self.dias_acumulados[inicios]) / entradas
+
+            self._subtotais[nivel] = tabela
+            self.tempos[f"nível {self.niveis[nivel]}"] = time.perf_counter() - inicio
+        return self._subtotais[nivel]
+
+    # Filhos do nó indicado pelo caminho de rótulos (vazio = primeiro nível), do maior
+    # total para o menor. Caminho inexistente devolve uma tabela vazia.
+    def filhos(self, caminho=()):
+        nivel = len(caminho)
+        lo, hi = 0, len(self.inicios[0])
+        for i, rotulo in enumerate(caminho):
+            try:
+                codigo = self.rotulos[i].get_loc(rotulo)
+            except (KeyError, TypeError):
+                return self.subtotais(nivel).iloc[0:0]
+            posicao = lo + np.searchsorted(self.codigos[i][self.inicios[i][lo:hi]], codigo)
+            if posicao >= hi or self.codigos[i][self.inicios[i][posicao]] != codigo:
+                return self.subtotais(nivel).iloc[0:0]
+            lo = np.searchsorted(self.pais[i + 1], posicao, side="left")
+            hi = np.searchsorted(self.pais[i + 1], posicao, side="right")
+        return self.subtotais(nivel).iloc[lo:hi].sort_values("Total", ascending=False)
@@ -0,0 +1,323 @@
+import argparse
+import functools
+import json
+import operator
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from analises import colunas_necessarias, coluna_origem
+from qualidade import coluna_alertas, bits_leitura
+
+# Histórico dos exports de contas pendentes, particionado por mês de entrada.
+#
+# Cada planilha guardada vira um snapshot, identificado pela data do export (coluna "Data
+# snapshot"). As linhas são gravadas em Parquet, em partições no estilo Hive por AnoMes da
+# Data entrada (AnoMes=2025-01/) e, se o histórico for criado assim, também por
+# Estabelecimento (AnoMes=2025-01/Estabelecimento=.../). Uma leitura com intervalo de datas
+# só abre as pastas dos meses que se sobrepõem a ele: o pyarrow.dataset descarta as outras
+# pelo caminho, sem abrir os arquivos. Dentro de cada arquivo, as estatísticas dos row
+# groups pulam os snapshots que não foram pedidos.
+#
+# O manifesto (_historico.json) guarda o esquema de partições e o resumo de cada snapshot
+# (linhas, valor, primeira e última data de entrada), para a barra lateral montar o filtro
+# de datas sem ler dados. Cada snapshot acrescenta um arquivo por partição; com exports
+# diários seriam centenas de arquivos pequenos por mês. A compactação junta os arquivos de
+# uma partição em um só, ordenado por snapshot e data de entrada, quando passam de
+# max_arquivos_particao.
+#
+# Cada linha leva também os alertas da leitura (sem alta, valor ou data que não puderam ser
+# lidos), que só o arquivo bruto mostra e que preparar_dados recupera na volta; os alertas dos
+# valores são refeitos por validar_contas.
+#
+# Uso:
+#   python historico.py guardar contas_2025-06-30.xlsx --data 2025-06-30
+#   python historico.py listar
+#   python historico.py compactar --max-arquivos 8
+
+# Pasta do histórico (configurável pela variável de ambiente DATACOPILOT_HISTORICO); por
+# padrão ao lado deste arquivo, qualquer que seja a pasta de onde o app ou a CLI rodam
+diretorio_historico_padrao = os.environ.get(
+    "DATACOPILOT_HISTORICO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico")
+)
+
+# Arquivos por partição a partir dos quais a partição é compactada
+max_arquivos_particao = 16
+
+# Linhas por row group: grupos menores deixam a leitura de um snapshot pular mais dados
+linhas_por_grupo = 128_000
+
+# O prefixo "_" faz o pyarrow.dataset ignorar o manifesto ao listar os arquivos de dados
+arquivo_manifesto = "_historico.json"
+
+coluna_snapshot = "Data snapshot"
+
+# Partição das contas sem data de entrada válida (fica depois de qualquer "AAAA-MM" na
+# comparação de texto, então nunca entra em um filtro de datas)
+particao_sem_data = "sem data"
+
+def rotulo_snapshot(data):
+    return pd.Timestamp(data).strftime("%Y-%m-%d")
+
+class HistoricoContas:
+    # Snapshots guardados em uma pasta; as operações de uma instância são serializadas pelo
+    # lock (o app divide uma instância entre as sessões)
+
+    def __init__(self, diretorio=diretorio_historico_padrao, por_estabelecimento=False):
+        self.diretorio = diretorio
+        self.lock = threading.RLock()
+        manifesto = self._ler_manifesto()
+        # O esquema de partições de um histórico existente prevalece sobre o argumento
+        self.particoes = manifesto["particoes"] if manifesto else (
+            ["AnoMes", "Estabelecimento"] if por_estabelecimento else ["AnoMes"]
+        )
+        self.particionamento = ds.partitioning(
+            pa.schema([(nome, pa.string()) for nome in self.particoes]), flavor="hive"
+        )
+
+    def _ler_manifesto(self):
+        try:
+            with open(os.path.join(self.diretorio, arquivo_manifesto), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # Gravação atômica: o manifesto é escrito ao lado e trocado de uma vez
+    def _gravar_manifesto(self, snapshots):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = os.path.join(self.diretorio, arquivo_manifesto)
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"particoes": self.particoes, "snapshots": snapshots}, f, indent=2, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+    # Resumo dos snapshots guardados, do mais antigo ao mais recente (relido a cada chamada,
+    # para enxergar o que outro processo gravou)
+    def snapshots(self):
+        manifesto = self._ler_manifesto()
+        return dict(sorted(manifesto["snapshots"].items())) if manifesto else {}
+
+    # Arquivos de dados por pasta de partição
+    def _arquivos_por_particao(self):
+        particoes = {}
+        for pasta, _, arquivos in os.walk(self.diretorio):
+            dados = sorted(os.path.join(pasta, a) for a in arquivos if a.endswith(".parquet"))
+            if dados:
+                particoes[pasta] = dados
+        return particoes
+
+    # Guarda o DataFrame já preparado (preparar_dados) como o snapshot da data indicada; um
+    # snapshot que já existia nessa data é substituído
+    def guardar(self, df, data_snapshot):
+        data_snapshot = pd.Timestamp(data_snapshot).normalize()
+        rotulo = rotulo_snapshot(data_snapshot)
+        colunas = [col for col in [*colunas_necessarias, coluna_origem] if col in df.columns]
+        dados = df[colunas]
+        if coluna_alertas in df.columns:
+            dados = dados.assign(**{coluna_alertas: df[coluna_alertas].to_numpy() & np.uint8(bits_leitura)})
+
+        # Colunas mistas (texto e número) vão como texto, e as categóricas sem o dicionário,
+        # para todos os arquivos terem o mesmo tipo em cada coluna
+        mistas = [col for col in dados.columns if pd.api.types.is_object_dtype(dados[col])]
+        if mistas:
+            dados = dados.astype({col: "str" for col in mistas})
+        tabela = pa.Table.from_pandas(dados, preserve_index=False)
+        for indice, campo in enumerate(tabela.schema):
+            if pa.types.is_dictionary(campo.type):
+                tabela = tabela.set_column(indice, campo.name, tabela[indice].cast(campo.type.value_type))
+
+        tabela = tabela.append_column(coluna_snapshot, pa.array(
+            np.full(len(dados), data_snapshot.to_datetime64().astype("datetime64[ms]")), pa.timestamp("ms")
+        ))
+        # Mês formatado pelo Arrow (o strftime do pandas é linha a linha)
+        tabela = tabela.append_column("AnoMes", pc.fill_null(
+            pc.strftime(tabela["Data entrada"], format="%Y-%m"), particao_sem_data
+        ))
+
+        identificador = uuid.uuid4().hex[:12]
+        with self.lock:
+            self._remover_snapshot(data_snapshot)
+            ds.write_dataset(
+                tabela, self.diretorio, format="parquet", partitioning=self.particionamento,
+                basename_template=f"snapshot-{rotulo}-{identificador}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore", max_rows_per_group=linhas_por_grupo
+            )
+
+            datas = dados["Data entrada"].dropna()
+            snapshots = self.snapshots()
+            snapshots[rotulo] = {
+                "id": identificador,
+                "linhas": len(dados),
+                "valor_total": float(pd.to_numeric(dados["Valor conta"], errors="coerce").sum()),
+                "data_min": rotulo_snapshot(datas.min()) if len(datas) else None,
+                "data_max": rotulo_snapshot(datas.max()) if len(datas) else None,
+                "gravado_em": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._gravar_manifesto(snapshots)
+            self.compactar()
+        return snapshots[rotulo]
+
+    # Apaga as linhas de um snapshot: os arquivos só dele saem inteiros (pelo nome), e os
+    # compactados que podem contê-lo (pelas estatísticas) são regravados sem essas linhas
+    def _remover_snapshot(self, data_snapshot):
+        rotulo = rotulo_snapshot(data_snapshot)
+        for pasta, arquivos in self._arquivos_por_particao().items():
+            for caminho in arquivos:
+                nome = os.path.basename(caminho)
+                if nome.startswith(f"snapshot-{rotulo}-"):
+                    os.remove(caminho)
+                elif nome.startswith("compactado-") and self._pode_conter(caminho, data_snapshot):
+                    tabela = pq.ParquetFile(caminho).read()
+                    restante = tabela.filter(pc.not_equal(
+                        tabela[coluna_snapshot], pa.scalar(data_snapshot.to_pydatetime(), pa.timestamp("ms"))
+                    ))
+                    if restante.num_rows:
+                        pq.write_table(
+                            restante, os.path.join(pasta, f"compactado-{uuid.uuid4().hex[:12]}.parquet"),
+                            row_group_size=linhas_por_grupo
+                        )
+                    os.remove(caminho)
+
+    @staticmethod
+    def _pode_conter(caminho, data_snapshot):
+        metadados = pq.read_metadata(caminho)
+        indice = metadados.schema.names.index(coluna_snapshot)
+        for grupo in range(metadados.num_row_groups):
+            estatisticas = metadados.row_group(grupo).column(indice).statistics
+            if estatisticas is None or not estatisticas.has_min_max:
+                return True
+            if estatisticas.min <= data_snapshot.to_pydatetime() <= estatisticas.max:
+                return True
+        return False
+
+    def remover(self, data_snapshot):
+        with self.lock:
+            self._remover_snapshot(pd.Timestamp(data_snapshot).normalize())
+            snapshots = self.snapshots()
+            snapshots.pop(rotulo_snapshot(data_snapshot), None)
+            self._gravar_manifesto(snapshots)
+
+    # Filtro do pyarrow: as condições sobre AnoMes (e Estabelecimento, quando é partição)
+    # descartam pastas inteiras; as demais são avaliadas nas estatísticas e nas linhas
+    def filtro(self, snapshots=None, data_inicio=None, data_fim=None, estabelecimentos=None):
+        condicoes = []
+        if data_inicio is not None:
+            data_inicio = pd.Timestamp(data_inicio)
+            condicoes += [
+                ds.field("AnoMes") >= data_inicio.strftime("%Y-%m"),
+                ds.field("Data entrada") >= data_inicio.to_pydatetime(),
+            ]
+        if data_fim is not None:
+            data_fim = pd.Timestamp(data_fim)
+            condicoes += [
+                ds.field("AnoMes") <= data_fim.strftime("%Y-%m"),
+                ds.field("Data entrada") < (data_fim + pd.Timedelta(days=1)).to_pydatetime(),
+            ]
+        if snapshots is not None:
+            condicoes.append(ds.field(coluna_snapshot).isin(pa.array(
+                [pd.Timestamp(s).to_pydatetime() for s in snapshots], pa.timestamp("ms")
+            )))
+        if estabelecimentos is not None:
+            condicoes.append(ds.field("Estabelecimento").isin(list(estabelecimentos)))
+        return functools.reduce(operator.and_, condicoes) if condicoes else None
+
+    # Linhas dos snapshots pedidos (todos, se None) com entrada no intervalo, com as colunas
+    # na ordem do export e a coluna "Data snapshot"
+    def ler(self, snapshots=None, data_inicio=None, data_fim=None, estabelecimentos=None, colunas=None):
+        with self.lock:
+            if not self._arquivos_por_particao():
+                raise ValueError("O histórico está vazio.")
+            conjunto = ds.dataset(self.diretorio, format="parquet", partitioning=self.particionamento)
+            # Snapshots gravados antes dos alertas não têm a coluna: o esquema a inclui e as
+            # linhas deles voltam sem alertas
+            if coluna_alertas not in conjunto.schema.names:
+                conjunto = ds.dataset(
+                    self.diretorio, format="parquet", partitioning=self.particionamento,
+                    schema=conjunto.schema.append(pa.field(coluna_alertas, pa.uint8()))
+                )
+            nomes = [
+                col for col in [*colunas_necessarias, coluna_origem, coluna_alertas, coluna_snapshot]
+                if col in conjunto.schema.names and (colunas is None or col in colunas)
+            ]
+            tabela = conjunto.to_table(
+                columns=nomes, filter=self.filtro(snapshots, data_inicio, data_fim, estabelecimentos)
+            )
+            if coluna_alertas in nomes:
+                tabela = tabela.set_column(
+                    nomes.index(coluna_alertas), coluna_alertas, pc.fill_null(tabela[coluna_alertas], pa.scalar(0, pa.uint8()))
+                )
+        return tabela.to_pandas()
+
+    # Junta os arquivos das partições que passaram do limite em um arquivo por partição
+    def compactar(self, max_arquivos=max_arquivos_particao):
+        compactadas = 0
+        with self.lock:
+            for pasta, arquivos in self._arquivos_por_particao().items():
+                if len(arquivos) <= max_arquivos:
+                    continue
+                tabela = pa.concat_tables(
+                    [pq.ParquetFile(caminho).read().replace_schema_metadata(None) for caminho in arquivos],
+                    promote_options="default"
+                ).sort_by([(coluna_snapshot, "ascending"), ("Data entrada", "ascending")])
+                pq.write_table(
+                    tabela, os.path.join(pasta, f"compactado-{uuid.uuid4().hex[:12]}.parquet"),
+                    row_group_size=linhas_por_grupo
+                )
+                for caminho in arquivos:
+                    os.remove(caminho)
+                compactadas += 1
+        return compactadas
+
+    def estatisticas(self):
+        with self.lock:
+            particoes = self._arquivos_por_particao()
+        arquivos = [caminho for lista in particoes.values() for caminho in lista]
+        return {
+            "snapshots": len(self.snapshots()),
+            "particoes": len(particoes),
+            "arquivos": len(arquivos),
+            "bytes": sum(os.path.getsize(caminho) for caminho in arquivos),
+            "maior_particao": max((len(lista) for lista in particoes.values()), default=0),
+        }
+
+def main():
+    from ingestao import carregar_arquivo
+
+    parser = argparse.ArgumentParser(description="Histórico particionado dos exports de contas pendentes.")
+    parser.add_argument("--diretorio", default=diretorio_historico_padrao, help="pasta do histórico")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    guardar = comandos.add_parser("guardar", help="guarda uma planilha como snapshot")
+    guardar.add_argument("arquivo", help="planilha .xlsx (ou .parquet/.csv do gerador)")
+    guardar.add_argument("--data", help="data do snapshot (AAAA-MM-DD); padrão: hoje")
+    guardar.add_argument("--por-estabelecimento", action="store_true",
+                         help="particiona também por Estabelecimento (só ao criar o histórico)")
+    comandos.add_parser("listar", help="lista os snapshots guardados")
+    compactar = comandos.add_parser("compactar", help="compacta as partições com arquivos demais")
+    compactar.add_argument("--max-arquivos", type=int, default=max_arquivos_particao,
+                           help="arquivos por partição a partir dos quais ela é compactada")
+    args = parser.parse_args()
+
+    historico = HistoricoContas(args.diretorio, por_estabelecimento=getattr(args, "por_estabelecimento", False))
+    if args.comando == "guardar":
+        resumo = historico.guardar(carregar_arquivo(args.arquivo), args.data or pd.Timestamp.today())
+        print(f"Snapshot {rotulo_snapshot(args.data or pd.Timestamp.today())}: {resumo['linhas']:,} contas guardadas".replace(",", "."))
+    elif args.comando == "listar":
+        for rotulo, resumo in historico.snapshots().items():
+            print(f"{rotulo}  {resumo['linhas']:>10,} contas  entradas de {resumo['data_min']} a {resumo['data_max']}".replace(",", "."))
+    else:
+        print(f"{historico.compactar(args.max_arquivos)} partições compactadas", file=sys.stderr)
+
+    estatisticas = historico.estatisticas()
+    print(
+        f"{estatisticas['snapshots']} snapshots, {estatisticas['particoes']} partições, "
+        f"{estatisticas['arquivos']} arquivos ({estatisticas['bytes'] / 1e6:.1f} MB)", file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
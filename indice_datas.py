@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# Índice de somas acumuladas sobre "Data entrada".
+#
+# As contas são ordenadas por dia de entrada e guardamos, para cada posição, a contagem,
+# o valor e a soma dos dias acumulados (no total e separadamente por convênio). Assim,
+# qualquer intervalo de datas — o filtro da barra lateral ou as faixas de 30/60/90 dias —
+# sai com duas buscas binárias e uma subtração, sem varrer as linhas.
+
+# Colunas que os filtros da barra lateral exigem preenchidas mesmo com "Selecionar todos"
+colunas_filtro = ["Convênio", "Médico executor", "Status", "Último Setor destino"]
+
+menor_dia = np.iinfo(np.int64).min
+maior_dia = np.iinfo(np.int64).max
+
+# Converte uma data (date, datetime, Timestamp ou texto) em dias desde 1970-01-01
+def dia_numero(data):
+    return pd.Timestamp(data).to_datetime64().astype("datetime64[D]").astype(np.int64)
+
+class SerieAcumulada:
+    # Dias ordenados e somas acumuladas (com um zero à frente) de um conjunto de contas
+
+    def __init__(self, dias, valores):
+        ordem = np.argsort(dias, kind="stable")
+        self.dias = dias[ordem]
+        self.valor_acumulado = np.concatenate(([0.0], np.cumsum(valores[ordem])))
+        self.dias_acumulados = np.concatenate(([0], np.cumsum(self.dias)))
+
+    # Contagem, valor e soma de dias das contas com dia em [inicio, fim] (aceita arrays)
+    def somar(self, inicio, fim):
+        lo = np.searchsorted(self.dias, inicio, side="left")
+        hi = np.maximum(np.searchsorted(self.dias, fim, side="right"), lo)
+        return (
+            hi - lo,
+            self.valor_acumulado[hi] - self.valor_acumulado[lo],
+            self.dias_acumulados[hi] - self.dias_acumulados[lo],
+        )
+
+# Dias de entrada e valores das contas indexáveis, com a máscara das linhas usadas.
+# Só entram contas com data válida e com os campos filtráveis preenchidos, para que
+# o índice corresponda exatamente ao recorte com todos os filtros em "todos"
+def dias_e_valores(df):
+    validas = df["Data entrada"].notna()
+    for coluna in colunas_filtro:
+        if coluna in df.columns:
+            validas &= df[coluna].notna()
+    validas = validas.to_numpy()
+
+    dias = df["Data entrada"].to_numpy()[validas].astype("datetime64[D]").astype(np.int64)
+    valores = np.nan_to_num(df["Valor conta"].to_numpy(dtype=float, na_value=np.nan)[validas])
+    return dias, valores, validas
+
+class IndiceDatas:
+
+    def __init__(self, df):
+        dias, valores, validas = dias_e_valores(df)
+
+        self.total = SerieAcumulada(dias, valores)
+
+        # Uma série por convênio
+        codigos, rotulos = pd.factorize(df["Convênio"].to_numpy()[validas])
+        ordem = np.argsort(codigos, kind="stable")
+        limites = np.searchsorted(codigos[ordem], np.arange(len(rotulos) + 1))
+        self.por_convenio = {
+            rotulo: SerieAcumulada(dias[ordem[limites[i]:limites[i + 1]]], valores[ordem[limites[i]:limites[i + 1]]])
+            for i, rotulo in enumerate(rotulos)
+        }
+
+    def series(self, convenios=None):
+        if convenios is None:
+            return [self.total]
+        return [self.por_convenio[c] for c in set(convenios) if c in self.por_convenio]
+
+    # Soma contagem, valor e dias das séries selecionadas em um ou vários intervalos de dias
+    def somar(self, inicio, fim, convenios=None):
+        contagem, valor, soma_dias = 0, 0.0, 0
+        for serie in self.series(convenios):
+            c, v, d = serie.somar(inicio, fim)
+            contagem, valor, soma_dias = contagem + c, valor + v, soma_dias + d
+        return contagem, valor, soma_dias
+
+    # Mesmo dicionário de calcular_kpis para o recorte (data_inicio, data_fim, convênios).
+    # Com uma data de referência, só contam as contas que já tinham entrado até ela.
+    def kpis(self, data_inicio=None, data_fim=None, convenios=None, hoje=None):
+        inicio = dia_numero(data_inicio) if data_inicio is not None else menor_dia
+        fim = dia_numero(data_fim) if data_fim is not None else maior_dia
+        if hoje is not None:
+            fim = min(fim, dia_numero(hoje))
+        hoje = dia_numero(hoje if hoje is not None else pd.Timestamp.today().normalize())
+
+        # Faixas de idade convertidas em faixas de dia de entrada e cortadas pelo filtro:
+        # total, até 30, 31-60, 61-90 e acima de 90 dias
+        faixas_inicio = np.array([inicio, hoje - 30, hoje - 60, hoje - 90, menor_dia])
+        faixas_fim = np.array([fim, maior_dia, hoje - 31, hoje - 61, hoje - 91])
+        contagem, valor, soma_dias = self.somar(np.maximum(faixas_inicio, inicio), np.minimum(faixas_fim, fim), convenios)
+        if np.isscalar(contagem):
+            contagem, valor, soma_dias = np.zeros(5, dtype=np.int64), np.zeros(5), np.zeros(5, dtype=np.int64)
+
+        total_contas = int(contagem[0])
+        valor_total = float(valor[0])
+        valor_mais_90d = float(valor[4])
+
+        return {
+            "total_contas": total_contas,
+            "valor_total": valor_total,
+            "ticket_medio": valor_total / total_contas if total_contas > 0 else 0,
+            "idade_media": (total_contas * hoje - soma_dias[0]) / total_contas if total_contas > 0 else np.nan,
+            "contas_30d": int(contagem[1]),
+            "contas_60d": int(contagem[2]),
+            "contas_90d": int(contagem[3]),
+            "contas_mais_90d": int(contagem[4]),
+            "perc_acima_90d": (contagem[4] / total_contas) * 100 if total_contas > 0 else 0,
+            "valor_30d": float(valor[1]),
+            "valor_60d": float(valor[2]),
+            "valor_90d": float(valor[3]),
+            "valor_mais_90d": valor_mais_90d,
+            "valor_em_risco": valor_mais_90d,
+            "perc_valor_em_risco": (valor_mais_90d / valor_total) * 100 if valor_total > 0 else 0,
+        }
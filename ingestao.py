@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import pandas as pd
+from analises import colunas_necessarias, coluna_origem, preparar_dados
+from qualidade import coluna_alta, coluna_sem_alta
+
+# Leitura de planilhas com várias abas (uma por estabelecimento ou por mês, conforme o
+# export do ERP).
+#
+# Cada aba selecionada é lida em um processo separado: a leitura do XML do openpyxl é
+# CPU-bound e não se beneficia de threads. Cada processo valida o esquema da sua aba contra
+# colunas_necessarias e devolve só as colunas esperadas, marcadas com a aba de origem (mais a
+# máscara do alerta "sem alta", se a aba tem coluna de alta); as abas válidas são concatenadas e tipadas uma única vez por preparar_dados.
+
+# Sem estas colunas a aba não é de contas pendentes (resumos, tabelas auxiliares etc.)
+colunas_obrigatorias = ["Conta", "Valor conta", "Data entrada"]
+
+def conteudo_arquivo(arquivo):
+    if hasattr(arquivo, "getvalue"):
+        return arquivo.getvalue()
+    if hasattr(arquivo, "read"):
+        arquivo.seek(0)
+        return arquivo.read()
+    with open(arquivo, "rb") as f:
+        return f.read()
+
+def listar_abas(arquivo):
+    return pd.ExcelFile(BytesIO(conteudo_arquivo(arquivo))).sheet_names
+
+# Lê e valida uma aba; roda nos processos do pool (por isso recebe os bytes do arquivo)
+def ler_aba(conteudo, aba):
+    inicio = time.perf_counter()
+    df = pd.read_excel(BytesIO(conteudo), sheet_name=aba)
+
+    colunas_faltantes = [col for col in colunas_necessarias if col not in df.columns]
+    valida = not any(col in colunas_faltantes for col in colunas_obrigatorias)
+    if valida:
+        # A coluna de alta não está entre as esperadas: segue só a máscara de vazios dela
+        alta = coluna_alta(df.columns)
+        sem_alta = df[alta].isna().to_numpy() if alta is not None else None
+        df = df[[col for col in colunas_necessarias if col in df.columns]]
+        df[coluna_origem] = aba
+        if sem_alta is not None:
+            df[coluna_sem_alta] = sem_alta
+    else:
+        df = None
+
+    return {
+        "aba": aba,
+        "df": df,
+        "colunas_faltantes": colunas_faltantes,
+        "valida": valida,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+def ler_abas(conteudo, abas, max_workers=None):
+    if len(abas) == 1:
+        return [ler_aba(conteudo, abas[0])]
+
+    # "spawn" porque o processo do Streamlit tem várias threads e fork não é seguro nele
+    max_workers = max_workers or min(len(abas), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(ler_aba, [conteudo] * len(abas), abas))
+
+# Lê as abas selecionadas (todas, por padrão) e devolve o DataFrame preparado, as colunas
+# faltantes em alguma aba válida e um relatório por aba (linhas, tempo de leitura, situação)
+def carregar_abas(arquivo, abas=None, max_workers=None):
+    conteudo = conteudo_arquivo(arquivo)
+    if abas is None:
+        abas = pd.ExcelFile(BytesIO(conteudo)).sheet_names
+
+    resultados = ler_abas(conteudo, list(abas), max_workers)
+
+    validas = [r for r in resultados if r["valida"]]
+    if not validas:
+        raise ValueError(
+            f"Nenhuma aba selecionada contém as colunas obrigatórias ({', '.join(colunas_obrigatorias)})."
+        )
+
+    df = pd.concat([r["df"] for r in validas], ignore_index=True)
+    df[coluna_origem] = pd.Categorical(df[coluna_origem], categories=[r["aba"] for r in validas])
+    df, colunas_faltantes = preparar_dados(df)
+
+    relatorio = pd.DataFrame({
+        "Aba": [r["aba"] for r in resultados],
+        "Linhas": [len(r["df"]) if r["valida"] else 0 for r in resultados],
+        "Tempo de leitura (s)": [r["segundos"] for r in resultados],
+        "Colunas faltantes": [", ".join(r["colunas_faltantes"]) for r in resultados],
+        "Situação": ["Importada" if r["valida"] else "Ignorada (esquema inválido)" for r in resultados],
+    })
+
+    return df, colunas_faltantes, relatorio
+
+# Lê um arquivo pelo caminho: planilha .xlsx (todas as abas) ou os .parquet/.csv do gerador
+# de dados, já preparado
+def carregar_arquivo(caminho):
+    caminho = str(caminho)
+    if caminho.endswith(".parquet"):
+        df, _ = preparar_dados(pd.read_parquet(caminho))
+    elif caminho.endswith(".csv"):
+        # CSV brasileiro do gerador: datas dd/mm/aaaa, que o pandas leria com o mês primeiro
+        df, _ = preparar_dados(
+            pd.read_csv(caminho, sep=";", decimal=",", encoding="utf-8-sig"), formato_data="%d/%m/%Y"
+        )
+    else:
+        df, _, _ = carregar_abas(caminho)
+    return df
@@ -0,0 +1,140 @@
+import sys
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Memória dos recortes já filtrados em uma sessão.
+#
+# Quem analisa costuma alternar entre poucas seleções de convênio/médico. Cada estado de
+# filtros guarda o df_filtrado e os resultados derivados dele (KPIs, aging, rollup, projeções,
+# contas críticas, visões pré-calculadas), então voltar a um estado anterior não refaz nada.
+# A chave é canônica (seleções ordenadas e sem repetição, "todos" como None), e as entradas
+# ficam em um LRU limitado por número e por memória estimada.
+
+# Memória máxima somada das entradas guardadas, em bytes
+orcamento_padrao = 512 * 1024 ** 2
+
+# Número máximo de estados de filtros guardados
+max_entradas_padrao = 16
+
+# Seleção canônica: None para "todos", senão a tupla ordenada dos valores distintos
+def normalizar_selecao(selecionados):
+    if selecionados is None:
+        return None
+    return tuple(sorted(set(selecionados)))
+
+def chave_recorte(chave_dados, data_inicio, data_fim, convenios=None, medicos=None, status=None, setores=None):
+    return (
+        chave_dados, pd.Timestamp(data_inicio), pd.Timestamp(data_fim),
+        normalizar_selecao(convenios), normalizar_selecao(medicos),
+        normalizar_selecao(status), normalizar_selecao(setores)
+    )
+
+# Bytes ocupados por um resultado: DataFrames pela memória profunda, arrays pelo nbytes e
+# objetos (motor de aging, modelo de projeção, explorador) pela soma dos seus atributos.
+# Cada objeto é contado uma vez, mesmo quando aparece em mais de um resultado. A estimativa
+# é conservadora: fatias que compartilham memória com os dados do arquivo contam inteiras.
+def tamanho_estimado(valor, vistos=None):
+    vistos = set() if vistos is None else vistos
+    if valor is None or id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return int(np.sum(valor.memory_usage(deep=True)))
+    if isinstance(valor, pd.Index):
+        return valor.memory_usage(deep=True)
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(tamanho_estimado(k, vistos) + tamanho_estimado(v, vistos) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sum(tamanho_estimado(v, vistos) for v in valor)
+    if hasattr(valor, "__dict__") and not isinstance(valor, type):
+        return sys.getsizeof(valor) + tamanho_estimado(vars(valor), vistos)
+    return sys.getsizeof(valor)
+
+class MemoRecortes:
+    # LRU de estados de filtros de uma sessão; cada entrada é um dicionário de resultados
+    # por nome, calculados sob demanda
+
+    def __init__(self, orcamento=orcamento_padrao, max_entradas=max_entradas_padrao):
+        self.orcamento = orcamento
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()
+        self.tamanhos = {}
+        self.vistos = {}
+        self.acertos = {}
+        self.faltas = {}
+        self.descartes = 0
+
+    def _contar(self, nome, acerto):
+        contagem = self.acertos if acerto else self.faltas
+        contagem[nome] = contagem.get(nome, 0) + 1
+
+    # Recorte do estado de filtros: devolvido da memória ou calculado e guardado, passando a
+    # ser a entrada mais recente
+    def recorte(self, chave, calcular):
+        if chave in self.entradas:
+            self.entradas.move_to_end(chave)
+            self._contar("recorte", True)
+        else:
+            self._contar("recorte", False)
+            df = calcular()
+            self.entradas[chave] = {}
+            self.tamanhos[chave] = 0
+            self.vistos[chave] = set()
+            self.guardar(chave, "recorte", df)
+        return self.entradas[chave]["recorte"]
+
+    # Resultado derivado do recorte (nome pode ser uma tupla, como ("kpis", referência))
+    def obter(self, chave, nome, calcular):
+        entrada = self.entradas[chave]
+        rotulo = nome[0] if isinstance(nome, tuple) else nome
+        if nome in entrada:
+            self._contar(rotulo, True)
+            return entrada[nome]
+        self._contar(rotulo, False)
+        valor = calcular()
+        self.guardar(chave, nome, valor)
+        return valor
+
+    # Guarda um resultado calculado fora do memo (visões pré-calculadas em segundo plano)
+    def guardar(self, chave, nome, valor):
+        self.entradas[chave][nome] = valor
+        self.tamanhos[chave] += tamanho_estimado(valor, self.vistos[chave])
+        self._descartar()
+
+    def resultado(self, chave, nome):
+        return self.entradas[chave].get(nome)
+
+    # Descarta as entradas menos recentes até caber no orçamento; a mais recente, que é a
+    # que está em uso, fica mesmo que sozinha passe do orçamento
+    def _descartar(self):
+        while len(self.entradas) > 1 and (
+            len(self.entradas) > self.max_entradas or sum(self.tamanhos.values()) > self.orcamento
+        ):
+            chave, _ = self.entradas.popitem(last=False)
+            del self.tamanhos[chave], self.vistos[chave]
+            self.descartes += 1
+
+    def memoria(self):
+        return sum(self.tamanhos.values())
+
+    def limpar(self):
+        self.entradas.clear()
+        self.tamanhos.clear()
+        self.vistos.clear()
+
+    def estatisticas(self):
+        nomes = list(dict.fromkeys([*self.faltas, *self.acertos]))
+        taxas = {}
+        for nome in nomes:
+            acertos, faltas = self.acertos.get(nome, 0), self.faltas.get(nome, 0)
+            taxas[nome] = {"acertos": acertos, "faltas": faltas, "taxa_acerto": acertos / (acertos + faltas)}
+        return {
+            "entradas": len(self.entradas),
+            "memoria": self.memoria(),
+            "orcamento": self.orcamento,
+            "descartes": self.descartes,
+            "resultados": taxas,
+        }
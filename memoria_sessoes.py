@@ -0,0 +1,233 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections.abc import MutableMapping
+import pandas as pd
+import pyarrow.feather as feather
+from memo_recortes import tamanho_estimado
+
+# Memória das sessões do Streamlit, com descarga em disco das sessões ociosas.
+#
+# Cada aba aberta guarda os próprios DataFrames (importado, preparado, rollup) e os caches
+# derivados deles. Aqui esses dados ficam em um ArmazemSessao por sessão, e um gerenciador
+# único no processo acompanha quanto cada armazém ocupa e quando foi usado. Sessões paradas
+# há mais de tempo_ocioso, ou as mais antigas quando a soma passa do teto, têm os DataFrames
+# gravados em Feather (Arrow IPC colunar, comprimido) e os caches descartados. No próximo
+# acesso a uma chave o quadro é lido de volta por memory map, sem o app perceber; os caches
+# descartados são refeitos sob demanda.
+
+# Memória somada de todas as sessões a partir da qual as mais antigas são descarregadas
+# (configurável pela variável de ambiente DATACOPILOT_TETO_MEMORIA_MB)
+teto_memoria_padrao = int(os.environ.get("DATACOPILOT_TETO_MEMORIA_MB", 2048)) * 1024 ** 2
+
+# Sessões sem uso há mais que isto (em segundos) são descarregadas mesmo abaixo do teto
+# (DATACOPILOT_TEMPO_OCIOSO_S)
+tempo_ocioso_padrao = int(os.environ.get("DATACOPILOT_TEMPO_OCIOSO_S", 15 * 60))
+
+# Para ficar abaixo do teto, só são descarregadas sessões paradas há pelo menos isto
+tempo_minimo_ocioso = 60
+
+# Intervalo (em segundos) entre as verificações da thread de vigia
+intervalo_verificacao = 30
+
+# Compressão dos arquivos Feather ("lz4", "zstd" ou "uncompressed"). Sem compressão, as
+# colunas restauradas continuam apontando para o arquivo mapeado, e o sistema operacional
+# pode devolver essas páginas sem passar pelo swap.
+compressao_padrao = "lz4"
+
+class QuadroEmDisco:
+    # DataFrame descarregado: caminho do arquivo e tamanho que ocupava em memória
+
+    def __init__(self, caminho, tamanho):
+        self.caminho = caminho
+        self.tamanho = tamanho
+
+    def carregar(self):
+        return feather.read_table(self.caminho, memory_map=True).to_pandas()
+
+class ArmazemSessao(MutableMapping):
+    # Dados pesados de uma sessão, com a interface de um dicionário. Chaves em descartaveis
+    # são caches: na descarga saem do armazém (com cancelar(), se tiverem) e o app os recria.
+
+    def __init__(self, diretorio, compressao=compressao_padrao, descartaveis=()):
+        self.diretorio = diretorio
+        self.compressao = compressao
+        self.descartaveis = set(descartaveis)
+        self.dados = {}
+        self.lock = threading.RLock()
+        self.ultimo_acesso = time.monotonic()
+        self.tamanho = 0
+        self.em_disco = False
+        self.geracao = 0
+        self.descargas = 0
+        self.restauracoes = 0
+        self.tempos = {}
+        weakref.finalize(self, shutil.rmtree, diretorio, True)
+
+    # Identidade de objeto (o Mapping compararia o conteúdo), para ficar no WeakSet do gerenciador
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    # Um quadro usado em mais de uma chave (df_importado e df sem remoção de duplicatas) é
+    # restaurado uma vez só
+    def __getitem__(self, chave):
+        with self.lock:
+            valor = self.dados[chave]
+            if isinstance(valor, QuadroEmDisco):
+                inicio = time.perf_counter()
+                quadro = valor.carregar()
+                for outra, v in self.dados.items():
+                    if v is valor:
+                        self.dados[outra] = quadro
+                self.restauracoes += 1
+                self.tempos["restauração"] = time.perf_counter() - inicio
+                self.em_disco = any(isinstance(v, QuadroEmDisco) for v in self.dados.values())
+                return quadro
+            return valor
+
+    def __setitem__(self, chave, valor):
+        with self.lock:
+            self.dados[chave] = valor
+
+    def __delitem__(self, chave):
+        with self.lock:
+            del self.dados[chave]
+
+    def __iter__(self):
+        return iter(list(self.dados))
+
+    def __len__(self):
+        return len(self.dados)
+
+    # Bytes ocupados: DataFrames pela memória profunda (cada um uma vez), caches pelo que eles
+    # mesmos informam em memoria() e o resto pela estimativa de memo_recortes
+    def medir(self):
+        with self.lock:
+            vistos = set()
+            valores = [v for v in self.dados.values() if not isinstance(v, QuadroEmDisco)]
+            tamanho = sum(tamanho_estimado(v, vistos) for v in valores if isinstance(v, pd.DataFrame))
+            for valor in valores:
+                if hasattr(valor, "memoria"):
+                    tamanho += valor.memoria()
+                elif not isinstance(valor, pd.DataFrame):
+                    tamanho += tamanho_estimado(valor, vistos)
+            self.tamanho = tamanho
+            return tamanho
+
+    # Grava os DataFrames em arquivos novos (um quadro restaurado de um arquivo sem compressão
+    # ainda pode estar mapeado nele) e apaga os da descarga anterior que não estão mais em uso
+    def descarregar(self):
+        with self.lock:
+            inicio = time.perf_counter()
+            self.geracao += 1
+            os.makedirs(self.diretorio, exist_ok=True)
+            anteriores = [os.path.join(self.diretorio, nome) for nome in os.listdir(self.diretorio)]
+
+            gravados = {}
+            for chave in list(self.dados):
+                valor = self.dados[chave]
+                if chave in self.descartaveis:
+                    if hasattr(valor, "cancelar"):
+                        valor.cancelar()
+                    del self.dados[chave]
+                elif isinstance(valor, pd.DataFrame):
+                    if id(valor) not in gravados:
+                        caminho = os.path.join(self.diretorio, f"{chave}.{self.geracao}.arrow")
+                        feather.write_feather(valor, caminho, compression=self.compressao)
+                        gravados[id(valor)] = QuadroEmDisco(caminho, tamanho_estimado(valor))
+                    self.dados[chave] = gravados[id(valor)]
+
+            # Quadros que ficaram no disco desde a descarga anterior (nunca lidos) mantêm o arquivo
+            em_uso = {v.caminho for v in self.dados.values() if isinstance(v, QuadroEmDisco)}
+            for caminho in anteriores:
+                if caminho not in em_uso:
+                    try:
+                        os.remove(caminho)
+                    except OSError:
+                        pass
+            self.em_disco = bool(em_uso)
+            self.medir()
+            self.descargas += 1
+            self.tempos["descarga"] = time.perf_counter() - inicio
+
+    # Quadros no disco (cada arquivo uma vez), para as estatísticas
+    def quadros_em_disco(self):
+        with self.lock:
+            return list({id(v): v for v in self.dados.values() if isinstance(v, QuadroEmDisco)}.values())
+
+class GerenciadorMemoria:
+    # Armazéns de todas as sessões do processo (referências fracas: a sessão fechada leva o
+    # armazém e os arquivos junto) e a thread que descarrega as ociosas
+
+    def __init__(self, teto=teto_memoria_padrao, tempo_ocioso=tempo_ocioso_padrao,
+                 compressao=compressao_padrao, diretorio=None, vigiar=True):
+        self.teto = teto
+        self.tempo_ocioso = tempo_ocioso
+        self.compressao = compressao
+        self.diretorio = diretorio or tempfile.mkdtemp(prefix="datacopilot_sessoes_")
+        self.armazens = weakref.WeakSet()
+        self.lock = threading.Lock()
+        self.lock_verificacao = threading.Lock()
+        self.parar = threading.Event()
+        if vigiar:
+            threading.Thread(target=self._vigiar, daemon=True, name="memoria_sessoes").start()
+
+    def novo_armazem(self, descartaveis=()):
+        armazem = ArmazemSessao(
+            tempfile.mkdtemp(prefix="sessao_", dir=self.diretorio), self.compressao, descartaveis
+        )
+        with self.lock:
+            self.armazens.add(armazem)
+        return armazem
+
+    # Início de um rerun da sessão: marca o uso (a restauração acontece no primeiro acesso)
+    def tocar(self, armazem):
+        armazem.ultimo_acesso = time.monotonic()
+
+    # Fim de um rerun: mede a sessão e descarrega outras se for preciso
+    def concluir(self, armazem):
+        armazem.ultimo_acesso = time.monotonic()
+        armazem.medir()
+        self.verificar(exceto=armazem)
+
+    # Descarrega as sessões ociosas e, enquanto a soma passar do teto, as usadas há mais
+    # tempo (paradas há pelo menos tempo_minimo_ocioso)
+    def verificar(self, exceto=None):
+        with self.lock_verificacao:
+            agora = time.monotonic()
+            with self.lock:
+                armazens = sorted(self.armazens, key=lambda a: a.ultimo_acesso)
+
+            em_memoria = [a for a in armazens if a is not exceto and not a.em_disco and a.tamanho > 0]
+            for armazem in em_memoria:
+                if agora - armazem.ultimo_acesso > self.tempo_ocioso:
+                    armazem.descarregar()
+
+            total = sum(a.tamanho for a in armazens)
+            for armazem in em_memoria:
+                if total <= self.teto:
+                    break
+                if not armazem.em_disco and agora - armazem.ultimo_acesso >= tempo_minimo_ocioso:
+                    total -= armazem.tamanho
+                    armazem.descarregar()
+                    total += armazem.tamanho
+
+    def _vigiar(self):
+        while not self.parar.wait(intervalo_verificacao):
+            self.verificar()
+
+    def estatisticas(self):
+        with self.lock:
+            armazens = list(self.armazens)
+        quadros = [q for a in armazens for q in a.quadros_em_disco()]
+        return {
+            "sessoes": len(armazens),
+            "em_disco": sum(a.em_disco for a in armazens),
+            "memoria": sum(a.tamanho for a in armazens),
+            "teto": self.teto,
+            "memoria_descarregada": sum(q.tamanho for q in quadros),
+            "bytes_em_disco": sum(os.path.getsize(q.caminho) for q in quadros),
+        }
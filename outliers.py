@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Outliers de valor por grupo convênio x tipo de atendimento.
+#
+# Cada conta é comparada com as contas do seu grupo pelo escore robusto de Iglewicz e
+# Hoaglin: 0,6745 * (valor - mediana) / MAD, onde MAD é a mediana dos desvios absolutos.
+# Uma conta cara de oncologia de um convênio de ticket alto deixa de ser julgada na mesma
+# régua de uma consulta de outro convênio. Medianas e MADs de todos os grupos saem de uma
+# única ordenação por (código do grupo, valor), sem laço em Python por grupo.
+
+colunas_grupo_outlier = ["Convênio", "Tipo atendimento"]
+
+# Escore acima do qual a conta é outlier (valor sugerido por Iglewicz e Hoaglin)
+limite_escore = 3.5
+
+# Grupos com menos contas que isto são comparados com todas as contas do recorte
+tamanho_minimo_grupo = 10
+
+# Código inteiro do grupo de cada linha (valores ausentes formam um grupo próprio)
+def codigos_grupo(df):
+    grupos = np.zeros(len(df), dtype=np.int64)
+    for coluna in colunas_grupo_outlier:
+        if coluna in df.columns:
+            codigos, rotulos = pd.factorize(df[coluna], use_na_sentinel=False)
+            grupos = grupos * len(rotulos) + codigos
+    grupos, combinacoes = pd.factorize(grupos)
+    return grupos, len(combinacoes)
+
+# Valores (sem NaN) ordenados por (grupo, valor), com o início e a contagem de cada grupo.
+# A ordem sai de uma ordenação dos valores seguida de uma ordenação estável dos códigos de
+# grupo, que o NumPy faz por radix quando os códigos cabem em 16 bits.
+def ordenar_por_grupo(grupos, valores, n_grupos):
+    validos = ~np.isnan(valores)
+    if not validos.all():
+        grupos, valores = grupos[validos], valores[validos]
+    ordem = np.argsort(valores)
+    ordem = ordem[np.argsort(grupos.astype(np.min_scalar_type(n_grupos))[ordem], kind="stable")]
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    inicio = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    return valores[ordem], np.repeat(np.arange(n_grupos), contagem), inicio, contagem
+
+# k-ésimo menor desvio |x - m| de cada grupo, sem ordenar os desvios. À esquerda do ponto de
+# corte (primeiro valor >= m) os desvios crescem para trás e à direita crescem para frente:
+# é o k-ésimo elemento da junção de duas listas ordenadas, achado por busca binária na
+# quantidade que vem da esquerda, com todos os grupos avançando juntos.
+def k_esimo_desvio(ordenados, inicio, corte, fim, mediana, k):
+    ultimo = len(ordenados) - 1
+    n_esquerda = corte - inicio
+    lo = np.maximum(0, k + 1 - (fim - corte))
+    hi = np.minimum(k + 1, n_esquerda)
+    while (lo < hi).any():
+        ativo = lo < hi
+        a = (lo + hi) // 2
+        b = k + 1 - a
+        desvio_esquerda = mediana - ordenados[np.clip(corte - 1 - a, 0, ultimo)]
+        desvio_direita = ordenados[np.clip(corte + b - 1, 0, ultimo)] - mediana
+        avanca = ativo & (a < n_esquerda) & (b > 0) & (desvio_direita > desvio_esquerda)
+        lo = np.where(avanca, a + 1, lo)
+        hi = np.where(ativo & ~avanca, a, hi)
+    b = k + 1 - lo
+    da_esquerda = np.where(lo > 0, mediana - ordenados[np.clip(corte - lo, 0, ultimo)], -np.inf)
+    da_direita = np.where(b > 0, ordenados[np.clip(corte + b - 1, 0, ultimo)] - mediana, -np.inf)
+    return np.maximum(da_esquerda, da_direita)
+
+# Mediana, MAD, desvio absoluto médio e contagem de cada grupo a partir de uma única
+# ordenação: as posições do meio de cada grupo são conhecidas pelas contagens
+def estatisticas_por_grupo(grupos, valores, n_grupos):
+    ordenados, grupos_ordenados, inicio, contagem = ordenar_por_grupo(grupos, valores, n_grupos)
+    mediana = np.full(n_grupos, np.nan)
+    mad = np.full(n_grupos, np.nan)
+    media_desvios = np.full(n_grupos, np.nan)
+
+    g = np.flatnonzero(contagem > 0)
+    c, s = contagem[g], inicio[g]
+    inferior, superior = (c - 1) // 2, c // 2
+    mediana[g] = (ordenados[s + inferior] + ordenados[s + superior]) / 2
+
+    desvios = np.abs(ordenados - mediana[grupos_ordenados])
+    media_desvios[g] = np.bincount(grupos_ordenados, weights=desvios, minlength=n_grupos)[g] / c
+    corte = s + np.bincount(grupos_ordenados, weights=ordenados < mediana[grupos_ordenados], minlength=n_grupos)[g].astype(np.int64)
+    mad[g] = (
+        k_esimo_desvio(ordenados, s, corte, s + c, mediana[g], inferior)
+        + k_esimo_desvio(ordenados, s, corte, s + c, mediana[g], superior)
+    ) / 2
+    return mediana, mad, media_desvios, contagem
+
+# Escala robusta: MAD / 0,6745 ou, quando mais da metade do grupo tem o mesmo valor (MAD
+# zero), o desvio absoluto médio * 1,2533
+def escala_robusta(mad, media_desvios):
+    return np.where(mad > 0, mad / 0.6745, media_desvios * 1.253314)
+
+# Mediana de referência e escore robusto de cada conta, alinhados ao índice de df
+def escore_robusto(df):
+    valores = pd.to_numeric(df["Valor conta"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    grupos, n_grupos = codigos_grupo(df)
+
+    mediana, mad, media_desvios, contagem = estatisticas_por_grupo(grupos, valores, n_grupos)
+    mediana_linha = mediana[grupos]
+    escala_linha = escala_robusta(mad, media_desvios)[grupos]
+
+    # Grupos pequenos usam a mediana e a escala de todas as contas
+    pequenos = contagem[grupos] < tamanho_minimo_grupo
+    if pequenos.any() and not np.isnan(valores).all():
+        mediana_geral = np.nanmedian(valores)
+        desvios_gerais = np.abs(valores - mediana_geral)
+        mediana_linha = np.where(pequenos, mediana_geral, mediana_linha)
+        escala_linha = np.where(pequenos, escala_robusta(np.nanmedian(desvios_gerais), np.nanmean(desvios_gerais)), escala_linha)
+
+    # Escala zero: todas as contas do grupo com o mesmo valor, nenhuma é outlier
+    with np.errstate(divide="ignore", invalid="ignore"):
+        escores = np.where(escala_linha > 0, (valores - mediana_linha) / escala_linha, 0.0)
+    escores[np.isnan(valores)] = np.nan
+
+    return pd.DataFrame({"Mediana do Grupo": mediana_linha, "Escore Robusto": escores}, index=df.index)
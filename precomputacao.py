@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError, Future
+from analises import (
+    calcular_resumo_convenio, calcular_aging_convenio, calcular_resumo_medico,
+    calcular_medico_convenio, calcular_fluxo_sankey, calcular_gargalos
+)
+from graficos import (
+    figura_pizza_convenios, figura_aging_convenio, figura_ticket_convenio,
+    figura_top_medicos, figura_ticket_medicos, figura_heatmap_medico_convenio,
+    figura_sankey, figura_pareto
+)
+from hierarquia import ExploradorHierarquia
+from memo_recortes import tamanho_estimado
+
+# Pré-cálculo em segundo plano das visões mais pesadas do dashboard.
+#
+# Assim que os filtros são aplicados, as agregações e figuras das abas de Convênio,
+# Médico (com o mapa de calor), do Sankey, do Pareto de gargalos e os subtotais do
+# explorador hierárquico são submetidas a um pool de threads, enquanto a thread do
+# Streamlit desenha os KPIs e os insights.
+# Quando o script chega em cada aba, o resultado já está pronto (ou em andamento) e é
+# lido da sessão em vez de ser recalculado. Mudar qualquer filtro cancela as tarefas
+# pendentes e descarta os resultados do estado anterior.
+
+# Cada visão recebe o recorte e a data de referência do aging (as que não dependem dela a
+# ignoram)
+def preparar_visao_convenio(df, data_referencia=None):
+    resumo = calcular_resumo_convenio(df)
+    aging = calcular_aging_convenio(df, resumo, top=5, data_referencia=data_referencia)
+    return {
+        "resumo": resumo,
+        "fig_pizza": figura_pizza_convenios(resumo),
+        "fig_aging": figura_aging_convenio(aging),
+        "fig_ticket": figura_ticket_convenio(resumo),
+    }
+
+def preparar_visao_medico(df, data_referencia=None):
+    resumo = calcular_resumo_medico(df)
+    pivot = calcular_medico_convenio(df, resumo, top=5)
+    return {
+        "resumo": resumo,
+        "fig_top": figura_top_medicos(resumo),
+        "fig_ticket": figura_ticket_medicos(resumo),
+        "fig_heatmap": figura_heatmap_medico_convenio(pivot),
+    }
+
+def preparar_visao_sankey(df, data_referencia=None):
+    return {"fig_sankey": figura_sankey(calcular_fluxo_sankey(df))}
+
+def preparar_visao_gargalos(df, data_referencia=None):
+    gargalos = calcular_gargalos(df)
+    return {
+        "gargalos": gargalos,
+        "fig_pareto": figura_pareto(gargalos) if not gargalos.empty else None,
+    }
+
+# Subtotais de todos os níveis, para que abrir qualquer nó só leia a tabela pronta
+def preparar_visao_hierarquia(df, data_referencia=None):
+    explorador = ExploradorHierarquia(df, data_referencia=data_referencia)
+    for nivel in range(len(explorador.niveis)):
+        explorador.subtotais(nivel)
+    return {"explorador": explorador}
+
+visoes_pesadas = {
+    "convenio": preparar_visao_convenio,
+    "medico": preparar_visao_medico,
+    "sankey": preparar_visao_sankey,
+    "gargalos": preparar_visao_gargalos,
+    "hierarquia": preparar_visao_hierarquia,
+}
+
+def criar_executor(max_workers=4):
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precomputacao")
+
+class Precomputador:
+    # Guarda, para uma sessão, as tarefas do estado de filtros atual.
+    # O executor é compartilhado entre sessões para limitar o número de threads.
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.chave = None
+        self.data_referencia = None
+        self.tarefas = {}
+        self.tempos = {}
+        self.cancelado = threading.Event()
+        self.lock = threading.Lock()
+
+    # Visões em prontas (já calculadas para este estado de filtros, guardadas pela sessão)
+    # não são agendadas de novo. A data de referência do aging faz parte do estado: deve
+    # entrar na chave.
+    def agendar(self, chave, df, visoes=None, prontas=None, data_referencia=None):
+        if chave == self.chave:
+            return
+        self.cancelar()
+
+        visoes = visoes or visoes_pesadas
+        prontas = prontas or {}
+        self.chave = chave
+        self.data_referencia = data_referencia
+        self.cancelado = threading.Event()
+        for nome, funcao in visoes.items():
+            if nome in prontas:
+                self.tarefas[nome] = Future()
+                self.tarefas[nome].set_result(prontas[nome])
+            else:
+                self.tarefas[nome] = self.executor.submit(
+                    self._executar, nome, funcao, df, data_referencia, self.cancelado
+                )
+
+    def _executar(self, nome, funcao, df, data_referencia, cancelado):
+        # Tarefas que ainda não começaram quando o filtro mudou são descartadas
+        if cancelado.is_set():
+            raise CancelledError()
+        inicio = time.perf_counter()
+        resultado = funcao(df, data_referencia)
+        with self.lock:
+            if not cancelado.is_set():
+                self.tempos[nome] = time.perf_counter() - inicio
+        return resultado
+
+    # Devolve o resultado pré-calculado; se a visão não foi agendada (ou foi cancelada),
+    # calcula na hora
+    def obter(self, nome, df):
+        tarefa = self.tarefas.get(nome)
+        if tarefa is not None:
+            try:
+                return tarefa.result()
+            except CancelledError:
+                pass
+        return visoes_pesadas[nome](df, self.data_referencia)
+
+    # Resultados das visões já concluídas do estado de filtros atual
+    def concluidas(self):
+        return {
+            nome: tarefa.result() for nome, tarefa in self.tarefas.items()
+            if tarefa.done() and not tarefa.cancelled() and tarefa.exception() is None
+        }
+
+    # Bytes estimados dos resultados já concluídos
+    def memoria(self):
+        return tamanho_estimado(self.concluidas())
+
+    def cancelar(self):
+        self.cancelado.set()
+        for tarefa in self.tarefas.values():
+            tarefa.cancel()
+        self.tarefas = {}
+        self.chave = None
+        with self.lock:
+            self.tempos = {}
@@ -0,0 +1,155 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Projeção mensal de recebíveis por convênio x setor.
+#
+# O rollup diário é reorganizado em uma matriz (séries x meses) e todas as séries são
+# ajustadas de uma vez: a suavização exponencial simples é avaliada para uma grade de alfas
+# com operações sobre a matriz inteira (o único laço é sobre os meses), e o modelo ingênuo
+# sazonal (mesmo mês do ano anterior) é comparado a ela pelo erro um passo à frente.
+# Cada série fica com o modelo de menor erro. O ajuste é feito uma vez por arquivo e os
+# parâmetros ficam guardados na sessão; as projeções dos filtros são somas de linhas.
+
+alfas_padrao = np.round(np.linspace(0.05, 0.95, 19), 2)
+sazonalidade_padrao = 12
+horizonte_padrao = 3
+
+def montar_series_mensais(rollup, descartar_mes_parcial=True):
+    # Matriz de valor mensal por (convênio, setor); meses sem movimento ficam com zero
+    datas = rollup["Data"]
+    if datas.empty:
+        return pd.MultiIndex.from_arrays([[], []], names=["Convênio", "Último Setor destino"]), pd.PeriodIndex([], freq="M"), np.zeros((0, 0))
+
+    meses = (datas.dt.year * 12 + datas.dt.month - 1).to_numpy()
+    primeiro, ultimo = meses.min(), meses.max()
+
+    # O último mês só entra se o arquivo cobrir até o seu último dia
+    if descartar_mes_parcial and not (datas.max() + pd.Timedelta(days=1)).is_month_start and ultimo > primeiro:
+        ultimo -= 1
+
+    # Uma série por par (convênio, setor) presente no rollup
+    codigos_convenio, convenios = pd.factorize(rollup["Convênio"])
+    codigos_setor, setores = pd.factorize(rollup["Último Setor destino"])
+    pares, codigos = np.unique(codigos_convenio * len(setores) + codigos_setor, return_inverse=True)
+    chaves = pd.MultiIndex.from_arrays(
+        [convenios[pares // len(setores)], setores[pares % len(setores)]],
+        names=["Convênio", "Último Setor destino"]
+    )
+    n_meses = ultimo - primeiro + 1
+    dentro = meses <= ultimo
+    posicao = codigos[dentro] * n_meses + (meses[dentro] - primeiro)
+    matriz = np.bincount(
+        posicao, weights=rollup["Valor_Total"].to_numpy(dtype=float)[dentro], minlength=len(chaves) * n_meses
+    ).reshape(len(chaves), n_meses)
+
+    periodos = pd.period_range(
+        pd.Period(year=primeiro // 12, month=primeiro % 12 + 1, freq="M"), periods=n_meses, freq="M"
+    )
+    return chaves, periodos, matriz
+
+# Suavização exponencial simples para todas as séries e todos os alfas ao mesmo tempo.
+# Devolve o alfa de menor erro quadrático um passo à frente, o nível final e o erro
+# acumulado a partir do mês "inicio_comparacao" (janela usada para escolher o modelo).
+def ajustar_suavizacao(matriz, alfas=alfas_padrao, inicio_comparacao=1):
+    n_series, n_meses = matriz.shape
+    nivel = np.repeat(matriz[:, :1], len(alfas), axis=1)
+    erro_total = np.zeros((n_series, len(alfas)))
+    erro_janela = np.zeros((n_series, len(alfas)))
+    for t in range(1, n_meses):
+        erro = matriz[:, t:t + 1] - nivel
+        erro_total += erro ** 2
+        if t >= inicio_comparacao:
+            erro_janela += erro ** 2
+        nivel = nivel + alfas * erro
+
+    linhas = np.arange(n_series)
+    melhor = erro_total.argmin(axis=1)
+    return alfas[melhor], nivel[linhas, melhor], erro_janela[linhas, melhor]
+
+class ModeloPrevisao:
+
+    def __init__(self, rollup, alfas=alfas_padrao, sazonalidade=sazonalidade_padrao):
+        inicio = time.perf_counter()
+
+        self.chaves, self.periodos, self.matriz = montar_series_mensais(rollup)
+        self.sazonalidade = sazonalidade
+        n_series, n_meses = self.matriz.shape
+
+        # O ingênuo sazonal só concorre quando há pelo menos um ano e um mês de histórico
+        self.com_sazonal = n_meses > sazonalidade
+        inicio_comparacao = sazonalidade if self.com_sazonal else 1
+        self.alfa, self.nivel, erro_suavizacao = ajustar_suavizacao(self.matriz, alfas, inicio_comparacao)
+
+        if self.com_sazonal:
+            erro_sazonal = ((self.matriz[:, sazonalidade:] - self.matriz[:, :-sazonalidade]) ** 2).sum(axis=1)
+            self.sazonal = erro_sazonal < erro_suavizacao
+            erro = np.where(self.sazonal, erro_sazonal, erro_suavizacao)
+        else:
+            self.sazonal = np.zeros(n_series, dtype=bool)
+            erro = erro_suavizacao
+
+        meses_avaliados = max(n_meses - inicio_comparacao, 1)
+        self.rmse = np.sqrt(erro / meses_avaliados)
+
+        self.tempo_ajuste = time.perf_counter() - inicio
+
+    # Linhas da matriz que pertencem ao recorte de convênios e setores (None = todos)
+    def selecionar(self, convenios=None, setores=None):
+        selecao = np.ones(len(self.chaves), dtype=bool)
+        if convenios is not None:
+            selecao &= self.chaves.get_level_values(0).isin(convenios)
+        if setores is not None:
+            selecao &= self.chaves.get_level_values(1).isin(setores)
+        return selecao
+
+    # Projeção (séries x horizonte) de todas as séries
+    def projetar(self, horizonte=horizonte_padrao):
+        projecao = np.repeat(self.nivel[:, None], horizonte, axis=1)
+        if self.com_sazonal and self.sazonal.any():
+            passos = np.arange(horizonte) % self.sazonalidade
+            ultimo_ano = self.matriz[:, -self.sazonalidade:]
+            projecao[self.sazonal] = ultimo_ano[self.sazonal][:, passos]
+        return projecao
+
+    def periodos_futuros(self, horizonte=horizonte_padrao):
+        if len(self.periodos) == 0:
+            return pd.PeriodIndex([], freq="M")
+        return pd.period_range(self.periodos[-1] + 1, periods=horizonte, freq="M")
+
+    # Histórico e projeção somados para o recorte, um mês por linha
+    def serie_total(self, horizonte=horizonte_padrao, convenios=None, setores=None):
+        selecao = self.selecionar(convenios, setores)
+        historico = pd.DataFrame({
+            "AnoMes": self.periodos.astype(str),
+            "Valor conta": self.matriz[selecao].sum(axis=0),
+            "Tipo": "Histórico",
+        })
+        projecao = pd.DataFrame({
+            "AnoMes": self.periodos_futuros(horizonte).astype(str),
+            "Valor conta": self.projetar(horizonte)[selecao].sum(axis=0) if len(self.periodos) else [],
+            "Tipo": "Projeção",
+        })
+        return pd.concat([historico, projecao], ignore_index=True)
+
+    # Parâmetros ajustados e projeção de cada série do recorte, maiores projeções primeiro
+    def parametros(self, horizonte=horizonte_padrao, convenios=None, setores=None):
+        selecao = self.selecionar(convenios, setores)
+        tabela = self.chaves[selecao].to_frame(index=False)
+        tabela["Modelo"] = np.where(self.sazonal[selecao], "Ingênuo sazonal", "Suavização exponencial")
+        tabela["Alfa"] = np.where(self.sazonal[selecao], np.nan, self.alfa[selecao])
+        tabela["Erro (RMSE)"] = self.rmse[selecao]
+        tabela[f"Projeção {horizonte} meses"] = self.projetar(horizonte)[selecao].sum(axis=1) if len(self.periodos) else 0.0
+        return tabela.sort_values(f"Projeção {horizonte} meses", ascending=False, ignore_index=True)
+
+    # Resumo para os insights: projeção do próximo mês contra o último mês fechado
+    def resumo_proximo_mes(self, convenios=None, setores=None):
+        if len(self.periodos) == 0:
+            return None
+        selecao = self.selecionar(convenios, setores)
+        return {
+            "mes": str(self.periodos_futuros(1)[0]),
+            "valor": float(self.projetar(1)[selecao, 0].sum()),
+            "ultimo_mes": str(self.periodos[-1]),
+            "valor_ultimo_mes": float(self.matriz[selecao, -1].sum()),
+        }
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from outliers import escore_robusto, limite_escore
+
+# Validação das contas, guardada em um campo de bits por linha.
+#
+# Valor zerado, valor negativo, paciente sem alta, valor abaixo da mediana e outlier no
+# convênio x tipo de atendimento eram varreduras separadas, refeitas a cada estado de filtros:
+# nos insights, de novo para montar as listas da aba de insights e outra vez no relatório.
+# Aqui todas rodam uma vez, vetorizadas, e cada linha guarda o resultado em um byte (coluna
+# "Alertas"), que acompanha a linha nos filtros e na descarga em disco. As contagens de todos
+# os alertas saem de um único bincount dos bytes, e cada lista é uma máscara sobre a coluna.
+#
+# Os alertas que só o arquivo bruto mostra (sem alta e valores e datas preenchidos na
+# planilha que a conversão com errors="coerce" deixou vazios) são gravados por preparar_dados;
+# os dos valores, por validar_contas depois da remoção de duplicatas, para a mediana e os
+# escores serem os das contas que ficam. Mais de 90 dias não entra no byte: depende da data
+# de referência escolhida e é calculado na leitura (analises.contas_antigas).
+
+coluna_alertas = "Alertas"
+coluna_escore = "Escore Robusto"
+# Máscara de "sem alta" montada por aba na leitura do Excel (a coluna de alta não é selecionada)
+coluna_sem_alta = "Sem alta"
+
+# Alertas: bit na coluna e descrição nos arquivos exportados
+alertas = {
+    "outliers": (1 << 0, "outlier"),
+    "zeradas": (1 << 1, "valor zerado"),
+    "sem_alta": (1 << 2, "sem alta"),
+    "negativos": (1 << 3, "valor negativo"),
+    "abaixo_mediana": (1 << 4, "abaixo da mediana"),
+    "valor_invalido": (1 << 5, "valor inválido"),
+    "data_invalida": (1 << 6, "data inválida"),
+}
+
+# Alertas gravados na leitura, que validar_contas mantém
+alertas_leitura = ["sem_alta", "valor_invalido", "data_invalida"]
+bits_leitura = sum(alertas[nome][0] for nome in alertas_leitura)
+
+# Texto de cada combinação de alertas ("valor zerado; sem alta"), montado uma vez
+descricoes_alertas = [
+    "; ".join(d for bit, d in alertas.values() if codigo & bit) for codigo in range(1 << len(alertas))
+]
+
+# Coluna do alerta "sem alta": a primeira cujo nome contém "alta", procurada uma vez no
+# arquivo bruto, que ainda tem todas as colunas
+def coluna_alta(colunas):
+    return next((col for col in colunas if "alta" in str(col).lower()), None)
+
+# Entradas preenchidas no original que ficaram vazias na conversão. Colunas que já vieram
+# como número ou data não perdem nada; nas demais, texto em branco conta como vazio.
+def nao_convertidos(original, convertido):
+    if pd.api.types.is_numeric_dtype(original) or pd.api.types.is_datetime64_any_dtype(original):
+        return np.zeros(len(original), dtype=bool)
+    perdidos = (convertido.isna() & original.notna()).to_numpy(copy=True)
+    if perdidos.any():
+        posicoes = np.flatnonzero(perdidos)
+        perdidos[posicoes] = original.iloc[posicoes].astype(str).str.strip().ne("").to_numpy()
+    return perdidos
+
+# Liga em bits o alerta de cada máscara informada (as ausentes ficam de fora)
+def acumular_alertas(bits, mascaras):
+    for nome, mascara in mascaras.items():
+        if mascara is not None:
+            np.bitwise_or(bits, alertas[nome][0], out=bits, where=mascara)
+    return bits
+
+# Alertas da leitura: sem_alta, valor_invalido e data_invalida são máscaras do arquivo bruto,
+# na mesma ordem das linhas do DataFrame já convertido; anteriores, os bytes que as linhas já
+# traziam (snapshots do histórico), dos quais ficam só os alertas da leitura
+def marcar_alertas_leitura(df, sem_alta=None, valor_invalido=None, data_invalida=None, anteriores=None):
+    bits = np.zeros(len(df), dtype=np.uint8) if anteriores is None else anteriores & np.uint8(bits_leitura)
+    df[coluna_alertas] = acumular_alertas(bits, {
+        "sem_alta": sem_alta, "valor_invalido": valor_invalido, "data_invalida": data_invalida,
+    })
+    return df
+
+# Verificações dos valores em uma passada, sobre as contas que ficaram depois da remoção de
+# duplicatas. Mantém os alertas da leitura, refaz os demais, acrescenta a coluna de escore e
+# guarda a mediana em df.attrs (devolve um novo DataFrame; o recebido não muda).
+def validar_contas(df):
+    valores = df["Valor conta"].to_numpy(dtype=float, na_value=np.nan)
+    escores = escore_robusto(df)[coluna_escore].to_numpy()
+    mediana = float(np.nanmedian(valores)) if not np.isnan(valores).all() else np.nan
+
+    if coluna_alertas in df.columns:
+        bits = df[coluna_alertas].to_numpy(dtype=np.uint8) & np.uint8(bits_leitura)
+    else:
+        bits = np.zeros(len(df), dtype=np.uint8)
+    acumular_alertas(bits, {
+        "outliers": escores > limite_escore,
+        "zeradas": valores == 0,
+        "negativos": valores < 0,
+        "abaixo_mediana": valores < mediana,
+    })
+
+    df = df.assign(**{coluna_alertas: bits, coluna_escore: escores.astype(np.float32)})
+    df.attrs["mediana_valor"] = mediana
+    return df
+
+# Quantidade de contas com cada alerta: um bincount dos bytes e, para cada alerta, a soma
+# das frequências dos bytes que têm o bit
+def contar_alertas(df):
+    frequencias = np.bincount(df[coluna_alertas].to_numpy(), minlength=len(descricoes_alertas))
+    codigos = np.arange(len(frequencias))
+    return {nome: int(frequencias[(codigos & bit) != 0].sum()) for nome, (bit, _) in alertas.items()}
+
+def mascara_alerta(df, nome):
+    return (df[coluna_alertas].to_numpy() & alertas[nome][0]) != 0
+
+# Contas com o alerta; os outliers vêm do maior escore para o menor
+def contas_com_alerta(df, nome):
+    contas = df[mascara_alerta(df, nome)]
+    if nome == "outliers":
+        contas = contas.sort_values(coluna_escore, ascending=False)
+    return contas
+
+# Troca o byte de alertas pela descrição, para planilhas, CSV e tabelas (categórico: os
+# textos são os montados acima, sem formatar linha a linha)
+def descrever_alertas(df):
+    if coluna_alertas not in df.columns:
+        return df
+    return df.assign(**{coluna_alertas: pd.Categorical.from_codes(
+        df[coluna_alertas].to_numpy(), categories=descricoes_alertas
+    )})
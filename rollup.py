@@ -0,0 +1,69 @@
+import pandas as pd
+from indice_datas import colunas_filtro
+
+# Tabela materializada de totais diários (data x convênio x setor -> quantidade, valor).
+#
+# É montada uma vez por arquivo. As visões temporais (tendência mensal, tendência de valores
+# pendentes com média móvel, sazonalidade por dia da semana e mapa de calor mês/dia) são
+# reamostradas a partir dela, custando O(dias) em vez de O(linhas) a cada rerun.
+
+dias_pt = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+meses_pt = [
+    "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+    "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
+]
+
+def construir_rollup_diario(df):
+    # Mesmas linhas que sobrevivem aos filtros da barra lateral com "Selecionar todos"
+    validas = df["Data entrada"].notna()
+    for coluna in colunas_filtro:
+        validas &= df[coluna].notna()
+    base = df[validas]
+
+    return base.groupby(
+        [base["Data entrada"].dt.normalize().rename("Data"), "Convênio", "Último Setor destino"],
+        observed=True
+    ).agg(
+        Quantidade=("Conta", "count"),
+        Valor_Total=("Valor conta", "sum")
+    ).reset_index()
+
+# Recorte do rollup pelos filtros de data, convênio e setor (None = todos)
+def filtrar_rollup(rollup, data_inicio, data_fim, convenios=None, setores=None):
+    mask = (rollup["Data"] >= pd.Timestamp(data_inicio)) & (rollup["Data"] <= pd.Timestamp(data_fim))
+    if convenios is not None:
+        mask &= rollup["Convênio"].isin(convenios)
+    if setores is not None:
+        mask &= rollup["Último Setor destino"].isin(setores)
+    return rollup[mask]
+
+# Série diária (uma linha por dia com movimento), base de todas as visões temporais
+def totais_diarios(rollup):
+    return rollup.groupby("Data")[["Quantidade", "Valor_Total"]].sum()
+
+def calcular_tendencia_mensal(diario):
+    tendencia_mensal = diario.groupby(diario.index.to_period("M").rename("Mês")).sum().reset_index()
+    tendencia_mensal["Mês"] = tendencia_mensal["Mês"].astype(str)
+    return tendencia_mensal
+
+# Valor pendente por mês com média móvel de 3 meses (quando houver meses suficientes)
+def calcular_tendencia_valor(diario):
+    tendencia_valor = calcular_tendencia_mensal(diario).rename(columns={"Mês": "AnoMes", "Valor_Total": "Valor conta"})
+    tendencia_valor = tendencia_valor[["AnoMes", "Valor conta"]]
+    if len(tendencia_valor) >= 3:
+        tendencia_valor["Media_Movel"] = tendencia_valor["Valor conta"].rolling(window=3).mean()
+    return tendencia_valor
+
+def calcular_sazonalidade_dia_semana(diario):
+    dia_semana_agg = diario.groupby(diario.index.dayofweek).sum().sort_index()
+    dia_semana_agg.index = [dias_pt[d] for d in dia_semana_agg.index]
+    return dia_semana_agg.rename_axis("Dia da Semana").reset_index()
+
+# Valor total por dia da semana (linhas) e mês do ano (colunas)
+def calcular_calendario(diario):
+    pivot_calendar = diario.pivot_table(
+        index=diario.index.dayofweek, columns=diario.index.month, values="Valor_Total", aggfunc="sum"
+    ).sort_index().sort_index(axis=1)
+    pivot_calendar.index = [dias_pt[d] for d in pivot_calendar.index]
+    pivot_calendar.columns = [meses_pt[m - 1] for m in pivot_calendar.columns]
+    return pivot_calendar.fillna(0)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+# Teste de carga da API local (api.py).
+#
+# Dispara requisições concorrentes com uma mistura de rotas e filtros e informa latência
+# (p50/p95/p99), vazão, erros e a fração de respostas servidas pelo cache. Os filtros são
+# sorteados de um conjunto pequeno de convênios e intervalos, para que parte das consultas
+# se repita, como acontece com o portal de BI.
+#
+# Uso:
+#   python api.py contas_100k.xlsx --silencioso &
+#   python teste_carga_api.py --requisicoes 2000 --concorrencia 16
+
+rotas = ["/kpis", "/resumo_convenio", "/aging", "/gargalos"]
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+# Consultas possíveis a partir dos convênios e do período do snapshot padrão
+def montar_consultas(url, quantidade, variacoes, seed):
+    sorteio = random.Random(seed)
+    with urlopen(f"{url}/resumo_convenio") as resposta:
+        convenios = [linha["Convênio"] for linha in json.load(resposta)][:20]
+
+    consultas = []
+    for _ in range(variacoes):
+        parametros = {}
+        if sorteio.random() < 0.7:
+            parametros["convenio"] = sorteio.sample(convenios, sorteio.randint(1, min(3, len(convenios))))
+        if sorteio.random() < 0.5:
+            parametros["data_inicio"] = f"{sorteio.choice([2024, 2025])}-{sorteio.randint(1, 12):02d}-01"
+        consultas.append(f"{url}{sorteio.choice(rotas)}?{urlencode(parametros, doseq=True)}")
+    return [sorteio.choice(consultas) for _ in range(quantidade)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API local de KPIs.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="endereço da API")
+    parser.add_argument("--requisicoes", type=int, default=1000)
+    parser.add_argument("--concorrencia", type=int, default=8, help="clientes simultâneos")
+    parser.add_argument("--variacoes", type=int, default=200, help="consultas distintas sorteadas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    consultas = montar_consultas(args.url, args.requisicoes, args.variacoes, args.seed)
+
+    latencias = []
+    erros = []
+    acertos_cache = 0
+    lock = threading.Lock()
+
+    def requisitar(consulta):
+        nonlocal acertos_cache
+        inicio = time.perf_counter()
+        try:
+            with urlopen(consulta) as resposta:
+                resposta.read()
+                acerto = resposta.headers.get("X-Cache") == "HIT"
+        except (HTTPError, OSError) as e:
+            with lock:
+                erros.append(f"{consulta}: {e}")
+            return
+        with lock:
+            latencias.append(time.perf_counter() - inicio)
+            acertos_cache += acerto
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        list(executor.map(requisitar, consultas))
+    duracao = time.perf_counter() - inicio
+
+    if not latencias:
+        print(f"Nenhuma requisição bem-sucedida ({len(erros)} erros).", file=sys.stderr)
+        sys.exit(1)
+
+    resultado = {
+        "requisicoes": args.requisicoes,
+        "concorrencia": args.concorrencia,
+        "duracao_s": duracao,
+        "vazao_rps": len(latencias) / duracao,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "media_ms": statistics.mean(latencias) * 1000,
+        "erros": len(erros),
+        "taxa_acerto_cache": acertos_cache / len(latencias),
+    }
+
+    print(f"{args.requisicoes} requisições, {args.concorrencia} clientes, {duracao:.1f} s ({resultado['vazao_rps']:.0f} req/s)")
+    print(f"p50 {resultado['p50_ms']:.1f} ms | p95 {resultado['p95_ms']:.1f} ms | p99 {resultado['p99_ms']:.1f} ms")
+    print(f"Respostas do cache: {resultado['taxa_acerto_cache'] * 100:.0f}% | erros: {len(erros)}")
+    for erro in erros[:5]:
+        print(f"  {erro}", file=sys.stderr)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from gerador_dados import gerar_contas, interpretar_tamanho, rotulo_tamanho, salvar_dados
+from teste_carga_api import percentil
+from benchmark_exportacao import rss_atual
+
+# Teste de carga do painel com várias sessões simultâneas.
+#
+# Cada sessão simulada é um AppTest (o app roda de verdade, sem navegador) que segue o roteiro
+# de um analista: envia a planilha, troca os filtros de convênio e de período, percorre as
+# visualizações e a hierarquia, gera o relatório completo e volta aos filtros iniciais, com
+# uma pausa de leitura entre os passos. Informa a latência de cada rerun (p50/p95/p99, geral
+# e por passo), o tempo de CPU somado e a memória.
+#
+# Cada sessão roda em um processo próprio, todos iniciados juntos: o AppTest troca o runtime
+# global do Streamlit a cada execução e não aguenta duas execuções no mesmo processo (uma
+# sessão recebia a árvore de elementos vazia). Por isso as sessões não dividem os caches de
+# st.cache_resource como no servidor, e o resultado é o pior caso para o cache de figuras. A
+# memória total é a soma do PSS de cada processo, em que as bibliotecas carregadas por todos
+# contam uma vez.
+#
+# O AppTest não envia arquivos: em cada processo o st.file_uploader devolve a planilha
+# gerada. Trocar de aba não gera rerun no Streamlit (todas as abas são montadas a cada
+# execução), então o roteiro usa os widgets de dentro das abas.
+#
+# Uso:
+#   python teste_carga_app.py
+#   python teste_carga_app.py --tamanhos 10k,100k,500k --sessoes 1,4,8 --ciclos 3
+
+caminho_app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "aplicacao.py")
+
+# Widget da lista cujo rótulo começa com o texto indicado
+def widget(lista, rotulo):
+    return next(w for w in lista if w.label.startswith(rotulo))
+
+# Passos do roteiro: cada um altera um widget (ou nenhum) antes do rerun
+def passo_desmarcar_convenios(at, sorteio):
+    widget(at.sidebar.checkbox, "Selecionar todos os convênios").uncheck()
+
+def passo_escolher_convenios(at, sorteio):
+    seletor = widget(at.sidebar.multiselect, "Convênios")
+    seletor.set_value(sorteio.sample(seletor.options, min(len(seletor.options), sorteio.randint(1, 3))))
+
+def passo_periodo(at, sorteio):
+    seletor = widget(at.sidebar.date_input, "Intervalo de Data")
+    data_min, data_max = seletor.min, seletor.max
+    meses = sorteio.choice([3, 6, 12])
+    seletor.set_value((max(data_min, data_max - timedelta(days=30 * meses)), data_max))
+
+def passo_visualizacao(at, sorteio):
+    seletor = widget(at.selectbox, "Selecione o tipo de visualização")
+    seletor.select(sorteio.choice([o for o in seletor.options if o != seletor.value]))
+
+def passo_hierarquia(at, sorteio):
+    seletor = widget(at.selectbox, "Detalhar")
+    seletor.select(sorteio.choice(seletor.options[1:]))
+
+def passo_relatorio(at, sorteio):
+    widget(at.button, "Gerar Relatório Completo").click()
+
+def passo_todos_convenios(at, sorteio):
+    widget(at.sidebar.checkbox, "Selecionar todos os convênios").check()
+
+def passo_rerun(at, sorteio):
+    pass
+
+roteiro = [
+    ("desmarcar_convenios", passo_desmarcar_convenios),
+    ("escolher_convenios", passo_escolher_convenios),
+    ("visualizacao", passo_visualizacao),
+    ("periodo", passo_periodo),
+    ("hierarquia", passo_hierarquia),
+    ("relatorio", passo_relatorio),
+    ("todos_convenios", passo_todos_convenios),
+    ("rerun", passo_rerun),
+]
+
+# Planilha sintética do tamanho pedido, reaproveitada entre execuções (gravar .xlsx grandes
+# com o openpyxl leva minutos)
+def preparar_planilha(linhas, seed, diretorio):
+    caminho = os.path.join(diretorio, f"carga_{rotulo_tamanho(linhas)}_{seed}.xlsx")
+    if not os.path.exists(caminho):
+        print(f"Gerando {caminho}...", file=sys.stderr)
+        salvar_dados(gerar_contas(linhas, seed=seed), caminho)
+    return caminho
+
+# Memória proporcional do processo (PSS): as páginas divididas com outros processos, como as
+# das bibliotecas, contam em fração, então a soma das sessões é a memória real ocupada
+def pss_atual():
+    with open("/proc/self/smaps_rollup") as f:
+        for linha in f:
+            if linha.startswith("Pss:"):
+                return int(linha.split()[1]) * 1024
+    return rss_atual()
+
+# Uma sessão, em um processo próprio: upload e ciclos do roteiro, com o tempo de cada rerun,
+# o tempo de CPU e os picos de memória do processo
+def executar_sessao(indice, planilha, ciclos, pausa, seed, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    # Cada chamada devolve um arquivo novo com o nome da planilha, que é o que o app usa para
+    # reconhecer o mesmo upload entre reruns
+    with open(planilha, "rb") as f:
+        conteudo = f.read()
+
+    def enviar(*args, **kwargs):
+        arquivo = io.BytesIO(conteudo)
+        arquivo.name = os.path.basename(planilha)
+        return arquivo
+
+    st.file_uploader = enviar
+
+    picos = {"rss": rss_atual(), "pss": pss_atual()}
+    parar = threading.Event()
+
+    def amostrar():
+        while not parar.wait(0.05):
+            picos["rss"] = max(picos["rss"], rss_atual())
+            picos["pss"] = max(picos["pss"], pss_atual())
+
+    amostrador = threading.Thread(target=amostrar, daemon=True)
+    amostrador.start()
+    cpu_inicial = os.times()
+
+    sorteio = random.Random(seed + indice)
+    latencias = []
+    erros = []
+    at = AppTest.from_file(caminho_app, default_timeout=timeout)
+
+    def medir(passo, alterar):
+        try:
+            alterar(at, sorteio)
+            inicio = time.perf_counter()
+            at.run()
+            latencias.append((passo, time.perf_counter() - inicio))
+        except Exception as e:
+            erros.append(f"sessão {indice}, {passo}: {type(e).__name__}: {e}")
+            return
+        erros.extend(f"sessão {indice}, {passo}: {e.value}" for e in at.exception)
+
+    time.sleep(sorteio.uniform(0, pausa))
+    medir("upload", passo_rerun)
+    for _ in range(ciclos):
+        for passo, alterar in roteiro:
+            time.sleep(sorteio.uniform(0.5 * pausa, 1.5 * pausa))
+            medir(passo, alterar)
+
+    cpu_final = os.times()
+    parar.set()
+    amostrador.join()
+    return {
+        "latencias": latencias,
+        "erros": erros,
+        "cpu_s": sum(cpu_final[:4]) - sum(cpu_inicial[:4]),
+        "rss_pico": max(picos["rss"], rss_atual()),
+        "pss_pico": max(picos["pss"], pss_atual()),
+    }
+
+# Um cenário: as sessões em processos novos, iniciados juntos
+def executar_cenario(planilha, sessoes, ciclos, pausa, seed, timeout):
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=sessoes, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futuros = [
+            executor.submit(executar_sessao, indice, planilha, ciclos, pausa, seed, timeout)
+            for indice in range(sessoes)
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+    duracao = time.perf_counter() - inicio
+
+    latencias = [item for r in resultados for item in r["latencias"]]
+    interacoes = [segundos for passo, segundos in latencias if passo != "upload"]
+    por_passo = {}
+    for passo, segundos in latencias:
+        por_passo.setdefault(passo, []).append(segundos)
+    cpu = sum(r["cpu_s"] for r in resultados)
+
+    return {
+        "sessoes": sessoes,
+        "reruns": len(latencias),
+        "duracao_s": duracao,
+        "p50_ms": percentil(interacoes, 50) * 1000 if interacoes else None,
+        "p95_ms": percentil(interacoes, 95) * 1000 if interacoes else None,
+        "p99_ms": percentil(interacoes, 99) * 1000 if interacoes else None,
+        "passos": {
+            passo: {
+                "reruns": len(valores),
+                "p50_ms": percentil(valores, 50) * 1000,
+                "p95_ms": percentil(valores, 95) * 1000,
+                "media_ms": statistics.mean(valores) * 1000,
+            }
+            for passo, valores in por_passo.items()
+        },
+        "cpu_s": cpu,
+        "cpu_nucleos": cpu / duracao,
+        "rss_pico_sessao_mb": max(r["rss_pico"] for r in resultados) / 1e6,
+        "pss_pico_total_mb": sum(r["pss_pico"] for r in resultados) / 1e6,
+        "erros": [erro for r in resultados for erro in r["erros"]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do painel com sessões simultâneas.")
+    parser.add_argument("--tamanhos", default="10k,100k", help="tamanhos separados por vírgula (ex.: 10k,100k,500k)")
+    parser.add_argument("--sessoes", default="1,4", help="sessões simultâneas separadas por vírgula (ex.: 1,4,8)")
+    parser.add_argument("--ciclos", type=int, default=2, help="repetições do roteiro em cada sessão")
+    parser.add_argument("--pausa", type=float, default=1.0, help="pausa média entre os passos, em segundos")
+    parser.add_argument("--timeout", type=float, default=600, help="tempo máximo de um rerun, em segundos")
+    parser.add_argument("--diretorio", default=tempfile.gettempdir(), help="onde guardar as planilhas geradas")
+    parser.add_argument("--seed", type=int, default=42, help="semente dos dados e dos roteiros")
+    parser.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    tamanhos = [interpretar_tamanho(t) for t in args.tamanhos.split(",") if t.strip()]
+    quantidades = [int(s) for s in args.sessoes.split(",") if s.strip()]
+
+    resultados = {}
+    for linhas in tamanhos:
+        planilha = preparar_planilha(linhas, args.seed, args.diretorio)
+        for sessoes in quantidades:
+            print(f"Executando {rotulo_tamanho(linhas)} com {sessoes} sessões...", file=sys.stderr)
+            resultado = executar_cenario(planilha, sessoes, args.ciclos, args.pausa, args.seed, args.timeout)
+            resultados.setdefault(rotulo_tamanho(linhas), []).append(resultado)
+
+    print(f"\n{'tamanho':<9}{'sessões':>8}{'reruns':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+          f"{'CPU (s)':>9}{'núcleos':>9}{'PSS total (MB)':>16}{'RSS/sessão (MB)':>17}{'erros':>7}")
+    for tamanho, cenarios in resultados.items():
+        for r in cenarios:
+            print(f"{tamanho:<9}{r['sessoes']:>8}{r['reruns']:>8}{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}{r['p99_ms']:>10.0f}"
+                  f"{r['cpu_s']:>9.1f}{r['cpu_nucleos']:>9.2f}{r['pss_pico_total_mb']:>16.0f}{r['rss_pico_sessao_mb']:>17.0f}{len(r['erros']):>7}")
+
+    for tamanho, cenarios in resultados.items():
+        for r in cenarios:
+            print(f"\n{tamanho}, {r['sessoes']} sessões: latência por passo")
+            print(f"{'passo':<18}{'reruns':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'média (ms)':>12}")
+            for passo, m in r["passos"].items():
+                print(f"{passo:<18}{m['reruns']:>8}{m['p50_ms']:>10.0f}{m['p95_ms']:>10.0f}{m['media_ms']:>12.0f}")
+            for erro in r["erros"][:5]:
+                print(f"  {erro}", file=sys.stderr)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"ciclos": args.ciclos, "pausa_s": args.pausa, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
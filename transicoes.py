@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from analises import ordem_aging
+from aging import idade_minima
+from historico import coluna_snapshot, rotulo_snapshot
+
+# Transições entre faixas de aging de um snapshot do histórico para o seguinte (roll rate).
+#
+# A "Categoria Aging" de um dia não mostra quantas contas de "31-60 dias" passaram para
+# "61-90 dias" ou foram resolvidas até o export seguinte. Aqui os snapshots consecutivos são
+# ligados pela Conta: cada conta recebe um código inteiro, e a chave (código, posição do
+# snapshot) vai para um índice de hash; a linha da mesma conta no snapshot seguinte sai de
+# uma única busca (get_indexer) com a posição + 1, para todos os pares de uma vez. Contas que
+# não aparecem no seguinte viram "Resolvida", e as que só aparecem nele, "Nova". As matrizes
+# (quantidade e valor por faixa de origem x faixa de destino, por convênio e por setor) saem
+# de uma contagem vetorizada sobre a chave combinada (par, grupo, origem, destino).
+#
+# O resultado de cada par fica em um LRU pela data e pelo id dos dois snapshots (um snapshot
+# guardado de novo ganha outro id): mudar o intervalo só calcula os pares que faltam, e um ano
+# de snapshots diários é lido e ligado uma vez.
+
+estado_nova = "Nova"
+estado_resolvida = "Resolvida"
+estados_origem = [estado_nova, *ordem_aging]
+estados_destino = [*ordem_aging, estado_resolvida]
+
+# Dimensões de detalhamento e a coluna de cada uma (o grupo de uma transição é o do snapshot
+# de origem; o de uma conta nova, o do snapshot em que ela apareceu)
+dimensoes = {"Convênio": "Convênio", "Setor": "Último Setor destino"}
+
+colunas_leitura = ["Conta", "Data entrada", "Valor conta", *dimensoes.values(), coluna_snapshot]
+
+# Snapshots lidos do histórico de uma vez ao calcular os pares que faltam
+snapshots_por_lote = 32
+
+# Pares guardados no LRU (um par ocupa poucas centenas de linhas por dimensão)
+max_pares_padrao = 4096
+
+# Faixa de aging (posição em ordem_aging) de cada idade em dias, -1 para idades negativas
+def faixas_por_idade(idades):
+    return np.searchsorted(idade_minima, idades, side="right") - 1
+
+# Uma linha por conta em cada snapshot: a de entrada mais recente, como na regra padrão de
+# remoção de duplicatas. Devolve as linhas mantidas e a chave (código da conta, posição).
+def linhas_por_conta(codigos, posicoes, entradas, quantidade):
+    chaves = codigos * quantidade + posicoes
+    ordem = np.lexsort((entradas, chaves))
+    chaves = chaves[ordem]
+    ultima = np.ones(len(chaves), dtype=bool)
+    ultima[:-1] = chaves[1:] != chaves[:-1]
+    return ordem[ultima], chaves[ultima]
+
+# Transições de todos os pares consecutivos de um lote de snapshots (datas em ordem), em um
+# DataFrame longo com o par, a dimensão, o grupo, as faixas e as somas
+def calcular_transicoes(df, datas):
+    datas = pd.DatetimeIndex(datas)
+    quantidade = len(datas)
+    entrada = df["Data entrada"]
+    snapshot = df[coluna_snapshot].to_numpy("datetime64[D]")
+    posicoes = np.searchsorted(datas.to_numpy("datetime64[D]"), snapshot)
+    idades = (snapshot - entrada.to_numpy("datetime64[D]")).astype(np.int64)
+
+    # Contas sem data de entrada (ou com entrada depois do snapshot) não têm faixa
+    validas = entrada.notna().to_numpy() & (idades >= 0)
+    codigos = pd.factorize(df["Conta"])[0].astype(np.int64)
+    linhas, chaves = linhas_por_conta(
+        codigos[validas], posicoes[validas], entrada.to_numpy("datetime64[D]")[validas].astype(np.int64), quantidade
+    )
+    linhas = np.flatnonzero(validas)[linhas]
+    posicoes = posicoes[linhas]
+    faixas = faixas_por_idade(idades[linhas])
+    valores = pd.to_numeric(df["Valor conta"], errors="coerce").fillna(0).to_numpy(dtype=float)[linhas]
+
+    # Junção por hash: a mesma conta no snapshot seguinte e no anterior (-1 se não houver)
+    indice = pd.Index(chaves)
+    tem_seguinte = posicoes < quantidade - 1
+    tem_anterior = posicoes > 0
+    seguinte = indice.get_indexer(chaves[tem_seguinte] + 1)
+    anterior = indice.get_indexer(chaves[tem_anterior] - 1)
+
+    # Origem, destino e linha de referência (de onde vêm grupo e valor) de cada transição:
+    # contas do snapshot de origem (seguidas ou resolvidas) e contas novas no seguinte
+    origem_linhas = np.flatnonzero(tem_seguinte)
+    novas = np.flatnonzero(tem_anterior)[anterior < 0]
+    par = np.concatenate([posicoes[origem_linhas], posicoes[novas] - 1])
+    origem = np.concatenate([faixas[origem_linhas] + 1, np.zeros(len(novas), dtype=np.int64)])
+    destino = np.concatenate([
+        np.where(seguinte >= 0, faixas[seguinte], len(ordem_aging)), faixas[novas]
+    ])
+    referencia = np.concatenate([origem_linhas, novas])
+    valor = valores[referencia]
+
+    # Contagem densa sobre a chave combinada (par, grupo, origem, destino); só as células
+    # com alguma transição vão para o resultado
+    partes = []
+    for dimensao, coluna in dimensoes.items():
+        grupos, nomes = pd.factorize(df[coluna], use_na_sentinel=False)
+        grupos = grupos[linhas[referencia]]
+        celulas = (quantidade - 1) * len(nomes) * len(estados_origem) * len(estados_destino)
+        combinada = ((par * len(nomes) + grupos) * len(estados_origem) + origem) * len(estados_destino) + destino
+        contas = np.bincount(combinada, minlength=celulas)
+        somas = np.bincount(combinada, weights=valor, minlength=celulas)
+        ocupadas = np.flatnonzero(contas)
+        resto, d = np.divmod(ocupadas, len(estados_destino))
+        resto, o = np.divmod(resto, len(estados_origem))
+        p, g = np.divmod(resto, len(nomes))
+        partes.append(pd.DataFrame({
+            "Par": p,
+            "Dimensão": dimensao,
+            "Grupo": pd.Index(nomes).astype(str)[g],
+            "Origem": pd.Categorical.from_codes(o, estados_origem),
+            "Destino": pd.Categorical.from_codes(d, estados_destino),
+            "Contas": contas[ocupadas],
+            "Valor": somas[ocupadas],
+        }))
+    return pd.concat(partes, ignore_index=True)
+
+class TransicoesAging:
+    # Matrizes de transição dos pares de snapshots consecutivos de um histórico, com o LRU
+    # dos pares já calculados (dividido pelas sessões)
+
+    def __init__(self, historico, max_pares=max_pares_padrao):
+        self.historico = historico
+        self.max_pares = max_pares
+        self.pares = OrderedDict()
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.tempos = {}
+
+    # Pares consecutivos (data de origem, data de destino) entre os snapshots guardados, com
+    # a chave de cada um no LRU
+    def pares_disponiveis(self, inicio=None, fim=None):
+        snapshots = self.historico.snapshots()
+        rotulos = list(snapshots)
+        pares = []
+        for a, b in zip(rotulos, rotulos[1:]):
+            if (inicio is None or a >= rotulo_snapshot(inicio)) and (fim is None or b <= rotulo_snapshot(fim)):
+                pares.append(((a, b), (a, snapshots[a]["id"], b, snapshots[b]["id"])))
+        return pares
+
+    # Transições dos pares de snapshots entre inicio e fim (datas de origem e de destino), com
+    # as colunas "De" e "Para" no lugar da posição do par
+    def obter(self, inicio=None, fim=None):
+        pares = self.pares_disponiveis(inicio, fim)
+        with self.lock:
+            faltando = [(datas, chave) for datas, chave in pares if chave not in self.pares]
+            self.acertos += len(pares) - len(faltando)
+            self.faltas += len(faltando)
+
+        if faltando:
+            inicio_calculo = time.perf_counter()
+            for lote in self._lotes(faltando):
+                datas = [lote[0][0][0], *(b for (_, b), _ in lote)]
+                df = self.historico.ler(datas, colunas=colunas_leitura)
+                resultado = calcular_transicoes(df, datas)
+                por_par = dict(tuple(resultado.groupby("Par", sort=False)))
+                with self.lock:
+                    for posicao, (_, chave) in enumerate(lote):
+                        self.pares[chave] = por_par.get(posicao, resultado.iloc[:0]).drop(columns="Par")
+                    while len(self.pares) > self.max_pares:
+                        self.pares.popitem(last=False)
+            self.tempos[len(faltando)] = time.perf_counter() - inicio_calculo
+
+        partes = []
+        with self.lock:
+            for (a, b), chave in pares:
+                transicoes = self.pares.get(chave)
+                if transicoes is None:
+                    continue
+                self.pares.move_to_end(chave)
+                partes.append(transicoes.assign(De=pd.Timestamp(a), Para=pd.Timestamp(b)))
+        if not partes:
+            return pd.DataFrame(columns=["De", "Para", "Dimensão", "Grupo", "Origem", "Destino", "Contas", "Valor"])
+        return pd.concat(partes, ignore_index=True)[["De", "Para", "Dimensão", "Grupo", "Origem", "Destino", "Contas", "Valor"]]
+
+    # Pares que faltam em sequências de snapshots consecutivos, com até snapshots_por_lote
+    # snapshots por leitura
+    @staticmethod
+    def _lotes(faltando):
+        lotes = []
+        for datas, chave in faltando:
+            if lotes and lotes[-1][-1][0][1] == datas[0] and len(lotes[-1]) < snapshots_por_lote - 1:
+                lotes[-1].append((datas, chave))
+            else:
+                lotes.append([(datas, chave)])
+        return lotes
+
+    def estatisticas(self):
+        with self.lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "pares": len(self.pares),
+                "linhas": sum(len(t) for t in self.pares.values()),
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            }
+
+# Matriz origem x destino somada sobre os pares, para todas as contas ou para um grupo de
+# uma dimensão; com taxas, cada linha vira o percentual da faixa de origem
+def matriz_transicao(transicoes, dimensao=None, grupo=None, medida="Contas", taxas=False):
+    if dimensao is None:
+        # Cada transição aparece uma vez em cada dimensão: o total sai de uma delas
+        recorte = transicoes[transicoes["Dimensão"] == next(iter(dimensoes))]
+    else:
+        recorte = transicoes[(transicoes["Dimensão"] == dimensao) & (transicoes["Grupo"] == grupo)]
+    matriz = recorte.pivot_table(
+        index="Origem", columns="Destino", values=medida, aggfunc="sum", fill_value=0, observed=False
+    ).reindex(index=estados_origem, columns=estados_destino, fill_value=0)
+    if taxas:
+        totais = matriz.sum(axis=1)
+        matriz = matriz.div(totais.where(totais > 0), axis=0).fillna(0) * 100
+    return matriz
+
+# Taxa de rolagem de cada par: percentual das contas (ou do valor) de cada faixa que passou
+# para a faixa seguinte, e percentual resolvido no período
+def taxas_rolagem(transicoes, dimensao=None, grupo=None, medida="Contas"):
+    if dimensao is None:
+        recorte = transicoes[transicoes["Dimensão"] == next(iter(dimensoes))]
+    else:
+        recorte = transicoes[(transicoes["Dimensão"] == dimensao) & (transicoes["Grupo"] == grupo)]
+    recorte = recorte[recorte["Origem"] != estado_nova]
+    totais = recorte.groupby(["Para", "Origem"], observed=True)[medida].sum()
+
+    origem = recorte["Origem"].cat.codes.to_numpy()
+    destino = recorte["Destino"].cat.codes.to_numpy()
+    # Origem tem "Nova" na posição 0, então a faixa seguinte tem o mesmo código no destino
+    rolaram = recorte[destino == origem].groupby(["Para", "Origem"], observed=True)[medida].sum()
+    resolvidas = recorte[recorte["Destino"] == estado_resolvida].groupby("Para")[medida].sum()
+
+    taxas = (rolaram.reindex(totais.index, fill_value=0) / totais.where(totais > 0) * 100).unstack("Origem")
+    taxas = taxas.reindex(columns=ordem_aging[:-1]).rename(columns=lambda faixa: f"{faixa} → seguinte")
+    taxas["Resolvidas"] = resolvidas.reindex(taxas.index, fill_value=0) / totais.groupby("Para").sum() * 100
+    return taxas.fillna(0)